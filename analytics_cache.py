@@ -0,0 +1,113 @@
+import copy
+import functools
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date
+import db
+
+"""Memoization of analytics results.
+
+Results are cached per database, function and arguments, and stay valid while
+the database's write generation is unchanged. The generation is bumped by every
+db.transaction() that commits (all db mutators use one), and when PRAGMA
+data_version shows that another connection or process wrote to the database.
+Results also expire at midnight, since completion rates depend on the date.
+Calls inside an open transaction, and calls on a storage backend instead of
+a connection, bypass the cache. Writes made with raw SQL on
+the caller's own connection are not detected; call clear() after them.
+
+The cache holds at most MAX_ENTRIES results and evicts the least recently used."""
+
+MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "bypassed": 0}
+
+
+def _generation(conn):
+    """
+        Retrieve the write generation of a connection's database, noticing writes by other connections.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        int: The generation, or None if results for this connection cannot be cached.
+        """
+    if getattr(conn, "database_key", None) is None or conn.in_transaction:
+        return None
+    db.sync_data_version(conn)
+    return db.write_generation(conn)
+
+
+def memoize(function):
+    """
+        Cache the results of an analytics function whose first argument is the connection.
+
+        Parameters:
+        - function (callable): The function to cache.
+
+        Returns:
+        callable: The caching function.
+        """
+    name = function.__module__ + "." + function.__qualname__
+
+    @functools.wraps(function)
+    def cached(db_conn, *args, **kwargs):
+        if not isinstance(db_conn, sqlite3.Connection):
+            # Storage backends answer from their own indexes
+            return function(db_conn, *args, **kwargs)
+        # Buffered completions must be written before the generation is read
+        db.read_barrier(db_conn)
+        generation = _generation(db_conn)
+        if generation is None:
+            with _lock:
+                _stats["bypassed"] += 1
+            return function(db_conn, *args, **kwargs)
+
+        key = (db_conn.database_key, name, args, tuple(sorted(kwargs.items())), date.today())
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None and entry[0] == generation:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return copy.copy(entry[1])
+            _stats["misses"] += 1
+
+        result = function(db_conn, *args, **kwargs)
+        with _lock:
+            _entries[key] = (generation, result)
+            _entries.move_to_end(key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+                _stats["evictions"] += 1
+        return copy.copy(result)
+
+    cached.__wrapped__ = function
+    return cached
+
+
+def clear():
+    """Forget every cached result."""
+    with _lock:
+        _entries.clear()
+
+
+def cache_info():
+    """
+        Retrieve the cache statistics.
+
+        Returns:
+        dict: The hits, misses, evictions, calls that bypassed the cache, current size and maximum size.
+        """
+    with _lock:
+        return dict(_stats, size=len(_entries), max_entries=MAX_ENTRIES)
+
+
+def reset_stats():
+    """Set the cache statistics back to zero."""
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -1,180 +1,270 @@
+import analytics_cache
 import db
-from datetime import datetime
+import period_stats
+import periods
+import storage
+import streaks
 
 
+@analytics_cache.memoize
 def get_all_tracked_habits(db_conn):
     """
         Retrieve a list of all tracked habits from the database.
 
         Parameters:
-        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
 
         Returns:
         list: A list of habit names.
         """
 
+    if isinstance(db_conn, storage.StorageBackend):
+        return db_conn.habit_names()
+
     tracked_habits = db.get_habit_names(db_conn)
     return tracked_habits
 
 
+@analytics_cache.memoize
 def habits_by_periodicity(db_conn, periodicity):
     """
         Retrieve habits based on their periodicity from the database.
 
         Parameters:
-        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
         - periodicity (str): The periodicity to filter habits (e.g., daily, weekly, monthly).
 
         Returns:
         list: A list of habits with the specified periodicity.
         """
 
+    if isinstance(db_conn, storage.StorageBackend):
+        return db_conn.habits_with_periodicity(periodicity)
+
     habits_periodicity = db.get_habits_with_periodicity(db_conn, periodicity)
     return habits_periodicity
 
 
+def iter_all_tracked_habits(db_conn, batch_size=1000):
+    """
+        Stream the names of all tracked habits without building a list; not cached.
+
+        Parameters:
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        iterator: The habit names in name order.
+        """
+
+    if isinstance(db_conn, storage.StorageBackend):
+        return iter(db_conn.habit_names())
+    return db.iter_habit_names(db_conn, batch_size)
+
+
+def iter_habits_by_periodicity(db_conn, periodicity, batch_size=1000):
+    """
+        Stream the names of the habits with a periodicity without building a list; not cached.
+
+        Parameters:
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
+        - periodicity (str): The periodicity to filter habits (e.g., daily, weekly, monthly).
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        iterator: The habit names in name order.
+        """
+
+    if isinstance(db_conn, storage.StorageBackend):
+        return iter(db_conn.habits_with_periodicity(periodicity))
+    return db.iter_habits_with_periodicity(db_conn, periodicity, batch_size)
+
+
+@analytics_cache.memoize
 def find_longest_streak_overall(db_conn):
     """
-       Find the longest streak among all habits.
+       Find the longest streak among all habits, derived from their completion logs.
 
        Parameters:
-       - db_conn (sqlite3.Connection): The SQLite database connection.
+       - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
 
        Returns:
        int: The longest streak count.
        """
 
-    cursor = db_conn.cursor()
-    cursor.execute("SELECT MAX(streak) FROM habits")
-    longest_streak = cursor.fetchone()
-    return longest_streak[0] if longest_streak else 0
+    if isinstance(db_conn, storage.StorageBackend):
+        return db_conn.longest_streak_overall()
+
+    db.read_barrier(db_conn)
+    return streaks.longest_streak_overall(db_conn)
 
 
+@analytics_cache.memoize
 def find_longest_streak_for_habit(db_conn, habit_name):
     """
-        Find the longest streak for a specific habit.
+        Find the longest streak for a specific habit, derived from its completion logs.
 
         Parameters:
-        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
         - habit_name (str): The name of the habit.
 
         Returns:
         int: The longest streak count for the specified habit.
         """
 
+    if isinstance(db_conn, storage.StorageBackend):
+        return db_conn.longest_streak(habit_name)
+
+    db.read_barrier(db_conn)
+    habit_id = db.get_habit_id(db_conn, habit_name)
+    return streaks.longest_streak(db_conn, habit_id) if habit_id is not None else 0
+
+
+# Completion rate engine: a single scan of habits, whose running
+# total_completions counter is maintained by triggers on habit_logs.
+# Available periods follow the original rules (calendar days since creation,
+# 7-day weeks and 30-day months) and are computed by SQLite from the epoch
+# creation time, without parsing any strings in Python.
+_COMPLETION_RATE_SQL = """
+    SELECT name, CASE WHEN periods >= 1 THEN CAST(completions AS REAL) / periods ELSE 0 END AS rate
+    FROM (
+        SELECT h.id, h.name, h.total_completions AS completions,
+               CASE h.periodicity
+                   WHEN 'daily' THEN days
+                   WHEN 'weekly' THEN days / 7
+                   WHEN 'monthly' THEN days / 30
+                   ELSE 0
+               END AS periods
+        FROM (
+            SELECT id, name, periodicity, total_completions,
+                   CAST(julianday('now', 'localtime', 'start of day')
+                        - julianday(creation_time, 'unixepoch', 'localtime', 'start of day') AS INTEGER) AS days
+            FROM habits
+        ) h
+    )
+"""
+
+
+def _completion_rates(db_conn, where="", order_by="id", limit=None, params=()):
+    """
+        Run the completion rate engine and return (habit name, rate) rows.
+
+        Parameters:
+        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - where (str): Optional SQL condition on the "rate" column.
+        - order_by (str): SQL ordering of the result rows.
+        - limit (int): Optional maximum number of rows.
+        - params (tuple): Parameters for the condition.
+
+        Returns:
+        list: A list of (habit name, completion rate) tuples.
+        """
+
+    query = _COMPLETION_RATE_SQL
+    if where:
+        query += " WHERE " + where
+    query += " ORDER BY " + order_by
+    if limit is not None:
+        query += " LIMIT %d" % limit
+    db.read_barrier(db_conn)
     cursor = db_conn.cursor()
-    cursor.execute("SELECT streak FROM habits WHERE name=?", (habit_name,))
-    streak = cursor.fetchone()
-    return streak[0] if streak else 0
+    cursor.execute(query, params)
+    return cursor.fetchall()
 
 
+@analytics_cache.memoize
 def calculate_completion_rate(db_conn):
     """
         Calculate the completion rates for all habits.
 
         Parameters:
-        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
 
         Returns:
         dict: A dictionary mapping habit names to their completion rates.
         """
 
-    success_rates = {}
-    cursor = db_conn.cursor()
-    cursor.execute("SELECT name, periodicity, creation_time FROM habits")
-    habits = cursor.fetchall()
-
-    for habit in habits:
-        habit_name, periodicity, creation_time_str = habit[0], habit[1], habit[2]
-
-        # Convert creation_time to a datetime object
-        creation_time = datetime.strptime(creation_time_str, "%Y-%m-%d %H:%M:%S.%f")
-
-        # Calculate the date difference since the habit's creation
-        date_diff = (datetime.now().date() - creation_time.date()).days
+    if isinstance(db_conn, storage.StorageBackend):
+        return db_conn.completion_rates()
 
-        # Calculate available days, weeks, and months as integers
-        available_days = date_diff
-        available_weeks = date_diff // 7
-        available_months = date_diff // 30  # assume month 30 days
+    return dict(_completion_rates(db_conn))
 
-        # Check the periodicity and calculate the success rate
-        if periodicity == 'daily' and available_days >= 1:
-            cursor.execute(
-                "SELECT COUNT(*) FROM habit_logs WHERE habit_id = (SELECT id FROM habits WHERE name=?)",
-                (habit_name,))
-            completed_count = cursor.fetchone()[0]
 
-            success_rate = completed_count / available_days if available_days > 0 else 0
-        elif periodicity == 'weekly' and available_weeks >= 1:
-            cursor.execute(
-                "SELECT COUNT(*) FROM habit_logs WHERE habit_id = (SELECT id FROM habits WHERE name=?)",
-                (habit_name,))
-            completed_count = cursor.fetchone()[0]
+@analytics_cache.memoize
+def calculate_completion_rate_for_habit(db_conn, habit_name):
+    """
+        Calculate the completion rate of a single habit.
 
-            success_rate = completed_count / available_weeks if available_weeks > 0 else 0
-        elif periodicity == 'monthly' and available_months >= 1:
-            cursor.execute(
-                "SELECT COUNT(*) FROM habit_logs WHERE habit_id = (SELECT id FROM habits WHERE name=?) ",
-                (habit_name,))
-            completed_count = cursor.fetchone()[0]
+        Parameters:
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
+        - habit_name (str): The name of the habit.
 
-            success_rate = completed_count / available_months if available_months > 0 else 0
-        else:
-            success_rate = 0  # For habits with insufficient time since creation
+        Returns:
+        float: The completion rate of the habit, or None if it does not exist.
+        """
 
-        success_rates[habit_name] = success_rate
+    if isinstance(db_conn, storage.StorageBackend):
+        return db_conn.completion_rate(habit_name)
 
-    return success_rates
+    rates = _completion_rates(db_conn, where="name = ?", params=(habit_name,))
+    return rates[0][1] if rates else None
 
 
+@analytics_cache.memoize
 def find_habit_with_lowest_completion_rate(db_conn):
     """
         Find the habit with the lowest completion rate.
 
         Parameters:
-        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
 
         Returns:
         tuple: A tuple containing the habit name and its lowest completion rate.
         """
 
-    # Calculate success rates for all habits
-    success_rates = calculate_completion_rate(db_conn)
-
-    lowest_completion_rate = 1.0
-    lowest_completion_habit = None
-
-    for habit_name, success_rate in success_rates.items():
-        if success_rate < lowest_completion_rate:
-            lowest_completion_rate = success_rate
-            lowest_completion_habit = habit_name
-
-    return lowest_completion_habit, lowest_completion_rate
+    # Only rates below 100% count, ties go to the habit added first; the rates are shared through the cache
+    below = [(name, rate) for name, rate in calculate_completion_rate(db_conn).items() if rate < 1.0]
+    if not below:
+        return None, 1.0
+    return min(below, key=lambda habit: habit[1])
 
 
+@analytics_cache.memoize
 def identify_habits_needing_improvement(db_conn, completion_rate_threshold=0.7):
     """
         Identify habits needing improvement based on a completion rate threshold.
 
         Parameters:
-        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
         - completion_rate_threshold (float): The threshold for identifying habits needing improvement.
 
         Returns:
         list: A list of tuples containing habit names and their completion rates needing improvement.
         """
 
-    habits_needing_improvement = []
+    return [(name, rate) for name, rate in calculate_completion_rate(db_conn).items() if rate < completion_rate_threshold]
 
-    # Calculate success rates for all habits
-    success_rates = calculate_completion_rate(db_conn)
 
-    # Check for habits needing improvement based on the completion rate threshold
-    for habit_name, success_rate in success_rates.items():
-        if success_rate < completion_rate_threshold:
-            habits_needing_improvement.append((habit_name, success_rate))
+@analytics_cache.memoize
+def completions_per_period(db_conn, habit_name):
+    """
+        Count the completions of a habit in each of its periods, from the per-period rollups.
+
+        Parameters:
+        - db_conn (sqlite3.Connection or storage.StorageBackend): The SQLite database connection or a storage backend.
+        - habit_name (str): The name of the habit.
 
-    return habits_needing_improvement
+        Returns:
+        dict: A dictionary mapping the first day of every completed period to its completion count.
+        """
 
+    if isinstance(db_conn, storage.StorageBackend):
+        return db_conn.completions_per_period(habit_name)
 
+    db.read_barrier(db_conn)
+    habit_id = db.get_habit_id(db_conn, habit_name)
+    if habit_id is None:
+        return {}
+    periodicity = db_conn.execute("SELECT periodicity FROM habits WHERE id=?", (habit_id,)).fetchone()[0]
+    return {periods.period_start(period, periodicity): count
+            for period, count in period_stats.completions_per_period(db_conn, habit_id, periodicity)}
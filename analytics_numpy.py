@@ -0,0 +1,220 @@
+from datetime import date
+import analytics_module
+import db
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the SQL implementation is used without it
+    np = None
+
+"""Vectorized analytics backend.
+
+habit_logs is loaded in chunks into NumPy arrays of habit ids and local day
+numbers, and streaks and gaps are computed with array operations. The functions
+have the same signatures as their counterparts in analytics_module and fall
+back to them (or to the streak run history) when NumPy is not installed.
+Completion rates and per-period counts are not vectorized: they are the
+analytics_module functions, which read the completion counters of habits and
+the per-period rollups in habit_period_stats, both already aggregated."""
+
+HAVE_NUMPY = np is not None
+
+CHUNK_SIZE = 100000
+
+# Local calendar day of a completion, numbered like date.toordinal()
+_DAY_SQL = "CAST(julianday(completion_time, 'unixepoch', 'localtime', 'start of day') - 1721424.5 AS INTEGER)"
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_PERIODICITY_CODES = {"daily": 0, "weekly": 1, "monthly": 2}
+
+
+def load_logs(db_conn, habit_id=None, chunk_size=CHUNK_SIZE):
+    """
+        Load habit_logs into arrays, ordered by habit and completion time.
+
+        Parameters:
+        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): Only load the logs of this habit (default is all habits).
+        - chunk_size (int): The number of rows fetched at once.
+
+        Returns:
+        tuple: Arrays of habit ids and local day numbers.
+        """
+    db.read_barrier(db_conn)
+    query = "SELECT habit_id, " + _DAY_SQL + " FROM habit_logs WHERE habit_id IS NOT NULL AND completion_time IS NOT NULL"
+    params = ()
+    if habit_id is not None:
+        query += " AND habit_id = ?"
+        params = (habit_id,)
+    cursor = db_conn.cursor()
+    cursor.execute(query + " ORDER BY habit_id, completion_time", params)
+    chunks = []
+    rows = cursor.fetchmany(chunk_size)
+    while rows:
+        chunks.append(np.array(rows, dtype=np.int64))
+        rows = cursor.fetchmany(chunk_size)
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    logs = np.concatenate(chunks)
+    return logs[:, 0], logs[:, 1]
+
+
+def _load_habits(db_conn):
+    """
+        Load the habits into arrays, ordered by id.
+
+        Parameters:
+        - db_conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        tuple: The habit names and arrays of ids, periodicity codes and creation day numbers.
+        """
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT id, name, periodicity, CAST(julianday(creation_time, 'unixepoch', 'localtime', "
+                   "'start of day') - 1721424.5 AS INTEGER) FROM habits ORDER BY id")
+    rows = cursor.fetchall()
+    names = [row[1] for row in rows]
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    codes = np.array([_PERIODICITY_CODES.get(row[2], -1) for row in rows], dtype=np.int64)
+    created = np.array([row[3] if row[3] is not None else 0 for row in rows], dtype=np.int64)
+    return names, ids, codes, created
+
+
+def _periods(days, codes):
+    """
+        Convert local day numbers to period numbers, as periods.period_index does.
+
+        Parameters:
+        - days (numpy.ndarray): Local day numbers.
+        - codes (numpy.ndarray): Periodicity codes of the same length (unknown ones count as daily).
+
+        Returns:
+        numpy.ndarray: The period numbers.
+        """
+    weeks = (days - 1) // 7
+    months = (days - _UNIX_EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) + 1970 * 12
+    return np.where(codes == 1, weeks, np.where(codes == 2, months, days))
+
+
+def _runs(habit_ids, period_numbers):
+    """
+        Find the runs of consecutive periods in logs ordered by habit and time.
+
+        Parameters:
+        - habit_ids (numpy.ndarray): The habit id of every log.
+        - period_numbers (numpy.ndarray): The period number of every log.
+
+        Returns:
+        tuple: Arrays with the habit id, start period, end period and length of every run.
+        """
+    if habit_ids.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    # Several completions within one period count once
+    first = np.ones(habit_ids.size, dtype=bool)
+    first[1:] = (habit_ids[1:] != habit_ids[:-1]) | (period_numbers[1:] != period_numbers[:-1])
+    habit_ids, period_numbers = habit_ids[first], period_numbers[first]
+
+    starts = np.ones(habit_ids.size, dtype=bool)
+    starts[1:] = (habit_ids[1:] != habit_ids[:-1]) | (np.diff(period_numbers) != 1)
+    run_numbers = np.cumsum(starts) - 1
+    lengths = np.bincount(run_numbers)
+    start_index = np.flatnonzero(starts)
+    end_index = np.append(start_index[1:], habit_ids.size) - 1
+    return habit_ids[start_index], period_numbers[start_index], period_numbers[end_index], lengths
+
+
+def _log_periods(db_conn, habit_id=None):
+    """
+        Load the logs and convert them to the periods of their habits.
+
+        Parameters:
+        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): Only load the logs of this habit (default is all habits).
+
+        Returns:
+        tuple: Arrays of habit ids and period numbers.
+        """
+    _, ids, codes, _ = _load_habits(db_conn)
+    log_habits, days = load_logs(db_conn, habit_id)
+    if log_habits.size == 0 or ids.size == 0:
+        return log_habits[:0], days[:0]
+    positions = np.searchsorted(ids, log_habits)
+    return log_habits, _periods(days, codes[positions])
+
+
+def find_longest_streak_overall(db_conn):
+    """
+       Find the longest streak among all habits, derived from their completion logs.
+
+       Parameters:
+       - db_conn (sqlite3.Connection): The SQLite database connection.
+
+       Returns:
+       int: The longest streak count.
+       """
+    _, _, _, lengths = _runs(*_log_periods(db_conn))
+    return int(lengths.max()) if lengths.size else 0
+
+
+def find_longest_streak_for_habit(db_conn, habit_name):
+    """
+        Find the longest streak for a specific habit, derived from its completion logs.
+
+        Parameters:
+        - db_conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+
+        Returns:
+        int: The longest streak count for the specified habit.
+        """
+    habit_id = db.get_habit_id(db_conn, habit_name)
+    if habit_id is None:
+        return 0
+    _, _, _, lengths = _runs(*_log_periods(db_conn, habit_id))
+    return int(lengths.max()) if lengths.size else 0
+
+
+def find_longest_gaps(db_conn):
+    """
+        Find the longest break between two completed periods of every habit.
+
+        Parameters:
+        - db_conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        dict: A dictionary mapping habit names to the number of periods in their longest gap.
+        """
+    names, ids, _, _ = _load_habits(db_conn)
+    run_habits, starts, ends, _ = _runs(*_log_periods(db_conn))
+    gaps = np.zeros(ids.size, dtype=np.int64)
+    if run_habits.size > 1:
+        same_habit = run_habits[1:] == run_habits[:-1]
+        positions = np.searchsorted(ids, run_habits[1:][same_habit])
+        np.maximum.at(gaps, positions, (starts[1:] - ends[:-1] - 1)[same_habit])
+    return dict(zip(names, gaps.tolist()))
+
+
+def _find_longest_gaps_sql(db_conn):
+    """Find the longest gap of every habit from the streak run history without NumPy."""
+    db.read_barrier(db_conn)
+    cursor = db_conn.cursor()
+    cursor.execute('''
+        SELECT h.name, COALESCE(MAX(gap), 0)
+        FROM habits h LEFT JOIN (
+            SELECT habit_id,
+                   start_period - LAG(end_period) OVER (PARTITION BY habit_id ORDER BY start_period) - 1 AS gap
+            FROM streak_runs
+        ) g ON g.habit_id = h.id
+        GROUP BY h.id ORDER BY h.id
+    ''')
+    return dict(cursor.fetchall())
+
+
+if np is None:
+    find_longest_streak_overall = analytics_module.find_longest_streak_overall
+    find_longest_streak_for_habit = analytics_module.find_longest_streak_for_habit
+    find_longest_gaps = _find_longest_gaps_sql
+
+# Completion counts are kept aggregated by triggers, loading the log would only be slower
+calculate_completion_rate = analytics_module.calculate_completion_rate
+completions_per_period = analytics_module.completions_per_period
@@ -0,0 +1,338 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+import analytics_module
+import connection
+import db
+import streaks
+
+"""Asyncio facade over db and analytics_module.
+
+    async with async_api.AsyncHabitTracker("habit_tracker.db") as tracker:
+        streak = await tracker.complete("Drink Water")
+        rates, longest = await asyncio.gather(tracker.completion_rates(), tracker.longest_streak())
+
+The blocking SQLite work never runs on the event loop. Reads go to a pool of
+reader threads, each with its own connection, so independent queries run
+concurrently (summary() gathers the common ones). Writes are queued for a
+single writer task, which hands them to one writer thread: they never wait
+for each other's locks, and the writes queued while one batch commits are
+committed together in the next transaction, each under its own savepoint.
+A write's result is only returned once it is committed."""
+
+# Writes committed together at most
+MAX_WRITE_BATCH = 100
+
+
+class ConnectionExecutor(concurrent.futures.Executor):
+    """Executor with a fixed set of threads, each calling functions with its own shared connection.
+
+    The connections are closed by their threads on shutdown, as sqlite3 requires."""
+
+    def __init__(self, database=None, workers=4, name="habit-worker"):
+        """
+        Parameters:
+        - database (str): The database path or URI (default is connection.DB_NAME).
+        - workers (int): The number of threads.
+        - name (str): The prefix of the thread names.
+        """
+        self.database = database
+        self._work = queue.Queue()
+        self._shutdown = False
+        self._shutdown_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._worker, name="%s-%d" % (name, number), daemon=True)
+                         for number in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, function, /, *args, **kwargs):
+        """Call function(conn, *args, **kwargs) on a worker thread with its connection."""
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new work after shutdown")
+            future = concurrent.futures.Future()
+            self._work.put((future, function, args, kwargs))
+        return future
+
+    def _worker(self):
+        while True:
+            item = self._work.get()
+            if item is None:
+                break
+            future, function, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function(connection.get_connection(self.database), *args, **kwargs)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        connection.close_all()
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._shutdown_lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self._work.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            for _ in self._threads:
+                self._work.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def _commit_writes(conn, writes):
+    """
+        Run queued writes in one transaction, each in a savepoint so a failing write only undoes itself.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - writes (list): (function, args) tuples; every function is called as function(conn, *args).
+
+        Returns:
+        list: One (True, result) or (False, exception) tuple per write.
+        """
+    outcomes = []
+    with db.transaction(conn):
+        for function, args in writes:
+            try:
+                with db.transaction(conn):
+                    outcomes.append((True, function(conn, *args)))
+            except Exception as error:
+                outcomes.append((False, error))
+    return outcomes
+
+
+def _habit_id(conn, habit_name):
+    habit_id = db.get_habit_id(conn, habit_name)
+    if habit_id is None:
+        raise ValueError("Habit '%s' not found." % habit_name)
+    return habit_id
+
+
+def _add_habit(conn, name, description, periodicity, category, creation_time):
+    if db.get_habit_id(conn, name) is not None:
+        raise ValueError("Habit '%s' already exists." % name)
+    db.add_habit(conn, name, description, periodicity, category, creation_time)
+
+
+def _update_habit(conn, habit_name, name, description, periodicity, category):
+    _habit_id(conn, habit_name)
+    db.update_habit(conn, habit_name, name, description, periodicity, category)
+
+
+def _delete_habit(conn, habit_name):
+    db.delete_habit_by_id(conn, _habit_id(conn, habit_name))
+
+
+def _complete(conn, habit_name, completion_time):
+    habit_id = _habit_id(conn, habit_name)
+    db.mark_as_completed_by_id(conn, habit_id, completion_time)
+    return streaks.current_streak(conn, habit_id)
+
+
+def _set_streak(conn, habit_name, streak):
+    _habit_id(conn, habit_name)
+    db.update_habit_progress(conn, habit_name, streak)
+
+
+def _current_streak(conn, habit_name):
+    habit_id = db.get_habit_id(conn, habit_name)
+    return streaks.current_streak(conn, habit_id) if habit_id is not None else None
+
+
+def _longest_streak(conn, habit_name):
+    if habit_name is None:
+        return analytics_module.find_longest_streak_overall(conn)
+    _habit_id(conn, habit_name)
+    return analytics_module.find_longest_streak_for_habit(conn, habit_name)
+
+
+class AsyncHabitTracker:
+    """Async access to one database: reads on a pool of reader threads, writes through a single writer task.
+
+    Use it as an async context manager, or call close() when done. Unknown
+    habits raise ValueError."""
+
+    def __init__(self, database=None, readers=4):
+        """
+        Parameters:
+        - database (str): The database path or URI (default is connection.DB_NAME).
+        - readers (int): The number of reader threads, i.e. of queries running at the same time.
+        """
+        if connection.is_private_memory(database):
+            # Every thread would open its own empty database, so reads would never see the writes
+            raise ValueError("An in-memory database must be shared by the threads, "
+                             "use a URI such as file:habits?mode=memory&cache=shared.")
+        self.database = database
+        self._readers = ConnectionExecutor(database, readers, "habit-reader")
+        self._writer = ConnectionExecutor(database, 1, "habit-writer")
+        self._writes = None
+        self._writer_task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Commit the queued writes, stop the writer task and close the connections."""
+        if self._writer_task is not None:
+            await self._writes.put(None)
+            await self._writer_task
+            self._writer_task = None
+        # Joining the threads waits for their connections to close
+        await asyncio.get_running_loop().run_in_executor(None, self._shutdown_executors)
+
+    def _shutdown_executors(self):
+        self._readers.shutdown()
+        self._writer.shutdown()
+
+    async def _read(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._readers, function, *args)
+
+    async def _write(self, function, *args):
+        if self._writer_task is None:
+            self._writes = asyncio.Queue()
+            self._writer_task = asyncio.get_running_loop().create_task(self._write_loop())
+        future = asyncio.get_running_loop().create_future()
+        await self._writes.put((function, args, future))
+        return await future
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = [await self._writes.get()]
+            # Everything queued meanwhile goes into the same transaction
+            while len(batch) < MAX_WRITE_BATCH and not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+            if None in batch:
+                stopping = True
+                batch.remove(None)
+            if not batch:
+                continue
+            try:
+                outcomes = await loop.run_in_executor(self._writer, _commit_writes,
+                                                      [(function, args) for function, args, _ in batch])
+            except Exception as error:  # The commit itself failed: every write of the batch is lost
+                outcomes = [(False, error)] * len(batch)
+            for (_, _, future), (succeeded, value) in zip(batch, outcomes):
+                if future.cancelled():
+                    continue
+                if succeeded:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    # Writes
+
+    async def add_habit(self, name, description=None, periodicity=None, category=None, creation_time=None):
+        """
+        Add a habit.
+
+        Parameters:
+        - name (str): The name of the habit.
+        - description (str): The description of the habit.
+        - periodicity (str): "daily", "weekly" or "monthly".
+        - category (str): The category of the habit.
+        - creation_time (datetime or int): The creation time (default is now).
+        """
+        await self._write(_add_habit, name, description, periodicity, category,
+                          int(time.time()) if creation_time is None else creation_time)
+
+    async def update_habit(self, habit_name, name, description, periodicity, category):
+        """Update the name, description, periodicity and category of a habit."""
+        await self._write(_update_habit, habit_name, name, description, periodicity, category)
+
+    async def delete_habit(self, habit_name):
+        """Delete a habit and its completions."""
+        await self._write(_delete_habit, habit_name)
+
+    async def complete(self, habit_name, completion_time=None):
+        """
+        Mark a habit as completed.
+
+        Parameters:
+        - habit_name (str): The name of the habit.
+        - completion_time (datetime or int): The completion time (default is now).
+
+        Returns:
+        int: The current streak of the habit after the completion.
+        """
+        return await self._write(_complete, habit_name, int(time.time()) if completion_time is None else completion_time)
+
+    async def set_streak(self, habit_name, streak):
+        """Set the stored streak count of a habit."""
+        await self._write(_set_streak, habit_name, streak)
+
+    # Reads
+
+    async def habit_names(self):
+        """Return the names of all habits, in name order."""
+        return await self._read(analytics_module.get_all_tracked_habits)
+
+    async def habits_with_periodicity(self, periodicity):
+        """Return the names of the habits with a periodicity, in name order."""
+        return await self._read(analytics_module.habits_by_periodicity, periodicity)
+
+    async def habit_page(self, order_by="name", page_token=None, page_size=50, periodicity=None):
+        """Return one page of habit records and the token of the next page, as db.get_habit_page."""
+        return await self._read(db.get_habit_page, order_by, page_token, page_size, periodicity)
+
+    async def streak(self, habit_name):
+        """Return the current streak of a habit, 0 once a period was missed, or None if it does not exist."""
+        return await self._read(_current_streak, habit_name)
+
+    async def completion_rates(self):
+        """Return a dict mapping every habit name to its completion rate."""
+        return await self._read(analytics_module.calculate_completion_rate)
+
+    async def completion_rate(self, habit_name):
+        """Return the completion rate of a habit, or None if it does not exist."""
+        return await self._read(analytics_module.calculate_completion_rate_for_habit, habit_name)
+
+    async def lowest_completion_rate(self):
+        """Return the name and rate of the habit with the lowest completion rate below 100%."""
+        return await self._read(analytics_module.find_habit_with_lowest_completion_rate)
+
+    async def habits_needing_improvement(self, threshold=0.7):
+        """Return (name, rate) tuples of the habits with a completion rate below the threshold."""
+        return await self._read(analytics_module.identify_habits_needing_improvement, threshold)
+
+    async def longest_streak(self, habit_name=None):
+        """Return the longest streak of a habit, or of all habits if habit_name is None."""
+        return await self._read(_longest_streak, habit_name)
+
+    async def completions_per_period(self, habit_name):
+        """Return a dict mapping the first day of every completed period of a habit to its completion count."""
+        return await self._read(analytics_module.completions_per_period, habit_name)
+
+    async def summary(self, threshold=0.7):
+        """
+        Run the overview queries concurrently on the reader threads.
+
+        Parameters:
+        - threshold (float): The completion rate below which a habit needs improvement.
+
+        Returns:
+        dict: The habit names, completion rates, lowest completion rate,
+        habits needing improvement and longest streak overall.
+        """
+        names, rates, lowest, needing_improvement, longest = await asyncio.gather(
+            self.habit_names(), self.completion_rates(), self.lowest_completion_rate(),
+            self.habits_needing_improvement(threshold), self.longest_streak())
+        return {"habits": names, "completion_rates": rates, "lowest_completion_rate": lowest,
+                "needing_improvement": needing_improvement, "longest_streak": longest}
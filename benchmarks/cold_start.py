@@ -0,0 +1,92 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+import datagen
+
+"""Cold-start latency of the headless commands and of the interactive menus.
+
+Every case runs main.py (or the menu imports) in a new Python process against
+a generated database and reports the median wall-clock time, next to an empty
+interpreter start as the baseline.
+
+    python benchmarks/cold_start.py --runs 20"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+
+def cases(database, habit_name):
+    """
+        Build the commands to time.
+
+        Parameters:
+        - database (str): The generated database.
+        - habit_name (str): A habit of the database.
+
+        Returns:
+        list: (name, argument list) tuples.
+        """
+    command = [sys.executable, MAIN, "--database", database]
+    return [
+        ("python (empty interpreter)", [sys.executable, "-c", "pass"]),
+        ("main.py complete", command + ["complete", habit_name]),
+        ("main.py rates --json", command + ["rates", "--json"]),
+        ("main.py longest-streak", command + ["longest-streak"]),
+        # The menu flow: everything main_menu() needs imported, up to the first prompt
+        ("menu imports", [sys.executable, "-c", "import sys; sys.path.insert(0, %r); import main; main.load_menus()"
+                          % ROOT]),
+    ]
+
+
+def time_command(arguments, runs):
+    """
+        Run a command repeatedly in new processes.
+
+        Parameters:
+        - arguments (list): The command line.
+        - runs (int): The number of runs.
+
+        Returns:
+        float: The median wall-clock time in milliseconds, or None if the command failed.
+        """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+        timings.append((time.perf_counter() - start) * 1000)
+        if completed.returncode != 0:
+            return None
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start latency of main.py.")
+    parser.add_argument("--dataset", choices=sorted(datagen.DATASETS), default="tiny")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    database = connection.temporary_database()
+    try:
+        conn = connection.open_connection(database)
+        habits, logs = datagen.DATASETS[args.dataset]
+        names = datagen.generate(conn, habits, logs, 42)
+        conn.close()
+        for name, arguments in cases(database, names[0]):
+            median = time_command(arguments, args.runs)
+            if median is None:
+                print("%-32s failed (is questionary installed?)" % name)
+            else:
+                print("%-32s median %8.1f ms" % (name, median))
+    finally:
+        connection.remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
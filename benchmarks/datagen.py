@@ -0,0 +1,71 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import periods
+import streaks
+
+"""Reproducible synthetic habit tracker datasets for the benchmarks."""
+
+# name: (habits, logs)
+DATASETS = {
+    "tiny": (100, 10000),
+    "small": (1000, 1000000),
+    "medium": (100000, 1000000),
+    "large": (100000, 10000000),
+}
+
+CATEGORIES = ["Health", "Fitness", "Personal Development", "Work", "Hobby"]
+HISTORY_DAYS = 365
+BATCH_SIZE = 50000
+
+
+def generate(conn, habits, logs, seed=42, now=None):
+    """
+        Fill an empty database with habits of mixed periodicities and their completions.
+        Habits are created up to a year ago; completions fall between creation and now.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habits (int): The number of habits.
+        - logs (int): The number of completion logs.
+        - seed (int): The seed of the random generator, so datasets can be reproduced.
+        - now (int): The current time as UTC epoch seconds (default is the current time).
+
+        Returns:
+        list: The names of the generated habits.
+        """
+    generator = random.Random(seed)
+    now = int(time.time()) if now is None else now
+    cursor = conn.cursor()
+
+    names = []
+    created = []
+    rows = []
+    for number in range(habits):
+        name = "habit-%07d" % number
+        creation_time = now - generator.randint(1, HISTORY_DAYS) * 86400
+        names.append(name)
+        created.append(creation_time)
+        rows.append((name, "Synthetic habit %d" % number, generator.choice(periods.PERIODICITIES),
+                     generator.choice(CATEGORIES), creation_time))
+    cursor.executemany('INSERT INTO habits (name, description, periodicity, category, creation_time) '
+                       'VALUES (?, ?, ?, ?, ?)', rows)
+    habit_ids = [row[0] for row in cursor.execute('SELECT id FROM habits ORDER BY id')]
+
+    batch = []
+    for _ in range(logs):
+        index = generator.randrange(habits)
+        batch.append((habit_ids[index], 1, generator.randint(created[index], now)))
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany('INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES (?, ?, ?)', batch)
+            batch = []
+    if batch:
+        cursor.executemany('INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES (?, ?, ?)', batch)
+
+    streaks.rebuild_all(conn)
+    conn.commit()
+    return names
@@ -0,0 +1,184 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection
+import datagen
+import server
+
+"""Load test of the JSON HTTP service with a mix of reads and writes.
+
+Client threads send requests back to back for a fixed time: completions and
+streak updates as writes, per-habit analytics and habit pages as reads. The
+script reports the sustained requests per second, the client-side latency
+percentiles and the server's own /stats. By default the server runs in this
+process on a generated database; --url targets a running server instead.
+
+    python benchmarks/load_test.py --clients 16 --seconds 10 --writes 0.2
+    python benchmarks/load_test.py --url http://127.0.0.1:8765 --habit "Drink Water\""""
+
+# (weight, method, path) of the reads; {name} is a random habit
+READS = [
+    (4, "GET", "/analytics/completion-rates/{name}"),
+    (3, "GET", "/analytics/longest-streak/{name}"),
+    (2, "GET", "/habits?page_size=20"),
+    (1, "GET", "/analytics/completions-per-period/{name}"),
+]
+WRITES = [
+    (9, "POST", "/habits/{name}/complete"),
+    (1, "PUT", "/habits/{name}/streak"),
+]
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def client(host, port, names, writes, deadline, seed, results):
+    """
+        Send requests until the deadline and collect their latencies.
+
+        Parameters:
+        - host (str): The server host.
+        - port (int): The server port.
+        - names (list): The habits to use.
+        - writes (float): The fraction of requests that are writes.
+        - deadline (float): The time.perf_counter() value to stop at.
+        - seed (int): The seed of the random generator of this client.
+        - results (list): Receives (latency in seconds, is a write, HTTP status) tuples.
+        """
+    generator = random.Random(seed)
+    read_weights = [weight for weight, _, _ in READS]
+    write_weights = [weight for weight, _, _ in WRITES]
+    timings = []
+    while time.perf_counter() < deadline:
+        is_write = generator.random() < writes
+        _, method, path = generator.choices(WRITES, write_weights)[0] if is_write else generator.choices(READS, read_weights)[0]
+        path = path.format(name=quote(generator.choice(names)))
+        body = json.dumps({"streak": generator.randint(0, 10)}) if method == "PUT" else None
+        start = time.perf_counter()
+        # The server speaks HTTP/1.0, one request per connection
+        http_connection = http.client.HTTPConnection(host, port, timeout=30)
+        try:
+            http_connection.request(method, path, body, {"Content-Type": "application/json"})
+            response = http_connection.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            status = 0
+        finally:
+            http_connection.close()
+        timings.append((time.perf_counter() - start, is_write, status))
+    results.extend(timings)
+
+
+def run(host, port, names, clients, seconds, writes):
+    """
+        Run the client threads and summarize their requests.
+
+        Parameters:
+        - host (str): The server host.
+        - port (int): The server port.
+        - names (list): The habits to use.
+        - clients (int): The number of client threads.
+        - seconds (float): The duration of the test.
+        - writes (float): The fraction of requests that are writes.
+
+        Returns:
+        dict: The requests, failures and requests per second, and the latency percentiles
+        in milliseconds of the reads and the writes.
+        """
+    results = []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client, args=(host, port, names, writes, deadline, seed, results))
+               for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = {"requests": len(results), "failures": sum(1 for _, _, status in results if not 200 <= status < 300),
+               "requests_per_second": len(results) / elapsed}
+    for label, is_write in (("reads", False), ("writes", True)):
+        ordered = sorted(latency for latency, write, _ in results if write == is_write)
+        summary[label] = {"requests": len(ordered), "p50_ms": _percentile(ordered, 0.50) * 1000,
+                          "p95_ms": _percentile(ordered, 0.95) * 1000, "p99_ms": _percentile(ordered, 0.99) * 1000}
+    return summary
+
+
+def fetch_stats(host, port):
+    http_connection = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        http_connection.request("GET", "/stats")
+        return json.loads(http_connection.getresponse().read())
+    finally:
+        http_connection.close()
+
+
+def report(summary, stats):
+    print(f"{summary['requests']} requests, {summary['failures']} failed, "
+          f"{summary['requests_per_second']:.0f} requests/s")
+    for label in ("reads", "writes"):
+        latencies = summary[label]
+        print("%-8s %7d requests   p50 %7.2f ms   p95 %7.2f ms   p99 %7.2f ms"
+              % (label, latencies["requests"], latencies["p50_ms"], latencies["p95_ms"], latencies["p99_ms"]))
+    print("\nServer latency per route:")
+    for route, route_stats in stats["routes"].items():
+        print("%-48s %7d calls   p50 %7.2f ms   p95 %7.2f ms   p99 %7.2f ms"
+              % (route, route_stats["calls"], route_stats["p50_ms"], route_stats["p95_ms"], route_stats["p99_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the JSON HTTP service with mixed reads and writes.")
+    parser.add_argument("--url", help="a running server (default: start one on a generated database)")
+    parser.add_argument("--habit", action="append", help="with --url: a habit to use (repeatable)")
+    parser.add_argument("--dataset", choices=sorted(datagen.DATASETS), default="tiny")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writes", type=float, default=0.2, help="fraction of requests that are writes")
+    parser.add_argument("--workers", type=int, default=8, help="worker threads of the started server")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.habit:
+            parser.error("--url needs at least one --habit")
+        url = urlsplit(args.url)
+        summary = run(url.hostname, url.port or 80, args.habit, args.clients, args.seconds, args.writes)
+        report(summary, fetch_stats(url.hostname, url.port or 80))
+        return
+
+    database = connection.temporary_database()
+    habit_server = None
+    try:
+        conn = connection.open_connection(database)
+        habits, logs = datagen.DATASETS[args.dataset]
+        names = datagen.generate(conn, habits, logs, 42)
+        conn.close()
+        habit_server = server.HabitServer(("127.0.0.1", 0), database, args.workers, queue_size=args.clients * 2)
+        threading.Thread(target=habit_server.serve_forever, daemon=True).start()
+        host, port = habit_server.server_address
+        print(f"{args.clients} clients, {args.workers} workers, {args.writes:.0%} writes, "
+              f"{args.dataset} dataset, {args.seconds:g} s")
+        summary = run(host, port, names, args.clients, args.seconds, args.writes)
+        report(summary, fetch_stats(host, port))
+    finally:
+        if habit_server is not None:
+            habit_server.shutdown()
+            habit_server.server_close()
+        connection.remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics_cache
+import analytics_module
+import connection
+import datagen
+import db
+import storage
+from habit import Habit
+
+"""Benchmarks for the db and analytics hot paths.
+
+Every run builds a synthetic dataset in a temporary database, times the
+benchmarks and writes the results to JSON. Pass --compare with an earlier
+result file to report regressions.
+
+    python benchmarks/run_benchmarks.py --dataset small --output small.json
+    python benchmarks/run_benchmarks.py --dataset small --compare small.json
+"""
+
+
+def measure(function, repeat):
+    """
+        Time a function.
+
+        Parameters:
+        - function (callable): The function to time, called without arguments. A function that
+          returns a number of seconds times itself, e.g. to leave out its setup.
+        - repeat (int): The number of calls.
+
+        Returns:
+        dict: The number of calls and the min, median, mean and max time in milliseconds.
+        """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        seconds = function()
+        if not isinstance(seconds, float):
+            seconds = time.perf_counter() - start
+        timings.append(seconds * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.mean(timings),
+        "max_ms": max(timings),
+    }
+
+
+def _quietly(function):
+    """Wrap a function so its console output is discarded."""
+    def quiet():
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+    return quiet
+
+
+def _uncached(function):
+    """Wrap an analytics function so every call computes its result instead of hitting the cache."""
+    def uncached():
+        analytics_cache.clear()
+        function()
+    return uncached
+
+
+def benchmarks(conn, names, repeat):
+    """
+        Build the benchmarks to run against a generated database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The connection to the generated database.
+        - names (list): The names of the generated habits.
+        - repeat (int): The number of calls of the slow (whole database) benchmarks.
+
+        Returns:
+        list: (name, function, calls) tuples.
+        """
+    counter = iter(range(10 ** 9))
+
+    def add_habit():
+        db.add_habit(conn, "bench-%d" % next(counter), "Benchmark habit", "daily", "Benchmark", int(time.time()))
+
+    def mark_as_completed():
+        db.mark_as_completed(conn, names[next(counter) % len(names)], int(time.time()))
+
+    def mark_many_completed():
+        now = int(time.time())
+        db.mark_many_completed(conn, ((names[number % len(names)], now) for number in range(10000)))
+
+    def complete_habit():
+        # The CLI flow: a Habit on the shared connection of its database completes and reports its streak
+        Habit(names[next(counter) % len(names)], database=conn.database).complete_habit()
+
+    def delete_habit_with_logs():
+        # A habit with a long history; only the delete is timed
+        name = "bench-delete-%d" % next(counter)
+        db.add_habit(conn, name, "Benchmark habit", "daily", "Benchmark", int(time.time()) - 86400 * 365)
+        db.mark_many_completed(conn, ((name, int(time.time()) - minute * 60) for minute in range(40000)))
+        start = time.perf_counter()
+        db.delete_habit(conn, name)
+        return time.perf_counter() - start
+
+    # The zero-I/O engine, loaded with a copy of the generated database
+    memory = storage.MemoryBackend.load(conn)
+
+    def memory_mark_as_completed():
+        memory.mark_as_completed(names[next(counter) % len(names)], int(time.time()))
+
+    cases = [
+        ("db.add_habit", add_habit, 200),
+        ("db.mark_as_completed", mark_as_completed, 200),
+        ("db.mark_many_completed[10k]", mark_many_completed, repeat),
+        ("habit.complete_habit", _quietly(complete_habit), 200),
+        ("db.delete_habit[40k logs]", delete_habit_with_logs, 3),
+        ("analytics.calculate_completion_rate",
+         _uncached(lambda: analytics_module.calculate_completion_rate(conn)), repeat),
+        ("analytics.calculate_completion_rate[cached]", lambda: analytics_module.calculate_completion_rate(conn), 200),
+        ("analytics.find_habit_with_lowest_completion_rate",
+         _uncached(lambda: analytics_module.find_habit_with_lowest_completion_rate(conn)), repeat),
+        ("analytics.identify_habits_needing_improvement",
+         _uncached(lambda: analytics_module.identify_habits_needing_improvement(conn)), repeat),
+        ("analytics.find_longest_streak_overall",
+         _uncached(lambda: analytics_module.find_longest_streak_overall(conn)), repeat),
+        ("analytics.find_longest_streak_for_habit",
+         _uncached(lambda: analytics_module.find_longest_streak_for_habit(conn, names[0])), 200),
+        ("storage.memory.mark_as_completed", memory_mark_as_completed, 200),
+        ("storage.memory.completion_rates", memory.completion_rates, repeat),
+        ("storage.memory.longest_streak_overall", memory.longest_streak_overall, repeat),
+    ]
+
+    try:
+        import main
+        main.load_menus()
+    except ImportError:  # The menus need questionary
+        print("questionary is not installed, skipping the menu benchmarks", file=sys.stderr)
+    else:
+        cases.append(("menu.show_all_habits", _quietly(lambda: main.show_all_habits_menu(conn)), repeat))
+    return cases
+
+
+def run(dataset, repeat, seed, storage="file"):
+    """
+        Generate a dataset in a temporary database and run every benchmark against it.
+
+        Parameters:
+        - dataset (str): The name of the dataset in datagen.DATASETS.
+        - repeat (int): The number of calls of the slow benchmarks.
+        - seed (int): The seed of the data generator.
+        - storage (str): "file" for a temporary database file, "memory" for a shared in-memory database.
+
+        Returns:
+        dict: The benchmark report.
+        """
+    habits, logs = datagen.DATASETS[dataset]
+    directory = tempfile.mkdtemp(prefix="habit-bench-")
+    if storage == "memory":
+        database = "file:habit-bench-%d?mode=memory&cache=shared" % os.getpid()
+    else:
+        database = os.path.join(directory, "bench.db")
+    try:
+        conn = connection.open_connection(database)
+        start = time.perf_counter()
+        names = datagen.generate(conn, habits, logs, seed)
+        generation_seconds = time.perf_counter() - start
+
+        results = {}
+        for name, function, calls in benchmarks(conn, names, repeat):
+            results[name] = measure(function, calls)
+            print("%-52s median %10.3f ms" % (name, results[name]["median_ms"]))
+        connection.close_connection(database)
+        conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "dataset": {"name": dataset, "habits": habits, "logs": logs, "seed": seed, "storage": storage,
+                    "generation_seconds": generation_seconds},
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform()},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """
+        Compare the median timings of a report with an earlier one.
+
+        Parameters:
+        - report (dict): The current benchmark report.
+        - baseline (dict): The earlier benchmark report.
+        - threshold (float): The slowdown ratio above which a benchmark counts as a regression.
+
+        Returns:
+        list: The names of the regressed benchmarks.
+        """
+    regressions = []
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or previous["median_ms"] == 0:
+            continue
+        ratio = result["median_ms"] / previous["median_ms"]
+        marker = "REGRESSION" if ratio > threshold else ""
+        print("%-52s %8.2fx %s" % (name, ratio, marker))
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the habit tracker db and analytics hot paths.")
+    parser.add_argument("--dataset", choices=sorted(datagen.DATASETS), default="tiny")
+    parser.add_argument("--repeat", type=int, default=5, help="calls of the whole-database benchmarks")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--storage", choices=["file", "memory"], default="file",
+                        help="run against a temporary database file or an in-memory database")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    report = run(args.dataset, args.repeat, args.seed, args.storage)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(report, json.load(baseline), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
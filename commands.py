@@ -0,0 +1,166 @@
+import json
+import os
+import sys
+
+"""Headless subcommands of main.py, for scripts, cron jobs and shell integrations.
+
+    python main.py complete "Drink Water"
+    python main.py rates --json
+    python main.py longest-streak [habit]
+    python main.py list [--periodicity weekly]
+
+The modules doing the work are imported inside the commands and the database
+is opened by the command that runs, so starting one of them does not load the
+interactive menus (questionary) or anything another command needs. Commands
+exit with status 0 on success and 1 for an unknown habit."""
+
+
+def _connection(args):
+    """Open the shared connection to the database chosen on the command line."""
+    import connection
+    return connection.get_connection(args.database)
+
+
+def _print_json(value):
+    json.dump(value, sys.stdout)
+    sys.stdout.write("\n")
+
+
+def _unknown_habit(habit_name):
+    print(f"Habit '{habit_name}' not found.", file=sys.stderr)
+    return 1
+
+
+def _time(value):
+    """Parse --time as an ISO date or datetime, reporting bad values as usage errors."""
+    import argparse
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected an ISO date or datetime, got %r" % value)
+
+
+def complete(args):
+    """Mark a habit as completed now (or at --time) and print its current streak."""
+    import db
+    import streaks
+    from datetime import datetime
+    conn = _connection(args)
+    completion_time = args.time or datetime.now()
+    # The log entry and the streak update are committed together
+    with db.transaction(conn):
+        habit_id = db.get_habit_id(conn, args.habit)
+        if habit_id is not None:
+            db.mark_as_completed_by_id(conn, habit_id, completion_time)
+            streak = streaks.current_streak(conn, habit_id)
+    if habit_id is None:
+        return _unknown_habit(args.habit)
+    if args.json:
+        _print_json({"habit": args.habit, "streak": streak})
+    else:
+        print(f"Streak for habit '{args.habit}' is now {streak}.")
+    return 0
+
+
+def rates(args):
+    """Print the completion rates of all habits, or of one with --habit."""
+    import analytics_module
+    conn = _connection(args)
+    if args.habit is not None:
+        rate = analytics_module.calculate_completion_rate_for_habit(conn, args.habit)
+        if rate is None:
+            return _unknown_habit(args.habit)
+        completion_rates = {args.habit: rate}
+    else:
+        completion_rates = analytics_module.calculate_completion_rate(conn)
+    if args.json:
+        _print_json(completion_rates)
+    else:
+        for habit_name, rate in completion_rates.items():
+            print(f"{habit_name}: {rate:.2%}")
+    return 0
+
+
+def longest_streak(args):
+    """Print the longest streak of one habit, or of all habits."""
+    import analytics_module
+    import db
+    conn = _connection(args)
+    if args.habit is not None:
+        if db.get_habit_id(conn, args.habit) is None:
+            return _unknown_habit(args.habit)
+        streak = analytics_module.find_longest_streak_for_habit(conn, args.habit)
+    else:
+        streak = analytics_module.find_longest_streak_overall(conn)
+    if args.json:
+        _print_json({"habit": args.habit, "longest_streak": streak})
+    else:
+        print(streak)
+    return 0
+
+
+def list_habits(args):
+    """Print the habit names, streamed in name order."""
+    import db
+    conn = _connection(args)
+    if args.periodicity is not None:
+        names = db.iter_habits_with_periodicity(conn, args.periodicity)
+    else:
+        names = db.iter_habit_names(conn)
+    if args.json:
+        _print_json(list(names))
+    else:
+        for name in names:
+            print(name)
+    return 0
+
+
+def add_parsers(subparsers):
+    """
+        Register the subcommands on the command line parser of main.py.
+
+        Parameters:
+        - subparsers (argparse._SubParsersAction): The result of ArgumentParser.add_subparsers().
+        """
+    parser = subparsers.add_parser("complete", help="mark a habit as completed")
+    parser.add_argument("habit", help="the name of the habit")
+    parser.add_argument("--time", type=_time, help="the completion time as an ISO date or datetime (default: now)")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.set_defaults(run=complete)
+
+    parser = subparsers.add_parser("rates", help="print completion rates")
+    parser.add_argument("--habit", help="only this habit")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.set_defaults(run=rates)
+
+    parser = subparsers.add_parser("longest-streak", help="print the longest streak")
+    parser.add_argument("habit", nargs="?", help="only this habit (default: all habits)")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.set_defaults(run=longest_streak)
+
+    parser = subparsers.add_parser("list", help="list the habits")
+    parser.add_argument("--periodicity", help="only habits with this periodicity")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.set_defaults(run=list_habits)
+
+
+def run(args):
+    """
+        Run the subcommand parsed from the command line and close the connection.
+
+        Parameters:
+        - args (argparse.Namespace): The parsed arguments, with database and run set.
+
+        Returns:
+        int: The exit status.
+        """
+    try:
+        return args.run(args)
+    except BrokenPipeError:
+        # The reader of the output went away (e.g. head); stop without a traceback
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if "connection" in sys.modules:
+            sys.modules["connection"].close_all()
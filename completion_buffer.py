@@ -0,0 +1,228 @@
+import logging
+import os
+import threading
+import time
+import connection
+import db
+
+"""Write-behind buffer for habit completions.
+
+Completions are queued in memory and written by db.mark_many_completed as one
+transaction (group commit) when the queue reaches max_size, when the oldest
+completion has waited max_delay seconds, on flush() and on close(). While a
+buffer is active, db and the analytics modules flush it before they read
+completion data, so reads always see the queued completions.
+
+Queued completions are lost if the process is killed before they are written."""
+
+logger = logging.getLogger(__name__)
+
+MAX_SIZE = 500
+MAX_DELAY = 0.5
+
+_active = None
+
+
+class CompletionBuffer:
+    def __init__(self, database=None, max_size=MAX_SIZE, max_delay=MAX_DELAY, background=True):
+
+        """ Initialize a write-behind buffer for one database.
+               Parameters:
+               - database (str): The database path (default is connection.DB_NAME).
+               - max_size (int): The queue length that triggers a flush.
+               - max_delay (float): The seconds a completion may wait before it is flushed.
+               - background (bool): Flush on time in a background thread; otherwise the age
+                 of the queue is only checked when a completion is added.
+               """
+
+        self.database = connection._resolve(database)
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._key = connection._database_key(self.database)
+        self._queue = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        # Held for a whole flush, re-entered by the read barrier of the flush's own writes
+        self._flush_lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._stats = {"queued": 0, "flushed": 0, "rejected": 0, "flushes": 0, "max_depth": 0,
+                       "total_flush_ms": 0.0, "max_flush_ms": 0.0, "last_flush_ms": 0.0}
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name="completion-buffer", daemon=True)
+            self._thread.start()
+
+    def add(self, habit_name, completion_time):
+        """ Queue a completion, flushing if the queue is full or too old.
+               Parameters:
+               - habit_name (str): The name of the habit.
+               - completion_time (datetime or int): The completion time of the habit.
+               """
+
+        with self._lock:
+            if not self._queue:
+                self._oldest = time.monotonic()
+                self._wakeup.set()
+            self._queue.append((habit_name, db.to_epoch(completion_time)))
+            self._stats["queued"] += 1
+            depth = len(self._queue)
+            self._stats["max_depth"] = max(self._stats["max_depth"], depth)
+            overdue = time.monotonic() - self._oldest >= self.max_delay
+        if depth >= self.max_size or overdue:
+            self.flush()
+
+    def flush(self, conn=None):
+        """ Write every queued completion in one transaction.
+               Parameters:
+               - conn (sqlite3.Connection): A connection to the buffer's database to write with
+                 (default is the shared connection of the current thread).
+
+               Returns:
+               int: The number of completions written.
+               """
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queue = self._queue, []
+                self._oldest = None
+            if not batch:
+                return 0
+            if conn is None or connection._database_key(getattr(conn, "database", None) or "") != self._key:
+                conn = connection.get_connection(self.database)
+            start = time.perf_counter()
+            try:
+                inserted, rejected = db.mark_many_completed(conn, batch)
+            except Exception:
+                # Keep the completions, in order, for the next flush
+                with self._lock:
+                    self._queue[:0] = batch
+                    self._oldest = time.monotonic()
+                raise
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats["flushed"] += inserted
+                self._stats["rejected"] += rejected
+                self._stats["flushes"] += 1
+                self._stats["total_flush_ms"] += elapsed
+                self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed)
+                self._stats["last_flush_ms"] = elapsed
+            return inserted
+
+    def pending(self):
+        """ Return the number of queued completions. """
+
+        with self._lock:
+            return len(self._queue)
+
+    def stats(self):
+        """ Return the queue depth and flush latency statistics as a dictionary. """
+
+        with self._lock:
+            stats = dict(self._stats, depth=len(self._queue))
+        stats["mean_flush_ms"] = stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+
+    def close(self):
+        """ Stop the background thread and write the remaining completions. """
+
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        """ Flush the queue from the background thread once its oldest completion is due. """
+
+        while not self._stopped.is_set():
+            with self._lock:
+                oldest = self._oldest
+            if oldest is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            remaining = oldest + self.max_delay - time.monotonic()
+            if remaining > 0:
+                self._stopped.wait(remaining)
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing %d buffered completions failed", self.pending())
+                self._stopped.wait(self.max_delay)
+        # The thread's shared connection was opened by flush()
+        connection.close_connection(self.database)
+
+    def _read_barrier(self, conn):
+        # Waiting for the flush lock also waits for a flush that already emptied the queue
+        with self._flush_lock:
+            if self._queue:
+                self.flush(conn)
+
+
+def start(database=None, **options):
+    """
+        Start the write-behind buffer used by Habit.complete_habit.
+
+        Parameters:
+        - database (str): The database path (default is connection.DB_NAME).
+        - options: max_size, max_delay and background, as accepted by CompletionBuffer.
+
+        Returns:
+        CompletionBuffer: The active buffer.
+        """
+    global _active
+    stop()
+    _active = CompletionBuffer(database, **options)
+    db.add_read_barrier(_active._read_barrier)
+    return _active
+
+
+def stop():
+    """
+        Write the remaining completions and deactivate the buffer.
+
+        Returns:
+        dict: The statistics of the stopped buffer, or None if no buffer was active.
+        """
+    global _active
+    buffer, _active = _active, None
+    if buffer is None:
+        return None
+    buffer.close()
+    db.remove_read_barrier(buffer._read_barrier)
+    return buffer.stats()
+
+
+def active(database=None):
+    """
+        Retrieve the active buffer of a database.
+
+        Parameters:
+        - database (str): The database path (default is connection.DB_NAME).
+
+        Returns:
+        CompletionBuffer: The active buffer, or None if completions are written directly.
+        """
+    if _active is not None and _active._key == connection._database_key(connection._resolve(database)):
+        return _active
+    return None
+
+
+def start_from_environment(database=None):
+    """
+        Start the buffer when the HABIT_WRITE_BEHIND environment variable is set.
+        Its value is the queue length that triggers a flush ("1" uses the default).
+
+        Parameters:
+        - database (str): The database path (default is connection.DB_NAME).
+
+        Returns:
+        CompletionBuffer: The active buffer, or None if the variable is not set.
+        """
+    value = os.environ.get("HABIT_WRITE_BEHIND", "")
+    if not value or value == "0":
+        return None
+    max_size = int(value) if value.isdigit() and int(value) > 1 else MAX_SIZE
+    return start(database, max_size=max_size)
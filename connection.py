@@ -0,0 +1,226 @@
+import itertools
+import os
+import sqlite3
+import threading
+import migrations
+
+"""Shared SQLite connections, configured once and handed out per thread.
+
+A database is a file path, ":memory:" for a database private to one
+connection, or a "file:" URI such as "file:tests?mode=memory&cache=shared"
+for an in-memory database shared by the connections of this process.
+Functions called without a database use DB_NAME, which defaults to the
+HABIT_TRACKER_DB environment variable or habit_tracker.db."""
+
+DB_NAME = os.environ.get("HABIT_TRACKER_DB") or "habit_tracker.db"
+
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 20000
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+_memory_numbers = itertools.count(1)
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection that remembers which database it was opened on.
+
+    database_key identifies the database within the process (every in-memory
+    database gets its own). data_version is the last PRAGMA data_version
+    db.sync_data_version saw on this connection."""
+
+    database = None
+    database_key = None
+    data_version = None
+
+
+# The class of new connections; tracing swaps in an instrumented subclass
+CONNECTION_CLASS = Connection
+
+
+def _resolve(database):
+    """
+        Apply the default database.
+
+        Parameters:
+        - database (str): The database path or URI, or None for DB_NAME.
+
+        Returns:
+        str: The database path or URI.
+        """
+    return DB_NAME if database is None else database
+
+
+def is_memory(database):
+    """
+        Check whether a database lives in memory.
+
+        Parameters:
+        - database (str): The database path or URI.
+
+        Returns:
+        bool: True for ":memory:" and in-memory URIs.
+        """
+    return database == ":memory:" or database.startswith("file::memory:") or (
+        database.startswith("file:") and "mode=memory" in database)
+
+
+def is_private_memory(database=None):
+    """
+        Check whether a database lives in memory without a shared cache, so that
+        every connection to it opens its own empty database.
+
+        Parameters:
+        - database (str): The database path or URI (default is DB_NAME).
+
+        Returns:
+        bool: True for ":memory:" and in-memory URIs without cache=shared.
+        """
+    database = _resolve(database)
+    return is_memory(database) and "cache=shared" not in database
+
+
+def _database_key(database):
+    """
+        Normalize a database location so the same file always maps to one key.
+
+        Parameters:
+        - database (str): The database path or URI.
+
+        Returns:
+        str: The key identifying the database.
+        """
+    if database == ":memory:" or database.startswith("file:"):
+        return database
+    return os.path.abspath(database)
+
+
+def configure(conn):
+    """
+        Apply the connection settings used by the habit tracker.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        """
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA busy_timeout = %d' % BUSY_TIMEOUT_MS)
+    conn.execute('PRAGMA cache_size = -%d' % CACHE_SIZE_KIB)
+    conn.execute('PRAGMA foreign_keys = ON')
+
+
+def ensure_schema(conn):
+    """
+        Run the schema migrations once per database file and process.
+        In-memory databases disappear with their last connection and are always
+        checked, which costs a single PRAGMA once they are up to date.
+
+        Parameters:
+        - conn (Connection): A connection opened by open_connection.
+        """
+    if is_memory(conn.database):
+        migrations.migrate(conn)
+        return
+    key = _database_key(conn.database)
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key not in _schema_ready:
+            migrations.migrate(conn)
+            _schema_ready.add(key)
+
+
+def open_connection(database=None):
+    """
+        Open a new, configured connection with the schema in place.
+        The caller owns the connection and is responsible for closing it.
+
+        Parameters:
+        - database (str): The database path or URI (default is DB_NAME).
+
+        Returns:
+        Connection: The SQLite database connection.
+        """
+    database = _resolve(database)
+    conn = sqlite3.connect(database, timeout=BUSY_TIMEOUT_MS / 1000, factory=CONNECTION_CLASS,
+                           uri=database.startswith("file:"))
+    conn.database = database
+    key = _database_key(database)
+    if is_private_memory(database):
+        conn.database_key = "%s#%d" % (key, next(_memory_numbers))
+    else:
+        conn.database_key = key
+    configure(conn)
+    ensure_schema(conn)
+    return conn
+
+
+def get_connection(database=None):
+    """
+        Retrieve the shared connection of the current thread for a database,
+        opening it on first use.
+
+        Parameters:
+        - database (str): The database path or URI (default is DB_NAME).
+
+        Returns:
+        Connection: The SQLite database connection.
+        """
+    database = _resolve(database)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = _database_key(database)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = open_connection(database)
+    return conn
+
+
+def close_connection(database=None):
+    """
+        Close the shared connection of the current thread for a database.
+
+        Parameters:
+        - database (str): The database path or URI (default is DB_NAME).
+        """
+    connections = getattr(_local, "connections", {})
+    conn = connections.pop(_database_key(_resolve(database)), None)
+    if conn is not None:
+        conn.close()
+
+
+def close_all():
+    """Close every shared connection opened by the current thread."""
+    connections = getattr(_local, "connections", {})
+    while connections:
+        _, conn = connections.popitem()
+        conn.close()
+
+
+def temporary_database():
+    """
+        Create an empty database file in the temporary directory, e.g. for tests and benchmarks.
+        Remove it with remove_database.
+
+        Returns:
+        str: The path of the database file.
+        """
+    import tempfile  # Only tests and benchmarks need it
+    handle, path = tempfile.mkstemp(prefix="habit-", suffix=".db")
+    os.close(handle)
+    return path
+
+
+def remove_database(database):
+    """
+        Close the current thread's shared connection to a database file and delete the file.
+
+        Parameters:
+        - database (str): The database path.
+        """
+    close_connection(database)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
@@ -0,0 +1,132 @@
+import sys
+import connection
+import period_stats
+
+"""Running completion counters on the habits row.
+
+total_completions, first_completion, last_completion and last_period_key (the
+period of the last completion, numbered as by periods.period_index in the
+habit's periodicity) are maintained by SQLite triggers on habit_logs, in the
+same statement that adds or removes a completion. Adding or deleting a
+completion is O(1), except that deleting the first or last completion of a
+habit looks up the new one through the (habit_id, completion_time) index.
+Logs deleted after their habit are skipped, so deleting a habit costs the
+same for every one of its logs. Run
+
+    python counters.py [database]
+
+to recompute the counters from habit_logs."""
+
+
+def _period_case(column, periodicity_column):
+    """
+        Build the SQL expression numbering the period of an epoch time in a habit's periodicity.
+
+        Parameters:
+        - column (str): The SQL expression of the time.
+        - periodicity_column (str): The SQL expression of the periodicity.
+
+        Returns:
+        str: The SQL expression; unknown periodicities count as daily.
+        """
+    return "CASE %s WHEN 'weekly' THEN %s WHEN 'monthly' THEN %s ELSE %s END" % (
+        periodicity_column, period_stats.period_sql(column, "weekly"),
+        period_stats.period_sql(column, "monthly"), period_stats.period_sql(column, "daily"))
+
+
+def _recount(habit_id):
+    """
+        Build the SQL statement recomputing the counters of one habit from its logs.
+
+        Parameters:
+        - habit_id (str): The SQL expression of the habit id.
+
+        Returns:
+        str: The UPDATE statement.
+        """
+    logs = "FROM habit_logs WHERE habit_id = {0} AND completion_time IS NOT NULL".format(habit_id)
+    return ('UPDATE habits SET total_completions = (SELECT COUNT(*) {0}), '
+            'first_completion = (SELECT MIN(completion_time) {0}), '
+            'last_completion = (SELECT MAX(completion_time) {0}), '
+            'last_period_key = {1} WHERE id = {2}').format(
+        logs, _period_case("(SELECT MAX(completion_time) %s)" % logs, "periodicity"), habit_id)
+
+
+def create_triggers(cursor):
+    """
+        Create the triggers that keep the counters on habits in step with habit_logs.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): A cursor of the database connection.
+        """
+    newer = "last_completion IS NULL OR NEW.completion_time >= last_completion"
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS habit_logs_counters_insert AFTER INSERT ON habit_logs
+        WHEN NEW.completion_time IS NOT NULL
+        BEGIN
+            UPDATE habits SET
+                total_completions = total_completions + 1,
+                first_completion = MIN(COALESCE(first_completion, NEW.completion_time), NEW.completion_time),
+                last_completion = MAX(COALESCE(last_completion, NEW.completion_time), NEW.completion_time),
+                last_period_key = CASE WHEN %s THEN %s ELSE last_period_key END
+            WHERE id = NEW.habit_id;
+        END
+    ''' % (newer, _period_case("NEW.completion_time", "periodicity")))
+
+    # Removing the first or last completion looks up the new one through the index; nothing is
+    # maintained for the logs of a habit that is being deleted (db deletes the habit first)
+    logs = "FROM habit_logs WHERE habit_id = OLD.habit_id"
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS habit_logs_counters_delete AFTER DELETE ON habit_logs
+        WHEN OLD.completion_time IS NOT NULL AND EXISTS (SELECT 1 FROM habits WHERE id = OLD.habit_id)
+        BEGIN
+            UPDATE habits SET
+                total_completions = total_completions - 1,
+                first_completion = CASE WHEN OLD.completion_time <= first_completion
+                                        THEN (SELECT MIN(completion_time) %s) ELSE first_completion END,
+                last_completion = CASE WHEN OLD.completion_time >= last_completion
+                                       THEN (SELECT MAX(completion_time) %s) ELSE last_completion END,
+                last_period_key = CASE WHEN OLD.completion_time >= last_completion
+                                       THEN %s ELSE last_period_key END
+            WHERE id = OLD.habit_id;
+        END
+    ''' % (logs, logs, _period_case("(SELECT MAX(completion_time) %s)" % logs, "periodicity")))
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS habit_logs_counters_update AFTER UPDATE OF habit_id, completion_time ON habit_logs
+        BEGIN
+            %s;
+            %s;
+        END
+    ''' % (_recount("OLD.habit_id"), _recount("NEW.habit_id")))
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS habits_counters_periodicity AFTER UPDATE OF periodicity ON habits
+        BEGIN
+            UPDATE habits SET last_period_key = %s WHERE id = NEW.id;
+        END
+    ''' % _period_case("last_completion", "NEW.periodicity"))
+
+
+def rebuild(conn):
+    """
+        Recompute the counters of every habit from habit_logs.
+        The caller is responsible for committing.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        """
+    conn.execute(_recount("habits.id"))
+
+
+def main():
+    database = sys.argv[1] if len(sys.argv) > 1 else connection.DB_NAME
+    conn = connection.open_connection(database)
+    with conn:
+        rebuild(conn)
+    conn.close()
+    print(f"Recomputed the completion counters in {database}.")
+
+
+if __name__ == "__main__":
+    main()
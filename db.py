@@ -1,259 +1,759 @@
-import sqlite3
-
-
-def connect_database():
-    """
-        Connect to the SQLite database.
-
-        Returns:
-        sqlite3.Connection: The SQLite database connection.
-        """
-    conn = sqlite3.connect("habit_tracker.db")
-    create_tables(conn)
-    return conn
-
-
-def create_tables(conn):
-    """
-        Initialize the database with the necessary tables.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        """
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS habits (
-            id INTEGER PRIMARY KEY,
-            name TEXT UNIQUE NOT NULL,
-            description TEXT,
-            periodicity TEXT,
-            category TEXT,
-            creation_time DATETIME,
-            streak INTEGER DEFAULT 0,
-            completion_time DATETIME DEFAULT NULL
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS habit_logs (
-            id INTEGER PRIMARY KEY,
-            habit_id INTEGER,
-            completed BOOLEAN,
-            completion_time DATETIME,
-            FOREIGN KEY (habit_id) REFERENCES habits(id)
-        )
-    ''')
-    conn.commit()
-
-
-def add_habit(conn, name, description, periodicity, category, creation_time, streak=0, completion_time=None):
-    """
-        Add a new habit to the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - name (str): The name of the habit.
-        - description (str): The description of the habit.
-        - periodicity (str): The periodicity of the habit (e.g., daily, weekly).
-        - category (str): The category of the habit.
-        - creation_time (datetime): The creation time of the habit.
-        - streak (int): The initial streak count (default is 0).
-        - completion_time (datetime): The completion time of the habit (default is None).
-        """
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO habits (name, description, periodicity, category, creation_time, streak) VALUES (?, ?, ?, ?, ?, ?)',
-                   (name, description, periodicity, category, creation_time, streak))
-    conn.commit()
-
-
-def delete_habit(conn, habit_name):
-    """
-        Delete a habit from the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit to be deleted.
-        """
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM habits WHERE name=?', (habit_name,))
-    cursor.execute('DELETE FROM habit_logs WHERE habit_id=(SELECT id FROM habits WHERE name=?)', (habit_name,))
-    conn.commit()
-
-
-def remove_all_habits(conn):
-    """
-            Delete all the habits from the database.
-
-            Parameters:
-            - conn (sqlite3.Connection): The SQLite database connection.
-            """
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM habits")
-    cursor.execute("DELETE FROM habit_logs")
-    conn.commit()
-
-
-def update_habit(conn, habit_name, name, description, periodicity, category):
-    """
-        Update the information of an existing habit in the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - old_name (str): The current name of the habit.
-        - new_name (str): The new name for the habit.
-        - new_description (str): The new description for the habit.
-        - new_periodicity (str): The new periodicity for the habit (e.g., daily, weekly).
-        - new_category (str): The new category for the habit.
-        """
-    cursor = conn.cursor()
-    cursor.execute('UPDATE habits SET name=?, description=?, periodicity=?, category=? WHERE name=?',
-                   (name, description, periodicity, category, habit_name))
-    conn.commit()
-
-
-def increment_streak(conn, habit_name):
-    """
-        Increment the streak count of a habit in the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit.
-        """
-    cursor = conn.cursor()
-    cursor.execute('UPDATE habits SET streak = streak + 1 WHERE name=?', (habit_name,))
-    conn.commit()
-
-
-def reset_streak(conn, habit_name):
-    """
-        Reset the streak count of a habit in the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit.
-        """
-    cursor = conn.cursor()
-    cursor.execute('UPDATE habits SET streak = 0 WHERE name=?', (habit_name,))
-    conn.commit()
-
-
-def update_habit_progress(conn, habit_name, streak, completion_time=None):
-    """
-        Update the streak count of a habit in the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit.
-        - streak (int): The new streak count for the habit.
-        """
-    cursor = conn.cursor()
-    cursor.execute('UPDATE habits SET streak = ? WHERE name=?', (streak, habit_name))
-    conn.commit()
-
-
-def mark_as_completed(conn, habit_name, completion_time):
-    """
-        Mark a habit as completed in the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit.
-        - completion_time (datetime): The completion time of the habit.
-        """
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES ((SELECT id FROM habits WHERE name=?), ?, ?)',
-                   (habit_name, 1, completion_time))
-    conn.commit()
-
-
-def check_habit_exists(conn, habit_name):
-    """
-        Check if a habit with the given name already exists in the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit.
-
-        Returns:
-        bool: True if the habit exists, False otherwise.
-        """
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM habits WHERE name=?', (habit_name,))
-    count = cursor.fetchone()[0]
-    return count > 0
-
-
-def get_habit_names(conn):
-    """
-        Retrieve names of all tracked habits from the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-
-        Returns:
-        list: A list of habit names.
-        """
-    cursor = conn.cursor()
-    cursor.execute('SELECT name FROM habits')
-    habits = cursor.fetchall()
-    return [habit[0] for habit in habits]
-
-
-def get_habit_streak_count(conn, habit_name):
-    """
-        Retrieve the streak count of a specific habit from the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit.
-
-        Returns:
-        int: The streak count of the habit.
-        """
-    cursor = conn.cursor()
-    cursor.execute('SELECT streak FROM habits WHERE name=?', (habit_name,))
-    streak_count = cursor.fetchone()
-    return streak_count[0] if streak_count is not None else None
-
-
-def get_habits_with_periodicity(db_conn, periodicity):
-    """
-        Retrieve habits with a specific periodicity from the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - periodicity (str): The periodicity to filter habits (e.g., daily, weekly, monthly).
-
-        Returns:
-        list: A list of habits with the specified periodicity.
-        """
-    cursor = db_conn.cursor()
-    cursor.execute("SELECT name FROM habits WHERE periodicity = ?", (periodicity,))
-    habits = cursor.fetchall()
-    return [habit[0] for habit in habits]
-
-
-def retrieve_habit_completion_time(conn, habit_name):
-    """
-        Retrieve the completion time of a specific habit from the database.
-
-        Parameters:
-        - conn (sqlite3.Connection): The SQLite database connection.
-        - habit_name (str): The name of the habit.
-
-        Returns:
-        datetime: The completion time of the habit.
-        """
-    cursor = conn.cursor()
-    cursor.execute('SELECT completion_time FROM habit_logs WHERE habit_id=(SELECT id FROM habits WHERE name=?)', (habit_name,))
-    completion_time = cursor.fetchone()
-    return completion_time[0] if completion_time is not None else None
-
-
-def main():
-    conn = connect_database()
-    print("Connected to the habit tracker database.")
-
-
-if __name__ == "__main__":
-    main()
+import base64
+import connection
+import json
+import migrations
+import records
+import streaks
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Nesting depth of the open transaction() of every connection, by id
+_transactions = {}
+# Habit name to id cache of the open transaction of every connection, by id
+_habit_ids = {}
+# Flush callbacks of write-behind buffers, run before the completion data is read or written
+_read_barriers = []
+# Write generation of every database, by connection.Connection.database_key
+_generations = {}
+_generation_lock = threading.Lock()
+
+
+def connect_database(database=None):
+    """
+        Open a new connection to the SQLite database.
+        Use connection.get_connection() to share one connection instead.
+
+        Parameters:
+        - database (str): The database path, ":memory:" or a "file:" URI (default is connection.DB_NAME).
+
+        Returns:
+        sqlite3.Connection: The SQLite database connection.
+        """
+    return connection.open_connection(database)
+
+
+def create_tables(conn):
+    """
+        Initialize the database with the necessary tables, upgrading older
+        databases to the latest schema version.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        """
+    migrations.migrate(conn)
+
+
+def to_epoch(value):
+    """
+        Convert a point in time to the integer UTC epoch stored in the database.
+
+        Parameters:
+        - value (datetime or int): A datetime (naive values are local time) or an epoch timestamp.
+
+        Returns:
+        int: Seconds since the epoch, or None if value is None.
+        """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+def add_read_barrier(callback):
+    """
+        Register a callback that writes buffered completions before the database is used.
+
+        Parameters:
+        - callback (callable): Called with the connection about to be used.
+        """
+    _read_barriers.append(callback)
+
+
+def remove_read_barrier(callback):
+    """
+        Unregister a callback added with add_read_barrier.
+
+        Parameters:
+        - callback (callable): The registered callback.
+        """
+    if callback in _read_barriers:
+        _read_barriers.remove(callback)
+
+
+def read_barrier(conn):
+    """
+        Write completions that are still buffered, so reads see every completion.
+
+        Parameters:
+        - conn (sqlite3.Connection): The connection about to be used.
+        """
+    for callback in list(_read_barriers):
+        callback(conn)
+
+
+def write_generation(conn):
+    """
+        Retrieve the write generation of a database, which changes whenever a write is committed.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        int: The generation, or None if the connection was not opened by the connection module.
+        """
+    key = getattr(conn, "database_key", None)
+    if key is None:
+        return None
+    return _generations.get(key, 0)
+
+
+def bump_write_generation(conn):
+    """
+        Record that the database of a connection was written to.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        """
+    key = getattr(conn, "database_key", None)
+    if key is not None:
+        with _generation_lock:
+            _generations[key] = _generations.get(key, 0) + 1
+
+
+def sync_data_version(conn):
+    """
+        Notice commits made by other connections and processes since the last call on a connection.
+        When PRAGMA data_version changed, the write generation is bumped.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        """
+    if getattr(conn, "database_key", None) is None:
+        return
+    version = conn.execute('PRAGMA data_version').fetchone()[0]
+    # The first value seen is unknown, so it counts as a change
+    if version != conn.data_version:
+        conn.data_version = version
+        bump_write_generation(conn)
+
+
+@contextmanager
+def transaction(conn):
+    """
+        Group writes into one atomic, durable transaction.
+
+        The outermost block commits when it exits and rolls back if it raises.
+        Nested blocks become savepoints, so a failing inner block only undoes
+        its own writes. The db functions that write open a block themselves,
+        so inside an outer block they no longer commit on their own.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Yields:
+        sqlite3.Connection: The connection.
+        """
+    key = id(conn)
+    depth = _transactions.get(key, 0)
+    savepoint = "db_savepoint_%d" % depth
+    if depth == 0:
+        if _read_barriers:
+            read_barrier(conn)
+        if not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        # No other connection can commit until this transaction ends, so the ids it sees stay valid
+        _habit_ids[key] = {}
+    else:
+        conn.execute('SAVEPOINT ' + savepoint)
+    _transactions[key] = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        if depth == 0:
+            conn.rollback()
+        else:
+            conn.execute('ROLLBACK TO ' + savepoint)
+            conn.execute('RELEASE ' + savepoint)
+        # Ids cached inside the block may belong to habits that no longer exist
+        _forget_habit_ids(conn)
+        raise
+    else:
+        if depth == 0:
+            conn.commit()
+            bump_write_generation(conn)
+        else:
+            conn.execute('RELEASE ' + savepoint)
+    finally:
+        if depth == 0:
+            del _transactions[key]
+            del _habit_ids[key]
+        else:
+            _transactions[key] = depth
+
+
+def in_transaction(conn):
+    """
+        Check whether a transaction() block is open on a connection.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        bool: True inside a transaction() block, False otherwise.
+        """
+    return id(conn) in _transactions
+
+
+def add_habit(conn, name, description, periodicity, category, creation_time, streak=0, completion_time=None):
+    """
+        Add a new habit to the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - name (str): The name of the habit.
+        - description (str): The description of the habit.
+        - periodicity (str): The periodicity of the habit (e.g., daily, weekly).
+        - category (str): The category of the habit.
+        - creation_time (datetime or int): The creation time of the habit.
+        - streak (int): The initial streak count (default is 0).
+        - completion_time (datetime): The completion time of the habit (default is None).
+        """
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO habits (name, description, periodicity, category, creation_time, streak) VALUES (?, ?, ?, ?, ?, ?)',
+                       (name, description, periodicity, category, to_epoch(creation_time), streak))
+    _forget_habit_ids(conn, name)
+
+
+def delete_habit(conn, habit_name):
+    """
+        Delete a habit from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit to be deleted.
+        """
+    habit_id = get_habit_id(conn, habit_name)
+    if habit_id is not None:
+        delete_habit_by_id(conn, habit_id)
+
+
+def delete_habit_by_id(conn, habit_id):
+    """
+        Delete a habit and its completion logs from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit to be deleted.
+        """
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT name FROM habits WHERE id=?', (habit_id,))
+        habit = cursor.fetchone()
+        # Without the habit the triggers skip the counters of its logs; the foreign key holds again once both are gone
+        cursor.execute('PRAGMA defer_foreign_keys = ON')
+        cursor.execute('DELETE FROM habits WHERE id=?', (habit_id,))
+        cursor.execute('DELETE FROM habit_logs WHERE habit_id=?', (habit_id,))
+        cursor.execute('PRAGMA defer_foreign_keys = OFF')
+    if habit is not None:
+        _forget_habit_ids(conn, habit[0])
+
+
+def remove_all_habits(conn):
+    """
+            Delete all the habits from the database.
+
+            Parameters:
+            - conn (sqlite3.Connection): The SQLite database connection.
+            """
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('PRAGMA defer_foreign_keys = ON')
+        cursor.execute("DELETE FROM habits")
+        cursor.execute("DELETE FROM habit_logs")
+        cursor.execute('PRAGMA defer_foreign_keys = OFF')
+    _forget_habit_ids(conn)
+
+
+def update_habit(conn, habit_name, name, description, periodicity, category):
+    """
+        Update the information of an existing habit in the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - old_name (str): The current name of the habit.
+        - new_name (str): The new name for the habit.
+        - new_description (str): The new description for the habit.
+        - new_periodicity (str): The new periodicity for the habit (e.g., daily, weekly).
+        - new_category (str): The new category for the habit.
+        """
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('UPDATE habits SET name=?, description=?, periodicity=?, category=? WHERE name=?',
+                       (name, description, periodicity, category, habit_name))
+        _forget_habit_ids(conn, habit_name, name)
+        habit_id = get_habit_id(conn, name)
+        if habit_id is not None:
+            # The periods of the streak depend on the periodicity
+            streak = streaks.rebuild_streak(conn, habit_id)
+            # Habits without completions keep their stored streak count
+            if streak:
+                cursor.execute('UPDATE habits SET streak = ? WHERE id=?', (streak, habit_id))
+
+
+def increment_streak(conn, habit_name):
+    """
+        Increment the streak count of a habit in the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+        """
+    increment_streak_by_id(conn, get_habit_id(conn, habit_name))
+
+
+def increment_streak_by_id(conn, habit_id):
+    """
+        Increment the streak count of a habit in the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+        """
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('UPDATE habits SET streak = streak + 1 WHERE id=?', (habit_id,))
+
+
+def reset_streak(conn, habit_name):
+    """
+        Reset the streak count of a habit in the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+        """
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('UPDATE habits SET streak = 0 WHERE name=?', (habit_name,))
+
+
+def update_habit_progress(conn, habit_name, streak, completion_time=None):
+    """
+        Update the streak count of a habit in the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+        - streak (int): The new streak count for the habit.
+        """
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('UPDATE habits SET streak = ? WHERE name=?', (streak, habit_name))
+
+
+def mark_as_completed(conn, habit_name, completion_time):
+    """
+        Mark a habit as completed in the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+        - completion_time (datetime): The completion time of the habit.
+        """
+    habit_id = get_habit_id(conn, habit_name)
+    if habit_id is not None:
+        mark_as_completed_by_id(conn, habit_id, completion_time)
+
+
+def mark_as_completed_by_id(conn, habit_id, completion_time):
+    """
+        Mark a habit as completed in the database and update its streak from the log.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+        - completion_time (datetime or int): The completion time of the habit.
+        """
+    completion_time = to_epoch(completion_time)
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES (?, ?, ?)',
+                       (habit_id, 1, completion_time))
+        streak = streaks.record_completion(conn, habit_id, completion_time)
+        cursor.execute('UPDATE habits SET streak = ? WHERE id=?', (streak, habit_id))
+
+
+def mark_many_completed(conn, completions, batch_size=10000):
+    """
+        Mark many habit completions in a single transaction.
+
+        Habit names are resolved to ids once, logs are inserted with executemany
+        and the streak of every completed habit is advanced from the new completions;
+        only a habit with a completion before its last completed period is rebuilt from its log.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - completions (iterable): (habit_name, completion_time) pairs.
+        - batch_size (int): The number of rows sent to executemany at once.
+
+        Returns:
+        tuple: The number of rows inserted and the number of rows rejected
+        (unknown habit or missing completion time).
+        """
+    cursor = conn.cursor()
+    habit_ids = {}
+    new_times = {}
+    inserted = 0
+    rejected = 0
+    batch = []
+    with transaction(conn):
+        for habit_name, completion_time in completions:
+            if habit_name not in habit_ids:
+                habit_ids[habit_name] = get_habit_id(conn, habit_name)
+            habit_id = habit_ids[habit_name]
+            if habit_id is None or completion_time is None:
+                rejected += 1
+                continue
+            completion_time = to_epoch(completion_time)
+            batch.append((habit_id, 1, completion_time))
+            new_times.setdefault(habit_id, []).append(completion_time)
+            if len(batch) >= batch_size:
+                cursor.executemany('INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES (?, ?, ?)',
+                                   batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany('INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES (?, ?, ?)',
+                               batch)
+            inserted += len(batch)
+        cursor.executemany('UPDATE habits SET streak = ? WHERE id=?',
+                           [(streaks.record_completions(conn, habit_id, times), habit_id)
+                            for habit_id, times in new_times.items()])
+    return inserted, rejected
+
+
+def check_habit_exists(conn, habit_name):
+    """
+        Check if a habit with the given name already exists in the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+
+        Returns:
+        bool: True if the habit exists, False otherwise.
+        """
+    return get_habit_id(conn, habit_name) is not None
+
+
+def get_habit_id(conn, habit_name):
+    """
+        Retrieve the id of a habit. Inside a transaction() block the ids are cached until the block ends.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+
+        Returns:
+        int: The id of the habit, or None if it does not exist.
+        """
+    cache = _habit_ids.get(id(conn))
+    if cache is not None and habit_name in cache:
+        return cache[habit_name]
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM habits WHERE name=?', (habit_name,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if cache is not None:
+        cache[habit_name] = row[0]
+    return row[0]
+
+
+def _forget_habit_ids(conn, *habit_names):
+    """
+        Invalidate cached habit ids after habits were added, renamed or deleted.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_names (str): The affected names; all ids are forgotten if none are given.
+        """
+    cache = _habit_ids.get(id(conn))
+    if cache is None:
+        return
+    if not habit_names:
+        cache.clear()
+    for habit_name in habit_names:
+        cache.pop(habit_name, None)
+
+
+def get_habit_names(conn):
+    """
+        Retrieve names of all tracked habits from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        list: A list of habit names.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT name FROM habits')
+    habits = cursor.fetchall()
+    return [habit[0] for habit in habits]
+
+
+def iter_rows(cursor, batch_size):
+    """
+        Stream the result rows of an executed query in fetchmany batches.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the executed query.
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        generator: The rows.
+        """
+    rows = cursor.fetchmany(batch_size)
+    while rows:
+        yield from rows
+        rows = cursor.fetchmany(batch_size)
+
+
+def iter_habit_names(conn, batch_size=1000):
+    """
+        Stream the names of all tracked habits, holding one batch in memory at a time.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        generator: The habit names in name order.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT name FROM habits ORDER BY name')
+    for name, in iter_rows(cursor, batch_size):
+        yield name
+
+
+def iter_habits_with_periodicity(conn, periodicity, batch_size=1000):
+    """
+        Stream the names of the habits with a specific periodicity.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - periodicity (str): The periodicity to filter habits (e.g., daily, weekly, monthly).
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        generator: The habit names in name order.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT name FROM habits WHERE periodicity = ? ORDER BY name', (periodicity,))
+    for name, in iter_rows(cursor, batch_size):
+        yield name
+
+
+def iter_habit_records(conn, batch_size=1000):
+    """
+        Stream every habit as a records.HabitRecord, hydrated from a single query in fetchmany batches.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        generator: The habit records in id order.
+        """
+    if _read_barriers:
+        read_barrier(conn)
+    cursor = conn.cursor()
+    cursor.execute('SELECT %s FROM habits ORDER BY id' % ', '.join(records.COLUMNS))
+    for row in iter_rows(cursor, batch_size):
+        yield records.HabitRecord(*row)
+
+
+def get_habit_records(conn, batch_size=1000):
+    """
+        Retrieve every habit as a records.HabitRecord, hydrated from a single query in fetchmany batches.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        list: The habit records in id order.
+        """
+    return list(iter_habit_records(conn, batch_size))
+
+
+# Orders of get_habit_page; both keys are unique, so a page continues after the last key seen
+PAGE_ORDERS = ("name", "id")
+
+
+def _page_token(order_by, key):
+    """Encode the order and the last key of a page as an opaque token."""
+    return base64.urlsafe_b64encode(json.dumps([order_by, key]).encode()).decode()
+
+
+def _page_key(order_by, page_token):
+    """
+        Decode a page token of get_habit_page.
+
+        Parameters:
+        - order_by (str): The order the token must belong to.
+        - page_token (str): The token returned with the previous page.
+
+        Returns:
+        The last key of the previous page.
+        """
+    try:
+        token_order, key = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid page token.")
+    if token_order != order_by:
+        raise ValueError("The page token belongs to another order.")
+    return key
+
+
+def get_habit_page(conn, order_by="name", page_token=None, page_size=50, periodicity=None):
+    """
+        Retrieve one page of habit records with keyset pagination: every page is an
+        indexed range query after the last key of the previous page, so the cost of a
+        page does not grow with its position in the listing.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - order_by (str): "name" or "id".
+        - page_token (str): The token returned with the previous page (default is the first page).
+        - page_size (int): The maximum number of records on the page, at least 1.
+        - periodicity (str): Only list habits with this periodicity (default is all habits).
+
+        Returns:
+        tuple: The list of habit records and the token of the next page, or None on the last page.
+        """
+    if order_by not in PAGE_ORDERS:
+        raise ValueError("Habits can only be paged by %s." % " or ".join(PAGE_ORDERS))
+    # SQLite reads a negative LIMIT as no limit at all
+    if page_size < 1:
+        raise ValueError("The page size must be at least 1.")
+    conditions = []
+    params = []
+    if periodicity is not None:
+        conditions.append('periodicity = ?')
+        params.append(periodicity)
+    if page_token is not None:
+        conditions.append('%s > ?' % order_by)
+        params.append(_page_key(order_by, page_token))
+    query = 'SELECT %s FROM habits' % ', '.join(records.COLUMNS)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY %s LIMIT ?' % order_by
+    # One row more than the page tells whether another page follows
+    params.append(page_size + 1)
+
+    if _read_barriers:
+        read_barrier(conn)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    page = [records.HabitRecord(*row) for row in cursor.fetchall()]
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, _page_token(order_by, getattr(page[-1], order_by))
+
+
+def get_habit_streak_count(conn, habit_name):
+    """
+        Retrieve the streak count of a specific habit from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+
+        Returns:
+        int: The streak count of the habit.
+        """
+    return get_habit_streak_count_by_id(conn, get_habit_id(conn, habit_name))
+
+
+def get_habit_streak_count_by_id(conn, habit_id):
+    """
+        Retrieve the streak count of a specific habit from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+
+        Returns:
+        int: The streak count of the habit.
+        """
+    if _read_barriers:
+        read_barrier(conn)
+    cursor = conn.cursor()
+    cursor.execute('SELECT streak FROM habits WHERE id=?', (habit_id,))
+    streak_count = cursor.fetchone()
+    return streak_count[0] if streak_count is not None else None
+
+
+def get_habits_with_periodicity(db_conn, periodicity):
+    """
+        Retrieve habits with a specific periodicity from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - periodicity (str): The periodicity to filter habits (e.g., daily, weekly, monthly).
+
+        Returns:
+        list: A list of habits with the specified periodicity.
+        """
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT name FROM habits WHERE periodicity = ?", (periodicity,))
+    habits = cursor.fetchall()
+    return [habit[0] for habit in habits]
+
+
+def retrieve_habit_completion_time(conn, habit_name):
+    """
+        Retrieve the completion time of a specific habit from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_name (str): The name of the habit.
+
+        Returns:
+        int: The completion time of the habit as a UTC epoch timestamp.
+        """
+    return retrieve_habit_completion_time_by_id(conn, get_habit_id(conn, habit_name))
+
+
+def retrieve_habit_completion_time_by_id(conn, habit_id):
+    """
+        Retrieve the completion time of a specific habit from the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+
+        Returns:
+        int: The completion time of the habit as a UTC epoch timestamp.
+        """
+    if _read_barriers:
+        read_barrier(conn)
+    cursor = conn.cursor()
+    cursor.execute('SELECT completion_time FROM habit_logs WHERE habit_id=?', (habit_id,))
+    completion_time = cursor.fetchone()
+    return completion_time[0] if completion_time is not None else None
+
+
+def main():
+    conn = connect_database()
+    print("Connected to the habit tracker database.")
+
+
+if __name__ == "__main__":
+    main()
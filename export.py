@@ -0,0 +1,275 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+import connection
+import db
+
+"""Streaming export of habits and completion logs to CSV or JSON Lines.
+
+Rows are read in fetchmany batches and written as they arrive, so memory use
+does not depend on the size of the tables. Times are exported as UTC epoch
+seconds. Log exports can be incremental: with a state file, only logs with an
+id above the last exported one are read, and the new high-water mark is saved
+once the output is complete. Log ids only grow (habit_logs uses AUTOINCREMENT),
+so logs added after deletes are still picked up. Run
+
+    python export.py habits habits.csv
+    python export.py logs logs.jsonl.gz --state export_state.json --since 2024-01-01
+
+and see --help for the filters. Output files ending in .gz are compressed."""
+
+HABIT_COLUMNS = ("id", "name", "description", "periodicity", "category", "creation_time", "streak",
+                 "total_completions", "first_completion", "last_completion")
+LOG_COLUMNS = ("id", "habit_id", "habit_name", "completion_time")
+FORMATS = ("csv", "jsonl")
+
+
+def _conditions(category=None, periodicity=None, habit_table="habits"):
+    """
+        Build the SQL conditions of the habit filters.
+
+        Parameters:
+        - category (str): Only export habits of this category.
+        - periodicity (str): Only export habits with this periodicity.
+        - habit_table (str): The name or alias of the habits table in the query.
+
+        Returns:
+        tuple: The list of conditions and the list of their parameters.
+        """
+    conditions = []
+    params = []
+    if category is not None:
+        conditions.append('%s.category = ?' % habit_table)
+        params.append(category)
+    if periodicity is not None:
+        conditions.append('%s.periodicity = ?' % habit_table)
+        params.append(periodicity)
+    return conditions, params
+
+
+def iter_habits(conn, category=None, periodicity=None, batch_size=1000):
+    """
+        Stream the habits, optionally filtered, as tuples in the order of HABIT_COLUMNS.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - category (str): Only export habits of this category.
+        - periodicity (str): Only export habits with this periodicity.
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        generator: The habit rows in id order.
+        """
+    conditions, params = _conditions(category, periodicity)
+    query = 'SELECT %s FROM habits' % ', '.join(HABIT_COLUMNS)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    db.read_barrier(conn)
+    cursor = conn.cursor()
+    cursor.execute(query + ' ORDER BY id', params)
+    return db.iter_rows(cursor, batch_size)
+
+
+def iter_logs(conn, after_id=None, start_time=None, end_time=None, category=None, periodicity=None,
+              batch_size=1000):
+    """
+        Stream the completion logs, optionally filtered, as tuples in the order of LOG_COLUMNS.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - after_id (int): Only export logs with a greater id, e.g. the high-water mark of the last export.
+        - start_time (datetime or int): Only export completions at or after this time.
+        - end_time (datetime or int): Only export completions before this time.
+        - category (str): Only export logs of habits in this category.
+        - periodicity (str): Only export logs of habits with this periodicity.
+        - batch_size (int): The number of rows fetched at once.
+
+        Returns:
+        generator: The log rows in id order.
+        """
+    conditions, params = _conditions(category, periodicity, "h")
+    if after_id is not None:
+        # A range on the primary key: an incremental export only reads the new rows
+        conditions.append('l.id > ?')
+        params.append(after_id)
+    if start_time is not None:
+        conditions.append('l.completion_time >= ?')
+        params.append(db.to_epoch(start_time))
+    if end_time is not None:
+        conditions.append('l.completion_time < ?')
+        params.append(db.to_epoch(end_time))
+    query = 'SELECT l.id, l.habit_id, h.name, l.completion_time FROM habit_logs l LEFT JOIN habits h ON h.id = l.habit_id'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    db.read_barrier(conn)
+    cursor = conn.cursor()
+    cursor.execute(query + ' ORDER BY l.id', params)
+    return db.iter_rows(cursor, batch_size)
+
+
+def write_rows(rows, columns, stream, output_format):
+    """
+        Write rows to a text stream as they are produced.
+
+        Parameters:
+        - rows (iterable): Tuples in the order of columns.
+        - columns (tuple): The column names.
+        - stream (file): The text stream to write to.
+        - output_format (str): "csv" (with a header line) or "jsonl" (one object per line).
+
+        Returns:
+        tuple: The number of rows written and the first value of the last row, or None if there were no rows.
+        """
+    count = 0
+    last_id = None
+    if output_format == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            last_id = row[0]
+    elif output_format == "jsonl":
+        for row in rows:
+            stream.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            stream.write("\n")
+            count += 1
+            last_id = row[0]
+    else:
+        raise ValueError("Unknown export format %r, expected one of %s." % (output_format, ", ".join(FORMATS)))
+    return count, last_id
+
+
+def format_of(path):
+    """
+        Derive the export format and compression from a file name.
+
+        Parameters:
+        - path (str): The output path, e.g. logs.csv or logs.jsonl.gz.
+
+        Returns:
+        tuple: The format ("csv" or "jsonl") and True if the file is gzip compressed.
+        """
+    compressed = path.endswith(".gz")
+    base = path[:-3] if compressed else path
+    extension = os.path.splitext(base)[1].lstrip(".").lower()
+    output_format = "jsonl" if extension in ("jsonl", "json", "ndjson") else "csv"
+    return output_format, compressed
+
+
+def read_state(path):
+    """
+        Read the high-water mark of the last incremental export.
+
+        Parameters:
+        - path (str): The state file.
+
+        Returns:
+        int: The last exported log id, or None if nothing was exported yet.
+        """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as state_file:
+        return json.load(state_file).get("last_log_id")
+
+
+def write_state(path, last_log_id):
+    """
+        Save the high-water mark of an incremental export, replacing the file atomically.
+
+        Parameters:
+        - path (str): The state file.
+        - last_log_id (int): The last exported log id.
+        """
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as state_file:
+        json.dump({"last_log_id": last_log_id, "exported_at": datetime.now().isoformat(timespec="seconds")},
+                  state_file)
+    os.replace(temporary, path)
+
+
+def export(conn, table, path, output_format=None, compress=None, state_path=None, **filters):
+    """
+        Export habits or completion logs to a file.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - table (str): "habits" or "logs".
+        - path (str): The output file, or "-" for standard output.
+        - output_format (str): "csv" or "jsonl" (default is derived from the file name).
+        - compress (bool): Write gzip (default is True for file names ending in .gz).
+        - state_path (str): For logs, the state file holding the high-water mark of incremental exports.
+        - filters: category and periodicity; for logs also start_time and end_time.
+
+        Returns:
+        tuple: The number of rows exported and the last exported log id (None for habits).
+        """
+    derived_format, derived_compress = format_of(path)
+    output_format = output_format or derived_format
+    compress = derived_compress if compress is None else compress
+
+    if table == "habits":
+        rows, columns = iter_habits(conn, **filters), HABIT_COLUMNS
+    elif table == "logs":
+        after_id = read_state(state_path) if state_path else None
+        rows, columns = iter_logs(conn, after_id=after_id, **filters), LOG_COLUMNS
+    else:
+        raise ValueError("Unknown table %r, expected habits or logs." % table)
+
+    if path == "-":
+        count, last_id = write_rows(rows, columns, sys.stdout, output_format)
+    elif compress:
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as stream:
+            count, last_id = write_rows(rows, columns, stream, output_format)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as stream:
+            count, last_id = write_rows(rows, columns, stream, output_format)
+
+    if table != "logs":
+        return count, None
+    if state_path and last_id is not None:
+        write_state(state_path, last_id)
+    return count, last_id if last_id is not None else after_id
+
+
+def _time(value):
+    """Parse a command line time: epoch seconds or an ISO date or datetime in local time."""
+    return int(value) if value.isdigit() else datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export habits or completion logs to CSV or JSON Lines.")
+    parser.add_argument("table", choices=["habits", "logs"])
+    parser.add_argument("output", help="output file (.csv, .jsonl, optionally .gz) or - for standard output")
+    parser.add_argument("--database", help="SQLite database file, or a file: URI (default: %s)" % connection.DB_NAME)
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the file name)")
+    parser.add_argument("--category", help="only export habits of this category")
+    parser.add_argument("--periodicity", help="only export habits with this periodicity")
+    parser.add_argument("--since", type=_time, help="logs: only completions at or after this time")
+    parser.add_argument("--until", type=_time, help="logs: only completions before this time")
+    parser.add_argument("--state", help="logs: state file of incremental exports (last exported log id)")
+    args = parser.parse_args()
+
+    filters = {"category": args.category, "periodicity": args.periodicity}
+    if args.table == "logs":
+        filters.update(start_time=args.since, end_time=args.until)
+    elif args.since or args.until or args.state:
+        parser.error("--since, --until and --state only apply to logs")
+
+    conn = connection.open_connection(args.database)
+    try:
+        count, last_id = export(conn, args.table, args.output, args.format, state_path=args.state, **filters)
+    finally:
+        conn.close()
+    message = f"Exported {count} {args.table} rows"
+    if last_id is not None:
+        message += f" (last log id {last_id})"
+    print(message + ".", file=sys.stderr if args.output == "-" else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
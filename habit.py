@@ -1,9 +1,11 @@
-import db
-from datetime import datetime
+import time
+import completion_buffer
+import connection
+import storage
 
 
 class Habit:
-    def __init__(self, name=None, description=None, periodicity=None, category=None, database="habit_tracker.db"):
+    def __init__(self, name=None, description=None, periodicity=None, category=None, database=None, backend=None):
 
         """ Initialize a Habit object with the provided parameters.
                Parameters:
@@ -11,23 +13,33 @@ class Habit:
                - description (str): The description of the habit.
                - periodicity (str): The periodicity of the habit (e.g., daily, weekly).
                - category (str): The category to which the habit belongs.
-               - database (str): The name of the SQLite database.
+               - database (str): The SQLite database path, ":memory:" or a "file:" URI
+                 (default is connection.DB_NAME).
+               - backend (storage.StorageBackend): The storage backend to use instead
+                 of the database, e.g. a storage.MemoryBackend.
                """
 
         self.name = name
         self.description= description
         self.periodicity = periodicity
         self.category = category
-        self.db = db.connect_database()
+        if backend is None:
+            backend = storage.SQLiteBackend(connection.get_connection(database))
+        self.storage = backend
+        # The SQLite connection, or None if the backend is not SQLiteBackend
+        self.db = getattr(backend, "conn", None)
         self.streak = 0
-        self.current_time = datetime.now()
+        self.current_time = int(time.time())  # UTC epoch seconds
 
     def add(self):
         """ Add a new habit to the database.
         If the habit already exists, print a message indicating so. """
 
-        if not db.check_habit_exists(self.db, self.name):
-            db.add_habit(self.db, self.name, self.description,self.periodicity, self.category, self.current_time, self.streak)
+        with self.storage.transaction():
+            exists = self.storage.habit_exists(self.name)
+            if not exists:
+                self.storage.add_habit(self.name, self.description,self.periodicity, self.category, self.current_time, self.streak)
+        if not exists:
             print(f"\nHabit '{self.name.capitalize()}' added successfully.\n")
         else:
             print("\nHabit already exists, please choose another name.\n")
@@ -36,8 +48,11 @@ class Habit:
         """Remove the habit from the database.
         If the habit does not exist, print a message indicating so."""
 
-        if db.check_habit_exists(self.db, self.name):
-            db.delete_habit(self.db, self.name)
+        with self.storage.transaction():
+            exists = self.storage.habit_exists(self.name)
+            if exists:
+                self.storage.delete_habit(self.name)
+        if exists:
             print(f"\nHabit '{self.name.capitalize()}' removed successfully.\n")
         else:
             print("\nHabit not found, please check the name.\n")
@@ -46,8 +61,11 @@ class Habit:
         """     Update the habit's information in the database.
                 If the habit does not exist, print a message indicating so."""
 
-        if db.check_habit_exists(self.db, self.name):
-            db.update_habit(self.db, self.name, new_name, new_description, new_periodicity, new_category)
+        with self.storage.transaction():
+            exists = self.storage.habit_exists(self.name)
+            if exists:
+                self.storage.update_habit(self.name, new_name, new_description, new_periodicity, new_category)
+        if exists:
             self.name = new_name
             self.periodicity = new_periodicity
             self.category = new_category
@@ -58,19 +76,20 @@ class Habit:
     def increase_streak(self):
         """ Increase the streak count for the habit in the database. """
 
-        current_streak = db.get_habit_streak_count(self.db, self.name)
-        if current_streak is not None:
-            current_streak += 1
-        else:
-            current_streak = 1
-        db.increment_streak(self.db, self.name)
+        with self.storage.transaction():
+            current_streak = self.storage.get_streak(self.name)
+            if current_streak is not None:
+                current_streak += 1
+            else:
+                current_streak = 1
+            self.storage.increment_streak(self.name)
         print(f"\nStreak for habit '{self.name.capitalize()}' increased to {current_streak}.\n")
 
     def clear_streak(self):
         """ Reset the streak count for the habit in the database. """
 
         self.streak = 0
-        db.reset_streak(self.db, self.name)
+        self.storage.reset_streak(self.name)
         print(f"\nStreak for habit '{self.name.capitalize()}' has been reset.\n")
 
     def modify_streak(self, new_streak):
@@ -79,13 +98,23 @@ class Habit:
 
         try:
             new_streak = int(new_streak)
-            db.update_habit_progress(self.db, self.name, new_streak)
+            self.storage.set_streak(self.name, new_streak)
             print(f"\nStreak for habit '{self.name.capitalize()}' has been updated to {new_streak}.\n")
         except ValueError:
             print(f"\nInvalid input. Streak for habit '{self.name.capitalize()}' remains unchanged.\n")
 
     def complete_habit(self):
-        """Mark the habit as completed in the database and increase the streak."""
-
-        db.mark_as_completed(self.db, self.name, self.current_time)
-        self.increase_streak()
+        """Mark the habit as completed in the database; the streak is derived from the completion log.
+        With a write-behind buffer active, the completion is queued and written with the next flush."""
+
+        buffer = completion_buffer.active(self.db.database) if self.db is not None else None
+        if buffer is not None:
+            buffer.add(self.name, self.current_time)
+            print(f"\nCompletion of habit '{self.name.capitalize()}' recorded.\n")
+            return
+
+        # The log entry and the streak update are committed together
+        with self.storage.transaction():
+            self.storage.mark_as_completed(self.name, self.current_time)
+            current_streak = self.storage.current_streak(self.name)
+        print(f"\nStreak for habit '{self.name.capitalize()}' is now {current_streak}.\n")
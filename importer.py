@@ -0,0 +1,317 @@
+import argparse
+import csv
+import gzip
+import json
+import sys
+import time
+from datetime import datetime
+import connection
+import counters
+import db
+import export
+import period_stats
+import streaks
+
+"""Streaming bulk import of habit definitions and completion histories.
+
+Reads CSV or JSON Lines (optionally gzip compressed) with the columns written
+by export.py: habits need a name and may have description, periodicity,
+category, creation_time and streak; logs need habit_name and completion_time.
+Times are UTC epoch seconds or ISO dates and datetimes in local time.
+
+Everything is imported in one transaction, with executemany batches of
+BATCH_SIZE rows. Habits are upserted on their name. Completions of unknown
+habits are rejected, and completions a habit already has (same habit and
+time) are skipped. Streaks of the touched habits are rebuilt at the end.
+Columns missing from a habit row keep the value of the existing habit.
+
+For very large loads, bulk=True drops the secondary indexes of the target
+table (and the triggers of habit_logs), inserts without maintaining them,
+recreates them once and recomputes the completion rollups, counters and
+streaks with one scan each. Run
+
+    python importer.py habits habits.csv
+    python importer.py logs logs.jsonl.gz --bulk"""
+
+BATCH_SIZE = 10000
+# Rows between two progress reports
+PROGRESS_EVERY = 50000
+
+_UPSERT_HABIT = ('INSERT INTO habits (name, description, periodicity, category, creation_time, streak) '
+                 'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET '
+                 'description = COALESCE(excluded.description, description), '
+                 'periodicity = COALESCE(excluded.periodicity, periodicity), '
+                 'category = COALESCE(excluded.category, category)')
+_INSERT_NEW_LOG = ('INSERT INTO habit_logs (habit_id, completed, completion_time) SELECT ?, 1, ? '
+                   'WHERE NOT EXISTS (SELECT 1 FROM habit_logs WHERE habit_id = ? AND completion_time = ?)')
+_INSERT_LOG = 'INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES (?, 1, ?)'
+
+
+def read_rows(path, input_format=None):
+    """
+        Stream the rows of a CSV or JSON Lines file as dicts.
+
+        Parameters:
+        - path (str): The input file (compressed if it ends in .gz), or "-" for standard input.
+        - input_format (str): "csv" or "jsonl" (default is derived from the file name).
+
+        Returns:
+        generator: One dict per row.
+        """
+    derived_format, compressed = export.format_of(path)
+    input_format = input_format or derived_format
+    if path == "-":
+        stream = sys.stdin
+    elif compressed:
+        stream = gzip.open(path, "rt", encoding="utf-8", newline="")
+    else:
+        stream = open(path, encoding="utf-8", newline="")
+    try:
+        if input_format == "csv":
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _epoch(value):
+    """Convert an imported time (epoch seconds, ISO text or empty) to epoch seconds or None."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = value.strip()
+    if value.lstrip("-").isdigit():
+        return int(value)
+    return db.to_epoch(datetime.fromisoformat(value))
+
+
+class Progress:
+    """Counts imported rows and reports the rate every PROGRESS_EVERY rows."""
+
+    def __init__(self, label, report=None):
+        """
+        Parameters:
+        - label (str): The name of the imported table.
+        - report (callable): Called with (label, rows, seconds) for every report (default prints to stderr).
+        """
+        self.label = label
+        self.report = report if report is not None else _print_progress
+        self.rows = 0
+        self.start = time.perf_counter()
+        self._next_report = PROGRESS_EVERY
+
+    def add(self, rows=1):
+        self.rows += rows
+        if self.rows >= self._next_report:
+            self._next_report += PROGRESS_EVERY
+            self.report(self.label, self.rows, self.seconds())
+
+    def seconds(self):
+        return time.perf_counter() - self.start
+
+    def rate(self):
+        seconds = self.seconds()
+        return self.rows / seconds if seconds > 0 else 0.0
+
+
+def _print_progress(label, rows, seconds):
+    print(f"{label}: {rows} rows read, {rows / seconds if seconds else 0:.0f} rows/s", file=sys.stderr)
+
+
+def _drop_schema_objects(cursor, table, object_type):
+    """
+        Drop the indexes or triggers of a table, keeping the SQL to recreate them.
+        Indexes SQLite creates for constraints are kept.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): A cursor of the database connection.
+        - table (str): The table name.
+        - object_type (str): "index" or "trigger".
+
+        Returns:
+        list: The CREATE statements of the dropped objects.
+        """
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE tbl_name = ? AND type = ? AND sql IS NOT NULL",
+                   (table, object_type))
+    objects = cursor.fetchall()
+    for name, _ in objects:
+        cursor.execute('DROP %s "%s"' % (object_type.upper(), name))
+    return [sql for _, sql in objects]
+
+
+def _rebuild_streaks(conn, habit_ids):
+    """
+        Recompute the streaks of habits and store their current length as the streak count.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_ids (iterable): The ids of the habits.
+        """
+    conn.executemany('UPDATE habits SET streak = ? WHERE id=?',
+                     [(streaks.rebuild_streak(conn, habit_id), habit_id) for habit_id in habit_ids])
+
+
+def import_habits(conn, rows, bulk=False, report=None):
+    """
+        Upsert habit definitions by name in one transaction.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - rows (iterable): Dicts with a name and optional description, periodicity, category,
+          creation_time and streak.
+        - bulk (bool): Drop the secondary indexes of habits during the load and recreate them afterwards.
+        - report (callable): Progress callback, as accepted by Progress.
+
+        Returns:
+        dict: The number of rows upserted and rejected (no name), the seconds taken and the rows per second.
+        """
+    progress = Progress("habits", report)
+    upserted = 0
+    rejected = 0
+    batch = []
+    cursor = conn.cursor()
+    with db.transaction(conn):
+        # Habits already there may change periodicity, which moves their streak periods
+        existing_ids = set()
+        # The periodicity trigger stays: it keeps the counters of updated habits right
+        dropped = _drop_schema_objects(cursor, "habits", "index") if bulk else []
+        for row in rows:
+            progress.add()
+            name = (row.get("name") or "").strip()
+            if not name:
+                rejected += 1
+                continue
+            batch.append((name, row.get("description") or None, row.get("periodicity") or None,
+                          row.get("category") or None, _epoch(row.get("creation_time")) or int(time.time()),
+                          int(row.get("streak") or 0)))
+            if len(batch) >= BATCH_SIZE:
+                existing_ids.update(_existing_ids(cursor, batch))
+                cursor.executemany(_UPSERT_HABIT, batch)
+                upserted += len(batch)
+                batch = []
+        if batch:
+            existing_ids.update(_existing_ids(cursor, batch))
+            cursor.executemany(_UPSERT_HABIT, batch)
+            upserted += len(batch)
+        for sql in dropped:
+            cursor.execute(sql)
+        _rebuild_streaks(conn, existing_ids)
+    return {"upserted": upserted, "rejected": rejected, "seconds": progress.seconds(), "rows_per_second": progress.rate()}
+
+
+def _existing_ids(cursor, batch):
+    """Return the ids of the habits of an upsert batch that already exist."""
+    names = [row[0] for row in batch]
+    ids = []
+    # Stay below SQLite's limit on the number of parameters
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        cursor.execute('SELECT id FROM habits WHERE name IN (%s)' % ", ".join("?" * len(chunk)), chunk)
+        ids.extend(habit_id for habit_id, in cursor.fetchall())
+    return ids
+
+
+def import_logs(conn, rows, bulk=False, report=None):
+    """
+        Import completions in one transaction, skipping those a habit already has.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - rows (iterable): Dicts with habit_name (or name) and completion_time.
+        - bulk (bool): Drop the index and triggers of habit_logs during the load, recreate them
+          afterwards and recompute the rollups, counters and streaks of all habits.
+        - report (callable): Progress callback, as accepted by Progress.
+
+        Returns:
+        dict: The number of rows inserted, skipped as duplicates and rejected (unknown habit or
+        missing time), the seconds taken and the rows per second.
+        """
+    progress = Progress("logs", report)
+    habit_ids = {}
+    touched_ids = set()
+    read = 0
+    inserted = 0
+    rejected = 0
+    batch = []
+    cursor = conn.cursor()
+    statement = _INSERT_LOG if bulk else _INSERT_NEW_LOG
+    with db.transaction(conn):
+        first_new_id = cursor.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM habit_logs').fetchone()[0]
+        if bulk:
+            dropped_indexes = _drop_schema_objects(cursor, "habit_logs", "index")
+            dropped_triggers = _drop_schema_objects(cursor, "habit_logs", "trigger")
+        for row in rows:
+            progress.add()
+            habit_name = row.get("habit_name") or row.get("name")
+            if habit_name not in habit_ids:
+                habit_ids[habit_name] = db.get_habit_id(conn, habit_name)
+            habit_id = habit_ids[habit_name]
+            completion_time = _epoch(row.get("completion_time"))
+            if habit_id is None or completion_time is None:
+                rejected += 1
+                continue
+            read += 1
+            touched_ids.add(habit_id)
+            batch.append((habit_id, completion_time) if bulk else (habit_id, completion_time, habit_id, completion_time))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(statement, batch)
+                # Summed over the statements; the duplicates skipped by NOT EXISTS insert nothing
+                inserted += cursor.rowcount
+                batch = []
+        if batch:
+            cursor.executemany(statement, batch)
+            inserted += cursor.rowcount
+
+        if bulk:
+            for sql in dropped_indexes:
+                cursor.execute(sql)
+            # With the index back, every new completion that has an older twin is a duplicate
+            cursor.execute('DELETE FROM habit_logs WHERE id >= ? AND EXISTS (SELECT 1 FROM habit_logs o '
+                           'WHERE o.habit_id = habit_logs.habit_id AND o.completion_time = habit_logs.completion_time '
+                           'AND o.id < habit_logs.id)', (first_new_id,))
+            inserted -= cursor.rowcount
+            for sql in dropped_triggers:
+                cursor.execute(sql)
+            period_stats.rebuild(conn)
+            counters.rebuild(conn)
+            streaks.rebuild_all(conn)
+            conn.executemany('UPDATE habits SET streak = COALESCE((SELECT current_length FROM habit_streaks '
+                             'WHERE habit_id = habits.id), 0) WHERE id = ?', [(habit_id,) for habit_id in touched_ids])
+        else:
+            _rebuild_streaks(conn, touched_ids)
+    return {"inserted": inserted, "duplicates": read - inserted, "rejected": rejected,
+            "seconds": progress.seconds(), "rows_per_second": progress.rate()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import habits or completion logs from CSV or JSON Lines.")
+    parser.add_argument("table", choices=["habits", "logs"])
+    parser.add_argument("input", help="input file (.csv, .jsonl, optionally .gz) or - for standard input")
+    parser.add_argument("--database", help="SQLite database file, or a file: URI (default: %s)" % connection.DB_NAME)
+    parser.add_argument("--format", choices=export.FORMATS, help="input format (default: from the file name)")
+    parser.add_argument("--bulk", action="store_true",
+                        help="drop and rebuild indexes and triggers around the load, for very large imports")
+    args = parser.parse_args()
+
+    conn = connection.open_connection(args.database)
+    try:
+        rows = read_rows(args.input, args.format)
+        if args.table == "habits":
+            result = import_habits(conn, rows, args.bulk)
+            summary = f"{result['upserted']} habits upserted, {result['rejected']} rejected"
+        else:
+            result = import_logs(conn, rows, args.bulk)
+            summary = (f"{result['inserted']} completions imported, {result['duplicates']} duplicates skipped, "
+                       f"{result['rejected']} rejected")
+    finally:
+        conn.close()
+    print(f"{summary} in {result['seconds']:.2f} s ({result['rows_per_second']:.0f} rows/s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,58 @@
-import sqlite3
-from habit import Habit
-from analytics_module import *
-import questionary as q
+import argparse
+import logging
+import sys
+import commands
+import connection
+import tracing
 
 """The CLI(Command Line Interface)"""
 
-DB_NAME = "habit_tracker.db"
-conn = sqlite3.connect(DB_NAME)
+# Imported by load_menus(), so that the headless commands start without them
+q = db = analytics_module = completion_buffer = streaks = Habit = None
 
+# The database used by the menus; set with --database or HABIT_TRACKER_DB
+DB_NAME = connection.DB_NAME
 
-def connect_database(db_name="habit_tracker.db"):
-    conn = sqlite3.connect(db_name)
-    db.create_tables(conn)
-    return conn
+# The number of habits listed before asking whether to show more
+PAGE_SIZE = 20
 
+# Shown after a manual streak change, which the completion log overrides
+MANUAL_STREAK_NOTE = ("Manual streak changes are temporary: the next completion counts the streak "
+                      "from the completion log again, and a missed period still breaks it.")
 
-def show_all_habits_menu(db_conn):
-    habits = db.get_habit_names(db_conn)
+
+def load_menus():
+    """Import the modules used by the interactive menus."""
+    global q, db, analytics_module, completion_buffer, streaks, Habit
+    import questionary as q
+    import analytics_module
+    import completion_buffer
+    import db
+    import streaks
+    from habit import Habit
+
+
+def show_habit_pages(db_conn, header, empty_message, describe, periodicity=None):
+    """Print habits a page at a time, ordered by name, until the last page or the user stops."""
+    habits, page_token = db.get_habit_page(db_conn, page_size=PAGE_SIZE, periodicity=periodicity)
     if not habits:
-        print("No habits found.")
-    else:
-        print("All Habits:")
+        print(empty_message)
+        return
+    print(header)
+    while True:
         for habit in habits:
-            print(habit)
+            print(describe(habit))
+        if page_token is None or not q.confirm("Show more habits?").ask():
+            return
+        habits, page_token = db.get_habit_page(db_conn, page_token=page_token, page_size=PAGE_SIZE,
+                                               periodicity=periodicity)
+
+
+def show_all_habits_menu(db_conn):
+    show_habit_pages(db_conn, "All Habits:", "No habits found.",
+                     lambda habit: f"{habit.name} ({habit.periodicity}, {habit.category}) - "
+                                   f"streak {streaks.current_streak(db_conn, habit.id)}, "
+                                   f"{habit.total_completions} completions")
 
 
 def add_habit_menu():
@@ -70,7 +100,7 @@ def add_habit_menu():
             description = selected_habit['description']
 
         # Create a new Habit and add it to the database
-        new_habit = Habit(name, description, periodicity, category, "habit_tracker.db")
+        new_habit = Habit(name, description, periodicity, category, DB_NAME)
         new_habit.add()
         """new_habit.update(name, description, periodicity, category)"""
 
@@ -84,17 +114,15 @@ def remove_habit_menu():
 
         if choice == "Remove Single Habit":
             name = q.text("Habit Name:").ask()
-            habit = Habit(name, database="habit_tracker.db")
+            habit = Habit(name, database=DB_NAME)
             habit.remove()
             print(f"Habit '{name}' removed successfully.")
 
         elif choice == "Remove All Habits":
             confirm = q.confirm("Are you sure you want to remove all habits?, Y for Yes and N for No").ask()
             if confirm:
-                db_conn = db.connect_database()
-                db.remove_all_habits(db_conn)
+                db.remove_all_habits(connection.get_connection(DB_NAME))
                 print("All habits removed successfully.")
-                db_conn.close()
             else:
                 print("Operation canceled.")
 
@@ -129,17 +157,9 @@ def habit_streak_menu(db_conn):
             habit_name = q.text("Enter Habit Name:").ask()
             habit = Habit(habit_name, database=DB_NAME)  # Create a Habit object for the specified habit_name
 
-            if db.check_habit_exists(db_conn, habit_name):
-                cursor = db_conn.cursor()
-                cursor.execute("SELECT id FROM habits WHERE name=?", (habit_name,))
-                habit_id = cursor.fetchone()
-
-                if habit_id:
-                    habit_id = habit_id[0]
-                    habit.complete_habit()  # Pass habit_id to the complete_habit method
-                    print(f"\nHabit '{habit_name}' has been completed.\n")
-                else:
-                    print(f"Habit ID for '{habit_name}' not found.")
+            if db.get_habit_id(db_conn, habit_name) is not None:
+                habit.complete_habit()
+                print(f"\nHabit '{habit_name}' has been completed.\n")
             else:
                 print(f"Habit '{habit_name}' not found.")
 
@@ -149,6 +169,7 @@ def habit_streak_menu(db_conn):
 
             if db.check_habit_exists(db_conn, habit_name):
                 habit.increase_streak()
+                print(MANUAL_STREAK_NOTE)
             else:
                 print(f"Habit '{habit_name}' not found.")
         elif streak_choice == "Clear Streak":
@@ -157,6 +178,7 @@ def habit_streak_menu(db_conn):
 
             if db.check_habit_exists(db_conn, habit_name):
                 habit.clear_streak()
+                print(MANUAL_STREAK_NOTE)
             else:
                 print(f"Habit '{habit_name}' not found.")
         elif streak_choice == "Modify Streak":
@@ -171,6 +193,7 @@ def habit_streak_menu(db_conn):
                 except ValueError:
                     print("Please enter a valid integer for the new streak count.")
                 habit.modify_streak(new_streak)
+                print(MANUAL_STREAK_NOTE)
             else:
                 print(f"Habit '{habit_name}' not found.")
         elif streak_choice == "Back":
@@ -191,27 +214,18 @@ def analyze_habits_menu(db_conn):
         ]).ask()
 
         if  analysis_choice == "List Tracked Habits":
-            tracked_habits = get_all_tracked_habits(db_conn)
-            if tracked_habits:
-                print("Currently Tracked Habits:")
-                for habit in tracked_habits:
-                    print(habit)
-            else:
-                print("No habits are currently being tracked.")
+            show_habit_pages(db_conn, "Currently Tracked Habits:", "No habits are currently being tracked.",
+                             lambda habit: habit.name)
 
         elif analysis_choice == "List Habits by Periodicity":
             periodicity = q.text("Enter Periodicity (daily, weekly, monthly):").ask()
-            matching_habits = habits_by_periodicity(db_conn, periodicity)
-            if matching_habits:
-                print(f"Habits with Periodicity '{periodicity}':")
-                for habit in matching_habits:
-                    print(habit)
-            else:
-                print(f"No habits found with Periodicity '{periodicity}'.")
+            show_habit_pages(db_conn, f"Habits with Periodicity '{periodicity}':",
+                             f"No habits found with Periodicity '{periodicity}'.", lambda habit: habit.name,
+                             periodicity=periodicity)
 
         elif analysis_choice == "Longest Streak Overall":
             # Calculate and display the longest streak overall
-            longest_streak = find_longest_streak_overall(db_conn)
+            longest_streak = analytics_module.find_longest_streak_overall(db_conn)
             if longest_streak:
                 print(f"Longest Streak Overall: {longest_streak}")
             else:
@@ -224,7 +238,7 @@ def analyze_habits_menu(db_conn):
 
             if db.check_habit_exists(db_conn, habit_name):
 
-                streak = find_longest_streak_for_habit(db_conn, habit_name)
+                streak = analytics_module.find_longest_streak_for_habit(db_conn, habit_name)
 
                 print(f"Longest Streak for {habit_name}: {streak}")
 
@@ -234,12 +248,12 @@ def analyze_habits_menu(db_conn):
 
         elif analysis_choice == "Habit with Lowest Completion Rate":
             # Find and display the habit with the lowest completion rate
-            habit_name, lowest_completion_rate = find_habit_with_lowest_completion_rate(db_conn)
+            habit_name, lowest_completion_rate = analytics_module.find_habit_with_lowest_completion_rate(db_conn)
             print(f"Habit with Lowest Completion Rate: {habit_name}, Completion Rate: {lowest_completion_rate:.2%}")
 
         elif analysis_choice == "Habit Completion Rate":
             # Calculate and display the success rate for all habits
-            success_rates = calculate_completion_rate(db_conn)
+            success_rates = analytics_module.calculate_completion_rate(db_conn)
             if success_rates:
                 for habit, rate in success_rates.items():
                     print(f"Habit: {habit}, Success Rate: {rate:.2%}")
@@ -247,7 +261,7 @@ def analyze_habits_menu(db_conn):
                 print("No habits found, Add some habits")
         elif analysis_choice == "Habits Needing Improvement":
             # Find and display habits needing improvement
-            habits_needing_improvement = identify_habits_needing_improvement(db_conn, completion_rate_threshold=0.7)
+            habits_needing_improvement = analytics_module.identify_habits_needing_improvement(db_conn, completion_rate_threshold=0.7)
             if habits_needing_improvement:
                 for habit, rate in habits_needing_improvement:
                     print(f"Habit: {habit}, Completion Rate: {rate:.2%}")
@@ -259,7 +273,8 @@ def analyze_habits_menu(db_conn):
 
 
 def main_menu():
-    conn = connect_database()  # Establish the database connection
+    conn = connection.get_connection(DB_NAME)  # Shared connection, also used by Habit objects
+    completion_buffer.start_from_environment(DB_NAME)
     while True:
         choice = q.select("Select an action:", choices=[
             "Show All Habits",
@@ -286,8 +301,29 @@ def main_menu():
         elif choice == "Exit":
             break
 
-    conn.close()
+    # Write the completions still waiting in the write-behind buffer
+    buffer_stats = completion_buffer.stop()
+    if buffer_stats is not None:
+        print(f"Buffered completions written: {buffer_stats['flushed']} in {buffer_stats['flushes']} flushes "
+              f"(mean {buffer_stats['mean_flush_ms']:.1f} ms, max {buffer_stats['max_flush_ms']:.1f} ms, "
+              f"max queue depth {buffer_stats['max_depth']}).")
+    connection.close_all()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Track and analyze your habits.")
+    parser.add_argument("--database", help="SQLite database file, or a file: URI "
+                                           "(default: $HABIT_TRACKER_DB or habit_tracker.db)")
+    commands.add_parsers(parser.add_subparsers(dest="command", title="commands",
+                                               description="run a single action without the menus"))
+    args = parser.parse_args()
+    if args.database:
+        connection.DB_NAME = DB_NAME = args.database
+    # Report the applied schema migrations (and failures of other modules) on stderr
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("migrations").setLevel(logging.INFO)
+    tracing.enable_from_environment()
+    if args.command:
+        sys.exit(commands.run(args))
+    load_menus()
     main_menu()
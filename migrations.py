@@ -0,0 +1,267 @@
+import logging
+import time
+import counters
+import period_stats
+import streaks
+
+"""Versioned schema migrations, tracked with PRAGMA user_version."""
+
+logger = logging.getLogger(__name__)
+
+
+def _create_base_tables(cursor):
+    """
+        Create the habits and habit_logs tables.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS habits (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            periodicity TEXT,
+            category TEXT,
+            creation_time DATETIME,
+            streak INTEGER DEFAULT 0,
+            completion_time DATETIME DEFAULT NULL
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS habit_logs (
+            id INTEGER PRIMARY KEY,
+            habit_id INTEGER,
+            completed BOOLEAN,
+            completion_time DATETIME,
+            FOREIGN KEY (habit_id) REFERENCES habits(id)
+        )
+    ''')
+
+
+def _add_indexes(cursor):
+    """
+        Index habit_logs by habit and completion time and habits by category.
+        Logs left behind by deleted habits are removed so the foreign key holds.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute('DELETE FROM habit_logs WHERE habit_id IS NOT NULL AND habit_id NOT IN (SELECT id FROM habits)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_habit_logs_habit_time ON habit_logs (habit_id, completion_time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_habits_category ON habits (category)')
+
+
+def _epoch_timestamps(cursor):
+    """
+        Convert the datetime strings written by the sqlite3 default adapter
+        (local time) to integer UTC epoch seconds.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    for table, column in (("habits", "creation_time"), ("habits", "completion_time"),
+                          ("habit_logs", "completion_time")):
+        cursor.execute('''
+            UPDATE {table} SET {column} = CAST(strftime('%s', {column}, 'utc') AS INTEGER)
+            WHERE typeof({column}) = 'text' AND strftime('%s', {column}, 'utc') IS NOT NULL
+        '''.format(table=table, column=column))
+
+
+def _streak_checkpoints(cursor):
+    """
+        Create the streak checkpoint table, filled by the streak runs migration.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS habit_streaks (
+            habit_id INTEGER PRIMARY KEY REFERENCES habits(id) ON DELETE CASCADE,
+            last_period INTEGER,
+            current_length INTEGER NOT NULL DEFAULT 0,
+            longest_length INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _streak_runs(cursor):
+    """
+        Create the streak run history and rebuild all streaks from the existing logs.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS streak_runs (
+            id INTEGER PRIMARY KEY,
+            habit_id INTEGER NOT NULL REFERENCES habits(id) ON DELETE CASCADE,
+            start_period INTEGER NOT NULL,
+            end_period INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_streak_runs_length ON streak_runs (length)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_streak_runs_habit_end ON streak_runs (habit_id, end_period)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_streak_runs_end ON streak_runs (end_period)')
+    streaks.rebuild_all(cursor.connection)
+    # The stored streak counts follow the rebuilt streaks; habits without completions keep theirs
+    cursor.execute('UPDATE habits SET streak = (SELECT current_length FROM habit_streaks WHERE habit_id = habits.id) '
+                   'WHERE id IN (SELECT habit_id FROM habit_streaks)')
+
+
+def _period_stats(cursor):
+    """
+        Create the per-period completion rollup, its triggers and its initial counts.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS habit_period_stats (
+            habit_id INTEGER NOT NULL REFERENCES habits(id) ON DELETE CASCADE,
+            periodicity TEXT NOT NULL,
+            period_key INTEGER NOT NULL,
+            completions INTEGER NOT NULL,
+            PRIMARY KEY (habit_id, periodicity, period_key)
+        ) WITHOUT ROWID
+    ''')
+    period_stats.create_triggers(cursor)
+    period_stats.rebuild(cursor.connection)
+
+
+def _completion_counters(cursor):
+    """
+        Add the running completion counters to habits, with their triggers and initial values.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(habits)')]
+    for column, definition in (("total_completions", "INTEGER NOT NULL DEFAULT 0"),
+                               ("first_completion", "INTEGER"),
+                               ("last_completion", "INTEGER"),
+                               ("last_period_key", "INTEGER")):
+        if column not in columns:
+            cursor.execute('ALTER TABLE habits ADD COLUMN %s %s' % (column, definition))
+    counters.create_triggers(cursor)
+    counters.rebuild(cursor.connection)
+
+
+def _periodicity_name_index(cursor):
+    """
+        Index habits by periodicity and name for paged listings of one periodicity.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_habits_periodicity_name ON habits (periodicity, name)')
+
+
+def _counters_delete_trigger(cursor):
+    """
+        Replace the counter trigger for deleted completions, which recounted all logs of the habit.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute('DROP TRIGGER IF EXISTS habit_logs_counters_delete')
+    counters.create_triggers(cursor)
+
+
+def _autoincrement_log_ids(cursor):
+    """
+        Rebuild habit_logs with AUTOINCREMENT ids, so the ids of deleted logs are never reused
+        and a log id can serve as the high-water mark of incremental exports.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): The cursor of the migrating connection.
+        """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE tbl_name = 'habit_logs' AND type IN ('index', 'trigger') "
+                   "AND sql IS NOT NULL")
+    schema_objects = [sql for sql, in cursor.fetchall()]
+    cursor.execute('''
+        CREATE TABLE habit_logs_autoincrement (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER,
+            completed BOOLEAN,
+            completion_time DATETIME,
+            FOREIGN KEY (habit_id) REFERENCES habits(id)
+        )
+    ''')
+    # Copied ids move sqlite_sequence to the largest one
+    cursor.execute('INSERT INTO habit_logs_autoincrement (id, habit_id, completed, completion_time) '
+                   'SELECT id, habit_id, completed, completion_time FROM habit_logs')
+    cursor.execute('DROP TABLE habit_logs')
+    cursor.execute('ALTER TABLE habit_logs_autoincrement RENAME TO habit_logs')
+    for sql in schema_objects:
+        cursor.execute(sql)
+
+
+# (version, description, step) in the order they must be applied
+MIGRATIONS = [
+    (1, "create habits and habit_logs tables", _create_base_tables),
+    (2, "index habit_logs and habit categories", _add_indexes),
+    (3, "store timestamps as integer epoch seconds", _epoch_timestamps),
+    (4, "add streak checkpoints", _streak_checkpoints),
+    (5, "add streak run history and derive streaks from habit_logs", _streak_runs),
+    (6, "add per-period completion rollups", _period_stats),
+    (7, "add running completion counters to habits", _completion_counters),
+    (8, "index habits by periodicity and name", _periodicity_name_index),
+    (9, "update completion counters incrementally on delete", _counters_delete_trigger),
+    (10, "never reuse the ids of deleted completion logs", _autoincrement_log_ids),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """
+        Retrieve the schema version of the database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        int: The version stored in PRAGMA user_version.
+        """
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """
+        Upgrade the database in place to the latest schema version.
+        Every migration runs in its own transaction together with the version bump.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        list: (version, seconds) pairs for the migrations that were applied.
+        """
+    applied = []
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return applied
+
+    if conn.in_transaction:
+        conn.commit()
+    cursor = conn.cursor()
+    for version, description, step in MIGRATIONS:
+        start = time.perf_counter()
+        # Take the write lock first so concurrent processes migrate only once
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(cursor)
+            cursor.execute('PRAGMA user_version = %d' % version)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        applied.append((version, elapsed))
+        logger.info("Applied migration %d (%s) in %.1f ms", version, description, elapsed * 1000)
+    return applied
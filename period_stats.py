@@ -0,0 +1,122 @@
+import sys
+import connection
+import periods
+
+"""Per-period completion counts kept in habit_period_stats.
+
+Every completion is counted in its daily, weekly and monthly bucket, keyed by
+the same period numbers as periods.period_index. SQLite triggers on habit_logs
+keep the counts current, so reports read a few aggregated rows instead of the
+whole log. Buckets are computed in the local time zone at insert time; run
+
+    python period_stats.py [database]
+
+to recount them from habit_logs, e.g. after the time zone changed."""
+
+# Local calendar period of a completion time column, as numbered by periods.period_index
+_DAY_SQL = "CAST(julianday({0}, 'unixepoch', 'localtime', 'start of day') - 1721424.5 AS INTEGER)"
+_PERIOD_SQL = {
+    "daily": _DAY_SQL,
+    "weekly": "((" + _DAY_SQL + " - 1) / 7)",
+    "monthly": "(CAST(strftime('%Y', {0}, 'unixepoch', 'localtime') AS INTEGER) * 12"
+               " + CAST(strftime('%m', {0}, 'unixepoch', 'localtime') AS INTEGER) - 1)",
+}
+
+
+def period_sql(column, periodicity):
+    """
+        Build the SQL expression numbering the period of an epoch time column.
+
+        Parameters:
+        - column (str): The SQL expression of the completion time.
+        - periodicity (str): The periodicity of the bucket (daily, weekly or monthly).
+
+        Returns:
+        str: The SQL expression.
+        """
+    return _PERIOD_SQL[periodicity].format(column)
+
+
+def create_triggers(cursor):
+    """
+        Create the triggers that keep habit_period_stats in step with habit_logs.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): A cursor of the database connection.
+        """
+    def buckets(row):
+        return ", ".join("(%s.habit_id, '%s', %s, 1)" % (row, periodicity, period_sql(row + ".completion_time", periodicity))
+                         for periodicity in periods.PERIODICITIES)
+
+    def matching(row):
+        return " OR ".join("(periodicity = '%s' AND period_key = %s)" % (periodicity, period_sql(row + ".completion_time", periodicity))
+                           for periodicity in periods.PERIODICITIES)
+
+    count = ('INSERT INTO habit_period_stats (habit_id, periodicity, period_key, completions) VALUES {0} '
+             'ON CONFLICT (habit_id, periodicity, period_key) DO UPDATE SET completions = completions + 1;')
+    uncount = ('UPDATE habit_period_stats SET completions = completions - 1 WHERE habit_id = OLD.habit_id AND ({0}); '
+               'DELETE FROM habit_period_stats WHERE habit_id = OLD.habit_id AND completions <= 0;')
+    counted = "{0}.habit_id IS NOT NULL AND {0}.completion_time IS NOT NULL"
+
+    cursor.execute('CREATE TRIGGER IF NOT EXISTS habit_logs_count_insert AFTER INSERT ON habit_logs '
+                   'WHEN %s BEGIN %s END' % (counted.format("NEW"), count.format(buckets("NEW"))))
+    cursor.execute('CREATE TRIGGER IF NOT EXISTS habit_logs_count_delete AFTER DELETE ON habit_logs '
+                   'WHEN %s BEGIN %s END' % (counted.format("OLD"), uncount.format(matching("OLD"))))
+    cursor.execute('CREATE TRIGGER IF NOT EXISTS habit_logs_count_update_old AFTER UPDATE OF habit_id, completion_time '
+                   'ON habit_logs WHEN %s BEGIN %s END' % (counted.format("OLD"), uncount.format(matching("OLD"))))
+    cursor.execute('CREATE TRIGGER IF NOT EXISTS habit_logs_count_update_new AFTER UPDATE OF habit_id, completion_time '
+                   'ON habit_logs WHEN %s BEGIN %s END' % (counted.format("NEW"), count.format(buckets("NEW"))))
+
+
+def rebuild(conn):
+    """
+        Recount habit_period_stats from habit_logs.
+        The caller is responsible for committing.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        int: The number of buckets.
+        """
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM habit_period_stats')
+    for periodicity in periods.PERIODICITIES:
+        key = period_sql("l.completion_time", periodicity)
+        cursor.execute('INSERT INTO habit_period_stats (habit_id, periodicity, period_key, completions) '
+                       'SELECT l.habit_id, ?, ' + key + ', COUNT(*) FROM habit_logs l JOIN habits h ON h.id = l.habit_id '
+                       'WHERE l.completion_time IS NOT NULL GROUP BY l.habit_id, ' + key, (periodicity,))
+    return cursor.execute('SELECT COUNT(*) FROM habit_period_stats').fetchone()[0]
+
+
+def completions_per_period(conn, habit_id, periodicity):
+    """
+        Retrieve the completion counts of a habit per period.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+        - periodicity (str): The bucket size (unknown periodicities count as daily).
+
+        Returns:
+        list: (period number, completions) tuples in period order.
+        """
+    if periodicity not in periods.PERIODICITIES:
+        periodicity = "daily"
+    cursor = conn.cursor()
+    cursor.execute('SELECT period_key, completions FROM habit_period_stats '
+                   'WHERE habit_id=? AND periodicity=? ORDER BY period_key', (habit_id, periodicity))
+    return cursor.fetchall()
+
+
+def main():
+    database = sys.argv[1] if len(sys.argv) > 1 else connection.DB_NAME
+    conn = connection.open_connection(database)
+    with conn:
+        buckets = rebuild(conn)
+    conn.close()
+    print(f"Rebuilt {buckets} period buckets in {database}.")
+
+
+if __name__ == "__main__":
+    main()
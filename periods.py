@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+"""Numbering of the daily, weekly and monthly periods habits are tracked in."""
+
+PERIODICITIES = ("daily", "weekly", "monthly")
+
+
+def period_index(timestamp, periodicity):
+    """
+        Number the local calendar period that contains a point in time.
+        Consecutive periods have consecutive numbers; weeks start on Monday.
+        Unknown periodicities are treated as daily.
+
+        Parameters:
+        - timestamp (int): UTC epoch seconds.
+        - periodicity (str): The periodicity of the habit (daily, weekly or monthly).
+
+        Returns:
+        int: The period number.
+        """
+    moment = datetime.fromtimestamp(timestamp)
+    if periodicity == "weekly":
+        return (moment.toordinal() - 1) // 7
+    if periodicity == "monthly":
+        return moment.year * 12 + moment.month - 1
+    return moment.toordinal()
+
+
+def period_start(period, periodicity):
+    """
+        Find the first day of a numbered period.
+
+        Parameters:
+        - period (int): The period number, as returned by period_index.
+        - periodicity (str): The periodicity of the habit (daily, weekly or monthly).
+
+        Returns:
+        date: The first day of the period.
+        """
+    if periodicity == "weekly":
+        return date.fromordinal(period * 7 + 1)
+    if periodicity == "monthly":
+        return date(period // 12, period % 12 + 1, 1)
+    return date.fromordinal(period)
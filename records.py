@@ -0,0 +1,45 @@
+"""Lightweight habit records for listings and analytics.
+
+A HabitRecord holds the columns of one habits row and nothing else: no
+connection and no output, and __slots__ instead of a per-instance dict, so
+hundreds of thousands of them can be loaded at once. db.get_habit_records
+hydrates them in bulk from a single query."""
+
+# The habits columns of a record, in the order of HabitRecord's arguments
+COLUMNS = ("id", "name", "description", "periodicity", "category", "creation_time", "streak",
+           "total_completions", "last_completion")
+
+
+class HabitRecord:
+    """One habit as stored: times are UTC epoch seconds, streak is the stored streak count and
+    total_completions and last_completion are the running completion counters."""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, id, name, description=None, periodicity=None, category=None, creation_time=None,
+                 streak=0, total_completions=0, last_completion=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.periodicity = periodicity
+        self.category = category
+        self.creation_time = creation_time
+        self.streak = streak
+        self.total_completions = total_completions
+        self.last_completion = last_completion
+
+    def as_tuple(self):
+        """Return the values in the order of COLUMNS."""
+        return tuple(getattr(self, column) for column in COLUMNS)
+
+    def as_dict(self):
+        """Return a dict mapping the names in COLUMNS to the values."""
+        return {column: getattr(self, column) for column in COLUMNS}
+
+    def __eq__(self, other):
+        if not isinstance(other, HabitRecord):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return "HabitRecord(%s)" % ", ".join("%s=%r" % (column, getattr(self, column)) for column in COLUMNS)
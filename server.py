@@ -0,0 +1,392 @@
+import argparse
+import http.server
+import json
+import queue
+import re
+import threading
+import time
+from datetime import date, datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+import analytics_module
+import connection
+import db
+import storage
+import tracing
+
+"""Local JSON HTTP service for the habit operations and analytics.
+
+    python server.py --port 8765 --workers 8
+
+Requests are queued for a fixed pool of worker threads; when the queue is
+full, the server stops accepting connections until a worker is free. Every
+worker uses its own shared connection (connection.get_connection is per
+thread) and writes go through db.transaction, so concurrent completions are
+serialized by SQLite. GET /stats reports the request latencies per route.
+
+    GET    /habits?periodicity=&page_size=&page_token=    one page of habit records
+    POST   /habits                                        add {name, description, periodicity, category}
+    PUT    /habits/<name>                                 update any of {name, description, periodicity, category}
+    DELETE /habits/<name>                                 remove
+    POST   /habits/<name>/complete                        complete now or at {"time"}, returns the streak
+    PUT    /habits/<name>/streak                          set {"streak"}
+    GET    /analytics/completion-rates[/<name>]
+    GET    /analytics/lowest-completion-rate
+    GET    /analytics/needing-improvement?threshold=0.7
+    GET    /analytics/longest-streak[/<name>]
+    GET    /analytics/completions-per-period/<name>
+    GET    /analytics/habits?periodicity=
+
+The server binds to 127.0.0.1 by default and has no authentication."""
+
+DEFAULT_PORT = 8765
+MAX_PAGE_SIZE = 1000
+# The habit fields PUT /habits/<name> can change besides the name
+UPDATE_FIELDS = ("description", "periodicity", "category")
+
+
+class HTTPError(Exception):
+    """An error answered with an HTTP status and a JSON message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError("%r is not JSON serializable" % (value,))
+
+
+class HabitRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Maps the routes to the storage backend and analytics_module and answers in JSON."""
+
+    server_version = "HabitTracker/1.0"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _dispatch(self, method):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        self.query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        route = "%s (no route)" % method
+        try:
+            for route_method, pattern, handler, route_name in ROUTES:
+                match = pattern.fullmatch(url.path)
+                if match and route_method == method:
+                    route = "%s %s" % (method, route_name)
+                    status, body = handler(self, *[unquote(group) for group in match.groups()])
+                    break
+            else:
+                raise HTTPError(404, "No route for %s %s." % (method, url.path))
+        except HTTPError as error:
+            status, body = error.status, {"error": str(error)}
+        except Exception as error:  # Answer instead of dropping the connection
+            status, body = 500, {"error": "%s: %s" % (type(error).__name__, error)}
+        self._send(status, body)
+        self.server.record(route, time.perf_counter() - start, status)
+
+    def _send(self, status, body):
+        payload = json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise HTTPError(400, "The request body is not valid JSON.")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "The request body must be a JSON object.")
+        return body
+
+    def _conn(self):
+        return connection.get_connection(self.server.database)
+
+    def _backend(self):
+        return storage.SQLiteBackend(self._conn())
+
+    def _existing(self, backend, habit_name):
+        if not backend.habit_exists(habit_name):
+            raise HTTPError(404, "Habit '%s' not found." % habit_name)
+
+    # Habits
+
+    def list_habits(self):
+        try:
+            page_size = int(self.query.get("page_size", 50))
+            if not 1 <= page_size <= MAX_PAGE_SIZE:
+                raise ValueError("The page size must be between 1 and %d." % MAX_PAGE_SIZE)
+            page, page_token = db.get_habit_page(self._conn(), self.query.get("order_by", "name"),
+                                                 self.query.get("page_token"), page_size,
+                                                 self.query.get("periodicity"))
+        except ValueError as error:
+            raise HTTPError(400, str(error))
+        return 200, {"habits": [record.as_dict() for record in page], "next_page_token": page_token}
+
+    def add_habit(self):
+        body = self._body()
+        name = (body.get("name") or "").strip()
+        if not name:
+            raise HTTPError(400, "The habit needs a name.")
+        backend = self._backend()
+        with backend.transaction():
+            if backend.habit_exists(name):
+                raise HTTPError(409, "Habit '%s' already exists." % name)
+            backend.add_habit(name, body.get("description"), body.get("periodicity"), body.get("category"),
+                              int(time.time()))
+        return 201, {"name": name}
+
+    def update_habit(self, habit_name):
+        body = self._body()
+        backend = self._backend()
+        with backend.transaction():
+            stored = backend.conn.execute('SELECT description, periodicity, category FROM habits WHERE name=?',
+                                          (habit_name,)).fetchone()
+            if stored is None:
+                raise HTTPError(404, "Habit '%s' not found." % habit_name)
+            name = body.get("name") or habit_name
+            if name != habit_name and backend.habit_exists(name):
+                raise HTTPError(409, "Habit '%s' already exists." % name)
+            # Fields missing from the body keep their stored values
+            description, periodicity, category = [stored_value if body.get(field) is None else body[field]
+                                                  for field, stored_value in zip(UPDATE_FIELDS, stored)]
+            backend.update_habit(habit_name, name, description, periodicity, category)
+        return 200, {"name": name, "description": description, "periodicity": periodicity, "category": category}
+
+    def delete_habit(self, habit_name):
+        backend = self._backend()
+        with backend.transaction():
+            self._existing(backend, habit_name)
+            backend.delete_habit(habit_name)
+        return 200, {"name": habit_name}
+
+    def complete_habit(self, habit_name):
+        body = self._body()
+        try:
+            completion_time = datetime.fromisoformat(body["time"]) if body.get("time") else int(time.time())
+        except (ValueError, TypeError):
+            raise HTTPError(400, "The time must be an ISO date or datetime.")
+        backend = self._backend()
+        # The log entry and the streak update are committed together
+        with backend.transaction():
+            self._existing(backend, habit_name)
+            backend.mark_as_completed(habit_name, completion_time)
+            streak = backend.current_streak(habit_name)
+        return 200, {"name": habit_name, "streak": streak}
+
+    def set_streak(self, habit_name):
+        body = self._body()
+        if not isinstance(body.get("streak"), int):
+            raise HTTPError(400, "The streak must be an integer.")
+        backend = self._backend()
+        with backend.transaction():
+            self._existing(backend, habit_name)
+            backend.set_streak(habit_name, body["streak"])
+        return 200, {"name": habit_name, "streak": body["streak"]}
+
+    # Analytics
+
+    def completion_rates(self):
+        return 200, analytics_module.calculate_completion_rate(self._conn())
+
+    def completion_rate(self, habit_name):
+        rate = analytics_module.calculate_completion_rate_for_habit(self._conn(), habit_name)
+        if rate is None:
+            raise HTTPError(404, "Habit '%s' not found." % habit_name)
+        return 200, {"name": habit_name, "completion_rate": rate}
+
+    def lowest_completion_rate(self):
+        habit_name, rate = analytics_module.find_habit_with_lowest_completion_rate(self._conn())
+        return 200, {"name": habit_name, "completion_rate": rate}
+
+    def needing_improvement(self):
+        try:
+            threshold = float(self.query.get("threshold", 0.7))
+        except ValueError:
+            raise HTTPError(400, "The threshold must be a number.")
+        habits = analytics_module.identify_habits_needing_improvement(self._conn(), threshold)
+        return 200, [{"name": name, "completion_rate": rate} for name, rate in habits]
+
+    def longest_streak_overall(self):
+        return 200, {"longest_streak": analytics_module.find_longest_streak_overall(self._conn())}
+
+    def longest_streak(self, habit_name):
+        self._existing(self._backend(), habit_name)
+        return 200, {"name": habit_name,
+                     "longest_streak": analytics_module.find_longest_streak_for_habit(self._conn(), habit_name)}
+
+    def completions_per_period(self, habit_name):
+        self._existing(self._backend(), habit_name)
+        counts = analytics_module.completions_per_period(self._conn(), habit_name)
+        return 200, [{"period_start": start, "completions": count} for start, count in counts.items()]
+
+    def tracked_habits(self):
+        periodicity = self.query.get("periodicity")
+        if periodicity is not None:
+            return 200, analytics_module.habits_by_periodicity(self._conn(), periodicity)
+        return 200, analytics_module.get_all_tracked_habits(self._conn())
+
+    def stats(self):
+        return 200, self.server.snapshot()
+
+
+_NAME = "([^/]+)"
+
+# (method, path pattern, handler, route name for the latency statistics)
+ROUTES = [(method, re.compile(pattern.replace("<name>", _NAME)), handler, pattern) for method, pattern, handler in [
+    ("GET", "/habits", HabitRequestHandler.list_habits),
+    ("POST", "/habits", HabitRequestHandler.add_habit),
+    ("PUT", "/habits/<name>", HabitRequestHandler.update_habit),
+    ("DELETE", "/habits/<name>", HabitRequestHandler.delete_habit),
+    ("POST", "/habits/<name>/complete", HabitRequestHandler.complete_habit),
+    ("PUT", "/habits/<name>/streak", HabitRequestHandler.set_streak),
+    ("GET", "/analytics/completion-rates", HabitRequestHandler.completion_rates),
+    ("GET", "/analytics/completion-rates/<name>", HabitRequestHandler.completion_rate),
+    ("GET", "/analytics/lowest-completion-rate", HabitRequestHandler.lowest_completion_rate),
+    ("GET", "/analytics/needing-improvement", HabitRequestHandler.needing_improvement),
+    ("GET", "/analytics/longest-streak", HabitRequestHandler.longest_streak_overall),
+    ("GET", "/analytics/longest-streak/<name>", HabitRequestHandler.longest_streak),
+    ("GET", "/analytics/completions-per-period/<name>", HabitRequestHandler.completions_per_period),
+    ("GET", "/analytics/habits", HabitRequestHandler.tracked_habits),
+    ("GET", "/stats", HabitRequestHandler.stats),
+]]
+
+
+class HabitServer(http.server.HTTPServer):
+    """HTTP server handing requests to a fixed pool of worker threads through a bounded queue."""
+
+    def __init__(self, address=("127.0.0.1", DEFAULT_PORT), database=None, workers=8, queue_size=64,
+                 verbose=False):
+        """
+        Parameters:
+        - address (tuple): The host and port to listen on (port 0 picks a free port).
+        - database (str): The database path or URI (default is connection.DB_NAME).
+        - workers (int): The number of worker threads.
+        - queue_size (int): The number of accepted requests that may wait for a worker.
+        - verbose (bool): Log every request to stderr.
+        """
+        if connection.is_private_memory(database):
+            # Every worker would open its own empty database
+            raise ValueError("An in-memory database must be shared by the workers, "
+                             "use a URI such as file:habits?mode=memory&cache=shared.")
+        super().__init__(address, HabitRequestHandler)
+        self.database = database
+        self.verbose = verbose
+        self.started = time.time()
+        self._requests = queue.Queue(queue_size)
+        self._stats_lock = threading.Lock()
+        self._routes = {}
+        self._errors = 0
+        self._workers = [threading.Thread(target=self._work, name="habit-server-%d" % number, daemon=True)
+                         for number in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def process_request(self, request, client_address):
+        # Blocks the accept loop while every worker is busy and the queue is full
+        self._requests.put((request, client_address))
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+        # Connections can only be closed by the thread that opened them
+        connection.close_all()
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def record(self, route, seconds, status):
+        """
+        Add the latency of a request to the statistics.
+
+        Parameters:
+        - route (str): The method and route pattern.
+        - seconds (float): The time taken to answer.
+        - status (int): The HTTP status of the answer.
+        """
+        with self._stats_lock:
+            tracing.record_call(self._routes, route, seconds)
+            if status >= 500:
+                self._errors += 1
+
+    def snapshot(self):
+        """
+        Summarize the requests answered so far.
+
+        Returns:
+        dict: The uptime, the request and server error counts, the requests per second
+        and calls, total time and p50/p95/p99 latencies per route.
+        """
+        with self._stats_lock:
+            routes = {}
+            for route, stats in sorted(self._routes.items()):
+                routes[route] = stats.as_dict()
+                del routes[route]["rows"], routes[route]["commits"]
+            requests = sum(stats.calls for stats in self._routes.values())
+            errors = self._errors
+        uptime = time.time() - self.started
+        return {"uptime_seconds": uptime, "requests": requests, "server_errors": errors,
+                "requests_per_second": requests / uptime if uptime > 0 else 0.0,
+                "workers": len(self._workers), "routes": routes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the habit tracker as a local JSON HTTP API.")
+    parser.add_argument("--database", help="SQLite database file, or a file: URI (default: %s)" % connection.DB_NAME)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=8, help="worker threads handling the requests")
+    parser.add_argument("--queue-size", type=int, default=64, help="accepted requests waiting for a worker")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    try:
+        server = HabitServer((args.host, args.port), args.database, args.workers, args.queue_size, args.verbose)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Serving {args.database or connection.DB_NAME} on http://{args.host}:{server.server_port} "
+          f"with {args.workers} workers.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
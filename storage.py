@@ -0,0 +1,547 @@
+import bisect
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+import analytics_module
+import connection
+import db
+import periods
+import records
+import streaks
+
+"""Storage backends for habits, their completion logs and their streaks.
+
+StorageBackend is the interface Habit and analytics_module work against.
+SQLiteBackend stores everything through db and streaks on a connection,
+MemoryBackend keeps it in dicts keyed by habit id with a sorted list of
+completion times per habit and never touches the disk, and CachedBackend is a
+MemoryBackend loaded from SQLite that answers reads from memory and writes
+through to SQLite. Habits are addressed by name, times are UTC epoch seconds
+(datetimes are converted with db.to_epoch)."""
+
+
+class StorageBackend:
+    """Interface of a storage backend; subclasses implement every method."""
+
+    def transaction(self):
+        """Return a context manager grouping the writes made inside it."""
+        raise NotImplementedError
+
+    # Habits
+
+    def add_habit(self, name, description, periodicity, category, creation_time, streak=0):
+        """Add a new habit."""
+        raise NotImplementedError
+
+    def delete_habit(self, habit_name):
+        """Delete a habit and its completions."""
+        raise NotImplementedError
+
+    def remove_all_habits(self):
+        """Delete every habit and completion."""
+        raise NotImplementedError
+
+    def update_habit(self, habit_name, name, description, periodicity, category):
+        """Update the information of a habit; its streak follows the new periodicity."""
+        raise NotImplementedError
+
+    def get_habit_id(self, habit_name):
+        """Return the id of a habit, or None if it does not exist."""
+        raise NotImplementedError
+
+    def habit_exists(self, habit_name):
+        """Return True if a habit with this name exists."""
+        return self.get_habit_id(habit_name) is not None
+
+    def habit_names(self):
+        """Return the names of all habits in name order."""
+        raise NotImplementedError
+
+    def habits_with_periodicity(self, periodicity):
+        """Return the names of the habits with a periodicity in name order."""
+        raise NotImplementedError
+
+    def habit_records(self):
+        """Return every habit as a records.HabitRecord in id order."""
+        raise NotImplementedError
+
+    # Streak counter stored with the habit
+
+    def get_streak(self, habit_name):
+        """Return the stored streak count of a habit, or None if it does not exist."""
+        raise NotImplementedError
+
+    def increment_streak(self, habit_name):
+        """Add one to the stored streak count of a habit."""
+        raise NotImplementedError
+
+    def reset_streak(self, habit_name):
+        """Set the stored streak count of a habit to zero."""
+        raise NotImplementedError
+
+    def set_streak(self, habit_name, streak):
+        """Set the stored streak count of a habit."""
+        raise NotImplementedError
+
+    # Completion logs
+
+    def mark_as_completed(self, habit_name, completion_time):
+        """Record a completion and set the stored streak to the run ending at the last completed period."""
+        raise NotImplementedError
+
+    def mark_many_completed(self, completions):
+        """Record (habit name, completion time) pairs; return the numbers inserted and rejected."""
+        raise NotImplementedError
+
+    def completion_time(self, habit_name):
+        """Return the first completion time of a habit, or None."""
+        raise NotImplementedError
+
+    def completion_times(self, habit_name):
+        """Return every completion time of a habit in ascending order."""
+        raise NotImplementedError
+
+    # Streaks and analytics
+
+    def current_streak(self, habit_name, now=None):
+        """Return the streak still running at now (default is the current time)."""
+        raise NotImplementedError
+
+    def longest_streak(self, habit_name):
+        """Return the longest streak a habit ever reached."""
+        raise NotImplementedError
+
+    def longest_streak_overall(self):
+        """Return the longest streak reached by any habit."""
+        raise NotImplementedError
+
+    def completion_rates(self):
+        """Return a dict mapping habit names to their completion rates."""
+        raise NotImplementedError
+
+    def completion_rate(self, habit_name):
+        """Return the completion rate of a habit, or None if it does not exist."""
+        raise NotImplementedError
+
+    def completions_per_period(self, habit_name):
+        """Return a dict mapping the first day of every completed period to its completion count."""
+        raise NotImplementedError
+
+
+class SQLiteBackend(StorageBackend):
+    """Backend storing habits in SQLite through db, streaks and analytics_module."""
+
+    def __init__(self, conn=None):
+        """
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection
+          (default is the current thread's shared connection to connection.DB_NAME).
+        """
+        self.conn = conn if conn is not None else connection.get_connection()
+
+    def transaction(self):
+        return db.transaction(self.conn)
+
+    def add_habit(self, name, description, periodicity, category, creation_time, streak=0):
+        db.add_habit(self.conn, name, description, periodicity, category, creation_time, streak)
+
+    def delete_habit(self, habit_name):
+        db.delete_habit(self.conn, habit_name)
+
+    def remove_all_habits(self):
+        db.remove_all_habits(self.conn)
+
+    def update_habit(self, habit_name, name, description, periodicity, category):
+        db.update_habit(self.conn, habit_name, name, description, periodicity, category)
+
+    def get_habit_id(self, habit_name):
+        return db.get_habit_id(self.conn, habit_name)
+
+    def habit_names(self):
+        return analytics_module.get_all_tracked_habits(self.conn)
+
+    def habits_with_periodicity(self, periodicity):
+        return analytics_module.habits_by_periodicity(self.conn, periodicity)
+
+    def habit_records(self):
+        return db.get_habit_records(self.conn)
+
+    def get_streak(self, habit_name):
+        return db.get_habit_streak_count(self.conn, habit_name)
+
+    def increment_streak(self, habit_name):
+        db.increment_streak(self.conn, habit_name)
+
+    def reset_streak(self, habit_name):
+        db.reset_streak(self.conn, habit_name)
+
+    def set_streak(self, habit_name, streak):
+        db.update_habit_progress(self.conn, habit_name, streak)
+
+    def mark_as_completed(self, habit_name, completion_time):
+        db.mark_as_completed(self.conn, habit_name, completion_time)
+
+    def mark_many_completed(self, completions):
+        return db.mark_many_completed(self.conn, completions)
+
+    def completion_time(self, habit_name):
+        return db.retrieve_habit_completion_time(self.conn, habit_name)
+
+    def completion_times(self, habit_name):
+        db.read_barrier(self.conn)
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT completion_time FROM habit_logs WHERE habit_id=? AND completion_time IS NOT NULL '
+                       'ORDER BY completion_time', (self.get_habit_id(habit_name),))
+        return [completion_time for completion_time, in cursor]
+
+    def current_streak(self, habit_name, now=None):
+        db.read_barrier(self.conn)
+        habit_id = self.get_habit_id(habit_name)
+        return streaks.current_streak(self.conn, habit_id, db.to_epoch(now)) if habit_id is not None else 0
+
+    def longest_streak(self, habit_name):
+        return analytics_module.find_longest_streak_for_habit(self.conn, habit_name)
+
+    def longest_streak_overall(self):
+        return analytics_module.find_longest_streak_overall(self.conn)
+
+    def completion_rates(self):
+        return analytics_module.calculate_completion_rate(self.conn)
+
+    def completion_rate(self, habit_name):
+        return analytics_module.calculate_completion_rate_for_habit(self.conn, habit_name)
+
+    def completions_per_period(self, habit_name):
+        return analytics_module.completions_per_period(self.conn, habit_name)
+
+
+class MemoryBackend(StorageBackend):
+    """Backend keeping habits in memory, without any I/O.
+
+    Habits are dicts keyed by id and every habit has a sorted list of its
+    completion times and a streak checkpoint (last period, current length,
+    longest length), kept up to date as completions arrive like in streaks.
+    Writes cannot fail halfway, so transaction() only groups them and does
+    not roll back."""
+
+    def __init__(self):
+        self._habits = {}
+        self._ids = {}
+        self._completions = {}
+        self._checkpoints = {}
+        self._next_id = 1
+
+    @classmethod
+    def load(cls, conn):
+        """
+        Build a memory backend holding a copy of a SQLite database.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        MemoryBackend: The loaded backend, with the habit ids of the database.
+        """
+        backend = cls()
+        db.read_barrier(conn)
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, name, description, periodicity, category, creation_time, streak '
+                       'FROM habits ORDER BY id')
+        for row in cursor.fetchall():
+            backend._insert_habit(*row)
+        cursor.execute('SELECT habit_id, completion_time FROM habit_logs WHERE completion_time IS NOT NULL '
+                       'ORDER BY habit_id, completion_time')
+        for habit_id, completion_time in cursor:
+            backend._completions[habit_id].append(completion_time)
+        for habit_id in backend._habits:
+            backend._rebuild_checkpoint(habit_id)
+        return backend
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+    def _insert_habit(self, habit_id, name, description, periodicity, category, creation_time, streak):
+        self._habits[habit_id] = {"name": name, "description": description, "periodicity": periodicity,
+                                  "category": category, "creation_time": db.to_epoch(creation_time),
+                                  "streak": streak}
+        self._ids[name] = habit_id
+        self._completions[habit_id] = []
+        self._next_id = max(self._next_id, habit_id + 1)
+
+    def _rebuild_checkpoint(self, habit_id):
+        periodicity = self._habits[habit_id]["periodicity"]
+        checkpoint = streaks._checkpoint(streaks._runs(
+            periods.period_index(completion_time, periodicity) for completion_time in self._completions[habit_id]))
+        if checkpoint is None:
+            self._checkpoints.pop(habit_id, None)
+        else:
+            self._checkpoints[habit_id] = checkpoint
+        return checkpoint[1] if checkpoint is not None else 0
+
+    def _record_completion(self, habit_id, completion_time):
+        """Add a completion time and return the length of the run ending at the last completed period."""
+        times = self._completions[habit_id]
+        in_order = not times or completion_time >= times[-1]
+        bisect.insort(times, completion_time)
+        checkpoint = self._checkpoints.get(habit_id)
+        period = periods.period_index(completion_time, self._habits[habit_id]["periodicity"])
+        if checkpoint is not None and (not in_order or period < checkpoint[0]):
+            return self._rebuild_checkpoint(habit_id)
+        if checkpoint is not None and period == checkpoint[0]:
+            return checkpoint[1]
+        if checkpoint is not None and period == checkpoint[0] + 1:
+            checkpoint = (period, checkpoint[1] + 1, max(checkpoint[2], checkpoint[1] + 1))
+        else:
+            checkpoint = (period, 1, max(checkpoint[2] if checkpoint is not None else 0, 1))
+        self._checkpoints[habit_id] = checkpoint
+        return checkpoint[1]
+
+    def add_habit(self, name, description, periodicity, category, creation_time, streak=0):
+        if name in self._ids:
+            raise ValueError("Habit %r already exists." % name)
+        self._insert_habit(self._next_id, name, description, periodicity, category, creation_time, streak)
+
+    def delete_habit(self, habit_name):
+        habit_id = self._ids.pop(habit_name, None)
+        if habit_id is not None:
+            del self._habits[habit_id]
+            del self._completions[habit_id]
+            self._checkpoints.pop(habit_id, None)
+
+    def remove_all_habits(self):
+        self._habits.clear()
+        self._ids.clear()
+        self._completions.clear()
+        self._checkpoints.clear()
+
+    def update_habit(self, habit_name, name, description, periodicity, category):
+        habit_id = self._ids.get(habit_name)
+        if habit_id is None:
+            return
+        if name != habit_name and name in self._ids:
+            raise ValueError("Habit %r already exists." % name)
+        del self._ids[habit_name]
+        self._ids[name] = habit_id
+        self._habits[habit_id].update(name=name, description=description, periodicity=periodicity,
+                                      category=category)
+        # The periods of the streak depend on the periodicity; habits without completions keep their streak
+        streak = self._rebuild_checkpoint(habit_id)
+        if streak:
+            self._habits[habit_id]["streak"] = streak
+
+    def get_habit_id(self, habit_name):
+        return self._ids.get(habit_name)
+
+    def habit_names(self):
+        return sorted(self._ids)
+
+    def habits_with_periodicity(self, periodicity):
+        return sorted(habit["name"] for habit in self._habits.values() if habit["periodicity"] == periodicity)
+
+    def habit_records(self):
+        habit_records = []
+        for habit_id in sorted(self._habits):
+            habit = self._habits[habit_id]
+            times = self._completions[habit_id]
+            habit_records.append(records.HabitRecord(habit_id, habit["name"], habit["description"],
+                                                     habit["periodicity"], habit["category"],
+                                                     habit["creation_time"], habit["streak"], len(times),
+                                                     times[-1] if times else None))
+        return habit_records
+
+    def get_streak(self, habit_name):
+        habit_id = self._ids.get(habit_name)
+        return self._habits[habit_id]["streak"] if habit_id is not None else None
+
+    def increment_streak(self, habit_name):
+        habit_id = self._ids.get(habit_name)
+        if habit_id is not None:
+            self._habits[habit_id]["streak"] += 1
+
+    def reset_streak(self, habit_name):
+        self.set_streak(habit_name, 0)
+
+    def set_streak(self, habit_name, streak):
+        habit_id = self._ids.get(habit_name)
+        if habit_id is not None:
+            self._habits[habit_id]["streak"] = streak
+
+    def mark_as_completed(self, habit_name, completion_time):
+        habit_id = self._ids.get(habit_name)
+        if habit_id is not None and completion_time is not None:
+            self._habits[habit_id]["streak"] = self._record_completion(habit_id, db.to_epoch(completion_time))
+
+    def mark_many_completed(self, completions):
+        inserted = 0
+        rejected = 0
+        for habit_name, completion_time in completions:
+            habit_id = self._ids.get(habit_name)
+            if habit_id is None or completion_time is None:
+                rejected += 1
+                continue
+            self._habits[habit_id]["streak"] = self._record_completion(habit_id, db.to_epoch(completion_time))
+            inserted += 1
+        return inserted, rejected
+
+    def completion_time(self, habit_name):
+        times = self._completions.get(self._ids.get(habit_name))
+        return times[0] if times else None
+
+    def completion_times(self, habit_name):
+        return list(self._completions.get(self._ids.get(habit_name), ()))
+
+    def current_streak(self, habit_name, now=None):
+        habit_id = self._ids.get(habit_name)
+        if habit_id is None:
+            return 0
+        # Like streaks.current_streak: the stored count, while the streak runs
+        habit = self._habits[habit_id]
+        checkpoint = self._checkpoints.get(habit_id)
+        if checkpoint is None:
+            return habit["streak"]
+        now_period = periods.period_index(time.time() if now is None else db.to_epoch(now), habit["periodicity"])
+        return habit["streak"] if checkpoint[0] >= now_period - 1 else 0
+
+    def longest_streak(self, habit_name):
+        checkpoint = self._checkpoints.get(self._ids.get(habit_name))
+        return checkpoint[2] if checkpoint is not None else 0
+
+    def longest_streak_overall(self):
+        return max((checkpoint[2] for checkpoint in self._checkpoints.values()), default=0)
+
+    def _completion_rate(self, habit_id, today):
+        # The same rules as analytics_module: days since creation, 7-day weeks and 30-day months
+        habit = self._habits[habit_id]
+        if habit["creation_time"] is None:
+            return 0.0
+        days = today - date.fromtimestamp(habit["creation_time"]).toordinal()
+        available = {"daily": days, "weekly": days // 7, "monthly": days // 30}.get(habit["periodicity"], 0)
+        return len(self._completions[habit_id]) / available if available >= 1 else 0.0
+
+    def completion_rates(self):
+        today = date.today().toordinal()
+        return {habit["name"]: self._completion_rate(habit_id, today) for habit_id, habit in self._habits.items()}
+
+    def completion_rate(self, habit_name):
+        habit_id = self._ids.get(habit_name)
+        return self._completion_rate(habit_id, date.today().toordinal()) if habit_id is not None else None
+
+    def completions_per_period(self, habit_name):
+        habit_id = self._ids.get(habit_name)
+        if habit_id is None:
+            return {}
+        periodicity = self._habits[habit_id]["periodicity"]
+        counts = Counter(periods.period_index(completion_time, periodicity)
+                         for completion_time in self._completions[habit_id])
+        return {periods.period_start(period, periodicity): count for period, count in sorted(counts.items())}
+
+
+class CachedBackend(StorageBackend):
+    """Backend answering reads from a MemoryBackend copy of a SQLite database and writing through to both.
+
+    Writes made to the database by anything else are not seen until reload()."""
+
+    def __init__(self, conn=None):
+        """
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection
+          (default is the current thread's shared connection to connection.DB_NAME).
+        """
+        self.store = SQLiteBackend(conn)
+        self.cache = MemoryBackend.load(self.store.conn)
+
+    def reload(self):
+        """Copy the database into memory again."""
+        self.cache = MemoryBackend.load(self.store.conn)
+
+    @contextmanager
+    def transaction(self):
+        outermost = not db.in_transaction(self.store.conn)
+        try:
+            with self.store.transaction():
+                yield self
+        except BaseException:
+            # The memory copy already holds the rolled back writes
+            if outermost:
+                self.reload()
+            raise
+
+    def add_habit(self, name, description, periodicity, category, creation_time, streak=0):
+        self.store.add_habit(name, description, periodicity, category, creation_time, streak)
+        self.cache._insert_habit(self.store.get_habit_id(name), name, description, periodicity, category,
+                                 creation_time, streak)
+
+    def delete_habit(self, habit_name):
+        self.store.delete_habit(habit_name)
+        self.cache.delete_habit(habit_name)
+
+    def remove_all_habits(self):
+        self.store.remove_all_habits()
+        self.cache.remove_all_habits()
+
+    def update_habit(self, habit_name, name, description, periodicity, category):
+        self.store.update_habit(habit_name, name, description, periodicity, category)
+        self.cache.update_habit(habit_name, name, description, periodicity, category)
+
+    def get_habit_id(self, habit_name):
+        return self.cache.get_habit_id(habit_name)
+
+    def habit_names(self):
+        return self.cache.habit_names()
+
+    def habits_with_periodicity(self, periodicity):
+        return self.cache.habits_with_periodicity(periodicity)
+
+    def habit_records(self):
+        return self.cache.habit_records()
+
+    def get_streak(self, habit_name):
+        return self.cache.get_streak(habit_name)
+
+    def increment_streak(self, habit_name):
+        self.store.increment_streak(habit_name)
+        self.cache.increment_streak(habit_name)
+
+    def reset_streak(self, habit_name):
+        self.store.reset_streak(habit_name)
+        self.cache.reset_streak(habit_name)
+
+    def set_streak(self, habit_name, streak):
+        self.store.set_streak(habit_name, streak)
+        self.cache.set_streak(habit_name, streak)
+
+    def mark_as_completed(self, habit_name, completion_time):
+        self.store.mark_as_completed(habit_name, completion_time)
+        self.cache.mark_as_completed(habit_name, completion_time)
+
+    def mark_many_completed(self, completions):
+        completions = list(completions)
+        result = self.store.mark_many_completed(completions)
+        self.cache.mark_many_completed(completions)
+        return result
+
+    def completion_time(self, habit_name):
+        return self.cache.completion_time(habit_name)
+
+    def completion_times(self, habit_name):
+        return self.cache.completion_times(habit_name)
+
+    def current_streak(self, habit_name, now=None):
+        return self.cache.current_streak(habit_name, now)
+
+    def longest_streak(self, habit_name):
+        return self.cache.longest_streak(habit_name)
+
+    def longest_streak_overall(self):
+        return self.cache.longest_streak_overall()
+
+    def completion_rates(self):
+        return self.cache.completion_rates()
+
+    def completion_rate(self, habit_name):
+        return self.cache.completion_rate(habit_name)
+
+    def completions_per_period(self, habit_name):
+        return self.cache.completions_per_period(habit_name)
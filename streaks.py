@@ -0,0 +1,314 @@
+import time
+from itertools import groupby
+import periods
+
+"""Streaks derived from habit_logs.
+
+Every habit has a checkpoint in habit_streaks with the last completed period,
+the length of the run ending there and the longest run so far, and every run of
+consecutive periods is kept in streak_runs. Completions in the last period or
+later ones update both without reading the logs; completions recorded out of
+order trigger a rebuild, which is a single ordered scan of the habit's logs. A streak breaks as
+soon as a whole period passes without a completion."""
+
+
+def _runs(period_numbers):
+    """
+        Split an ordered sequence of periods into runs of consecutive periods.
+
+        Parameters:
+        - period_numbers (iterable): Period numbers in ascending order.
+
+        Returns:
+        list: (start period, end period, length) tuples in order.
+        """
+    runs = []
+    for period in period_numbers:
+        if runs and period == runs[-1][1]:
+            continue
+        if runs and period == runs[-1][1] + 1:
+            start, _, length = runs[-1]
+            runs[-1] = (start, period, length + 1)
+        else:
+            runs.append((period, period, 1))
+    return runs
+
+
+def _checkpoint(runs):
+    """
+        Summarize the runs of a habit as its checkpoint.
+
+        Parameters:
+        - runs (list): (start period, end period, length) tuples in order.
+
+        Returns:
+        tuple: The last period, the length of the run ending there and the longest run,
+        or None if there are no runs.
+        """
+    if not runs:
+        return None
+    return runs[-1][1], runs[-1][2], max(length for _, _, length in runs)
+
+
+def _save_checkpoint(conn, habit_id, checkpoint):
+    """
+        Store the checkpoint of a habit, or remove it when there is none.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+        - checkpoint (tuple): (last period, current length, longest length) or None.
+        """
+    cursor = conn.cursor()
+    if checkpoint is None:
+        cursor.execute('DELETE FROM habit_streaks WHERE habit_id=?', (habit_id,))
+    else:
+        cursor.execute('INSERT OR REPLACE INTO habit_streaks (habit_id, last_period, current_length, longest_length) '
+                       'VALUES (?, ?, ?, ?)', (habit_id,) + tuple(checkpoint))
+
+
+def record_completion(conn, habit_id, completion_time):
+    """
+        Update the streak checkpoint of a habit for a new completion.
+        The caller is responsible for committing.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+        - completion_time (int): The completion time as UTC epoch seconds.
+
+        Returns:
+        int: The length of the run ending at the habit's last completed period.
+        """
+    return record_completions(conn, habit_id, [completion_time])
+
+
+def record_completions(conn, habit_id, completion_times):
+    """
+        Update the streak runs and checkpoint of a habit for new completions, without reading its logs.
+        Only completions before the habit's last completed period trigger a rebuild.
+        The caller is responsible for committing.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+        - completion_times (iterable): The completion times as UTC epoch seconds, in any order.
+
+        Returns:
+        int: The length of the run ending at the habit's last completed period.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT h.periodicity, s.last_period, s.current_length, s.longest_length '
+                   'FROM habits h LEFT JOIN habit_streaks s ON s.habit_id = h.id WHERE h.id=?', (habit_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    periodicity, last_period, length, longest = row
+    runs = _runs(sorted(periods.period_index(completion_time, periodicity) for completion_time in completion_times))
+    if not runs:
+        return length or 0
+    if last_period is not None and runs[0][0] < last_period:
+        return rebuild_streak(conn, habit_id)
+
+    if last_period is not None and runs[0][0] <= last_period + 1:
+        # The first new run continues the run ending at the last completed period
+        end = runs[0][1]
+        current_start = last_period - length + 1
+        runs[0] = (current_start, end, end - current_start + 1)
+        if end != last_period:
+            cursor.execute('UPDATE streak_runs SET end_period=?, length=? WHERE habit_id=? AND end_period=?',
+                           (end, runs[0][2], habit_id, last_period))
+        new_runs = runs[1:]
+    else:
+        new_runs = runs
+    cursor.executemany('INSERT INTO streak_runs (habit_id, start_period, end_period, length) VALUES (?, ?, ?, ?)',
+                       [(habit_id,) + run for run in new_runs])
+
+    checkpoint = (runs[-1][1], runs[-1][2], max([longest or 0] + [run_length for _, _, run_length in runs]))
+    _save_checkpoint(conn, habit_id, checkpoint)
+    return checkpoint[1]
+
+
+def rebuild_streak(conn, habit_id):
+    """
+        Recompute the streak runs and checkpoint of a habit from its logs.
+        The caller is responsible for committing.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+
+        Returns:
+        int: The length of the run ending at the habit's last completed period.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT periodicity FROM habits WHERE id=?', (habit_id,))
+    row = cursor.fetchone()
+    periodicity = row[0] if row is not None else None
+    cursor.execute('SELECT completion_time FROM habit_logs WHERE habit_id=? ORDER BY completion_time', (habit_id,))
+    runs = _runs(periods.period_index(completion_time, periodicity) for completion_time, in cursor)
+
+    cursor.execute('DELETE FROM streak_runs WHERE habit_id=?', (habit_id,))
+    cursor.executemany('INSERT INTO streak_runs (habit_id, start_period, end_period, length) VALUES (?, ?, ?, ?)',
+                       [(habit_id,) + run for run in runs])
+    checkpoint = _checkpoint(runs)
+    _save_checkpoint(conn, habit_id, checkpoint)
+    return checkpoint[1] if checkpoint is not None else 0
+
+
+def rebuild_all(conn):
+    """
+        Recompute the streak runs and checkpoints of all habits in one ordered scan of habit_logs.
+        The caller is responsible for committing.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        int: The number of habits with a checkpoint.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT l.habit_id, h.periodicity, l.completion_time FROM habit_logs l '
+                   'JOIN habits h ON h.id = l.habit_id ORDER BY l.habit_id, l.completion_time')
+    runs = []
+    checkpoints = []
+    for habit_id, rows in groupby(cursor, key=lambda row: row[0]):
+        habit_runs = _runs(periods.period_index(completion_time, periodicity) for _, periodicity, completion_time in rows)
+        runs.extend((habit_id,) + run for run in habit_runs)
+        checkpoints.append((habit_id,) + _checkpoint(habit_runs))
+
+    cursor.execute('DELETE FROM streak_runs')
+    cursor.execute('DELETE FROM habit_streaks')
+    cursor.executemany('INSERT INTO streak_runs (habit_id, start_period, end_period, length) VALUES (?, ?, ?, ?)',
+                       runs)
+    cursor.executemany('INSERT INTO habit_streaks (habit_id, last_period, current_length, longest_length) '
+                       'VALUES (?, ?, ?, ?)', checkpoints)
+    return len(checkpoints)
+
+
+def current_streak(conn, habit_id, now=None):
+    """
+        Retrieve the current streak of a habit. The streak is still running if the
+        habit was completed in the current or the previous period. While it runs,
+        this is the stored streak count, so a manual change of the count shows
+        until the next completion counts the streak from the log again.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+        - now (int): The reference time as UTC epoch seconds (default is the current time).
+
+        Returns:
+        int: The current streak length.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT h.periodicity, s.last_period, h.streak '
+                   'FROM habits h LEFT JOIN habit_streaks s ON s.habit_id = h.id WHERE h.id=?', (habit_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    periodicity, last_period, streak = row
+    # A habit that was never completed only has its manual count
+    if last_period is None:
+        return streak
+    now_period = periods.period_index(time.time() if now is None else now, periodicity)
+    return streak if last_period >= now_period - 1 else 0
+
+
+def longest_streak(conn, habit_id):
+    """
+        Retrieve the longest streak a habit ever reached.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - habit_id (int): The id of the habit.
+
+        Returns:
+        int: The longest streak length.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT longest_length FROM habit_streaks WHERE habit_id=?', (habit_id,))
+    row = cursor.fetchone()
+    return row[0] if row is not None else 0
+
+
+def longest_streak_overall(conn):
+    """
+        Retrieve the longest streak reached by any habit.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+
+        Returns:
+        int: The longest streak length.
+        """
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(length) FROM streak_runs')
+    row = cursor.fetchone()
+    return row[0] if row[0] is not None else 0
+
+
+def top_runs(conn, limit=10, habit_id=None):
+    """
+        Retrieve the longest streak runs ever recorded.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - limit (int): The maximum number of runs.
+        - habit_id (int): Only return runs of this habit (default is all habits).
+
+        Returns:
+        list: (habit name, first day, first day of the last period, length) tuples, longest first.
+        """
+    query = ('SELECT h.name, h.periodicity, r.start_period, r.end_period, r.length '
+             'FROM streak_runs r JOIN habits h ON h.id = r.habit_id')
+    params = ()
+    if habit_id is not None:
+        query += ' WHERE r.habit_id = ?'
+        params = (habit_id,)
+    query += ' ORDER BY r.length DESC LIMIT ?'
+    cursor = conn.cursor()
+    cursor.execute(query, params + (limit,))
+    return [_describe_run(row) for row in cursor.fetchall()]
+
+
+def runs_active_between(conn, start_time, end_time):
+    """
+        Retrieve the streak runs that overlap a time range.
+
+        Parameters:
+        - conn (sqlite3.Connection): The SQLite database connection.
+        - start_time (int): The start of the range as UTC epoch seconds.
+        - end_time (int): The end of the range as UTC epoch seconds.
+
+        Returns:
+        list: (habit name, first day, first day of the last period, length) tuples, longest first.
+        """
+    # Period numbers are only comparable within one periodicity
+    bounds = {periodicity: (periods.period_index(start_time, periodicity), periods.period_index(end_time, periodicity))
+              for periodicity in periods.PERIODICITIES}
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT h.name, h.periodicity, r.start_period, r.end_period, r.length
+        FROM streak_runs r JOIN habits h ON h.id = r.habit_id
+        WHERE (h.periodicity = 'weekly' AND r.end_period >= ? AND r.start_period <= ?)
+           OR (h.periodicity = 'monthly' AND r.end_period >= ? AND r.start_period <= ?)
+           OR (COALESCE(h.periodicity, '') NOT IN ('weekly', 'monthly') AND r.end_period >= ? AND r.start_period <= ?)
+        ORDER BY r.length DESC
+    ''', bounds["weekly"] + bounds["monthly"] + bounds["daily"])
+    return [_describe_run(row) for row in cursor.fetchall()]
+
+
+def _describe_run(row):
+    """
+        Express a streak run row in days.
+
+        Parameters:
+        - row (tuple): (habit name, periodicity, start period, end period, length).
+
+        Returns:
+        tuple: (habit name, first day, first day of the last period, length).
+        """
+    name, periodicity, start_period, end_period, length = row
+    return (name, periods.period_start(start_period, periodicity),
+            periods.period_start(end_period, periodicity), length)
@@ -0,0 +1,339 @@
+import atexit
+import functools
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import connection
+
+"""Opt-in instrumentation of the db and analytics hot paths.
+
+enable() wraps the public functions of db and analytics_module and makes the
+connection manager hand out connections whose cursors time every SQL
+statement. For every function and statement it records the number of calls,
+the total time, p50/p95/p99 latencies, the rows returned and the commits
+issued. Connections opened before enable() are not traced.
+
+Set HABIT_TRACE=<file> to trace the CLI: a summary table is printed on exit
+and the measurements are dumped to the file as JSON."""
+
+MAX_SAMPLES = 10000
+
+_lock = threading.Lock()
+_local = threading.local()
+_functions = {}
+_statements = {}
+_originals = []
+_enabled = False
+
+
+class _Stats:
+    """Measurements of one function or SQL statement."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.rows = 0
+        self.commits = 0
+        self.samples = []
+
+    def add_call(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        # Reservoir sampling keeps the percentiles representative with bounded memory
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            index = random.randrange(self.calls)
+            if index < MAX_SAMPLES:
+                self.samples[index] = seconds
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "total_ms": self.total * 1000,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "rows": self.rows,
+            "commits": self.commits,
+        }
+
+
+def _stats(table, key):
+    stats = table.get(key)
+    if stats is None:
+        stats = table[key] = _Stats()
+    return stats
+
+
+def record_call(table, key, seconds):
+    """
+        Add the duration of a call to the measurements of a key, for callers keeping their own tables
+        (e.g. the routes of server.py). The caller serializes the calls on one table.
+
+        Parameters:
+        - table (dict): Maps the keys to their measurements; missing keys are added.
+        - key (str): The name of the measured function, statement or route.
+        - seconds (float): The duration of the call.
+
+        Returns:
+        The measurements of the key; as_dict() summarizes them.
+        """
+    stats = _stats(table, key)
+    stats.add_call(seconds)
+    return stats
+
+
+def _active_functions():
+    """The traced functions running in this thread, outermost first."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _normalize(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times its statements and counts the rows they return."""
+
+    statement = None
+
+    def _record(self, sql, start):
+        self.statement = _normalize(sql)
+        with _lock:
+            _stats(_statements, self.statement).add_call(time.perf_counter() - start)
+
+    def _count_rows(self, count, start):
+        if not count or self.statement is None:
+            return
+        with _lock:
+            stats = _statements[self.statement]
+            stats.rows += count
+            stats.total += time.perf_counter() - start
+            for name in _active_functions():
+                _functions[name].rows += count
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(sql, start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._count_rows(row is not None, start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count_rows(len(rows), start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._count_rows(len(rows), start)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        self._count_rows(1, start)
+        return row
+
+
+class TracedConnection(connection.Connection):
+    """Connection whose cursors are traced and whose commits are counted."""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TracedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        super().commit()
+        with _lock:
+            _stats(_statements, "COMMIT").add_call(time.perf_counter() - start)
+            _statements["COMMIT"].commits += 1
+            for name in _active_functions():
+                _functions[name].commits += 1
+
+
+def _wrap(name, function):
+    """
+        Wrap a function so its calls are measured.
+
+        Parameters:
+        - name (str): The name the function is reported under.
+        - function (callable): The function to wrap.
+
+        Returns:
+        callable: The traced function.
+        """
+    @functools.wraps(function)
+    def traced(*args, **kwargs):
+        stack = _active_functions()
+        with _lock:
+            _stats(_functions, name)
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with _lock:
+                _functions[name].add_call(elapsed)
+    traced.__traced__ = function
+    return traced
+
+
+def enable(modules=None):
+    """
+        Start tracing the db and analytics_module functions and new connections.
+
+        Parameters:
+        - modules (list): The modules whose public functions are traced (default is db and analytics_module).
+        """
+    global _enabled
+    if _enabled:
+        return
+    _enabled = True
+    if modules is None:
+        import analytics_module
+        import db
+        modules = [db, analytics_module]
+
+    originals = {}
+    for module in modules:
+        for name, function in list(vars(module).items()):
+            if name.startswith("_") or not callable(function) or getattr(function, "__module__", None) != module.__name__:
+                continue
+            traced = _wrap("%s.%s" % (module.__name__, name), function)
+            originals[id(function)] = (function, traced)
+            _originals.append((module, name, function))
+            setattr(module, name, traced)
+
+    # Modules that imported the functions by name (e.g. from analytics_module import *) call the traced versions too
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, "__dict__", None)
+        if namespace is None or module in modules:
+            continue
+        for name, value in list(namespace.items()):
+            if callable(value) and id(value) in originals and originals[id(value)][0] is value:
+                _originals.append((module, name, value))
+                namespace[name] = originals[id(value)][1]
+
+    connection.CONNECTION_CLASS = TracedConnection
+
+
+def disable():
+    """Stop tracing and restore the original functions. Traced connections stay traced."""
+    global _enabled
+    while _originals:
+        module, name, function = _originals.pop()
+        setattr(module, name, function)
+    connection.CONNECTION_CLASS = connection.Connection
+    _enabled = False
+
+
+def reset():
+    """Forget all measurements."""
+    with _lock:
+        _functions.clear()
+        _statements.clear()
+
+
+def snapshot():
+    """
+        Retrieve the measurements taken so far.
+
+        Returns:
+        dict: Per-function and per-statement measurements.
+        """
+    with _lock:
+        return {
+            "functions": {name: stats.as_dict() for name, stats in _functions.items()},
+            "statements": {sql: stats.as_dict() for sql, stats in _statements.items()},
+        }
+
+
+def dump(path):
+    """
+        Write the measurements to a JSON file.
+
+        Parameters:
+        - path (str): The file to write.
+        """
+    with open(path, "w") as output:
+        json.dump(snapshot(), output, indent=2)
+
+
+def report(file=None, limit=15):
+    """
+        Print the measurements as tables, slowest total time first.
+
+        Parameters:
+        - file (file): Where to print (default is standard error).
+        - limit (int): The maximum number of statements listed.
+        """
+    file = sys.stderr if file is None else file
+    data = snapshot()
+    header = "%-58s %7s %10s %9s %9s %9s %8s %7s" % ("", "calls", "total ms", "p50 ms", "p95 ms", "p99 ms",
+                                                    "rows", "commits")
+    for title, table, count in (("Functions", data["functions"], None), ("SQL statements", data["statements"], limit)):
+        rows = sorted(table.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:count]
+        print("\n" + title, file=file)
+        print(header, file=file)
+        for name, stats in rows:
+            label = name if len(name) <= 58 else name[:55] + "..."
+            print("%-58s %7d %10.2f %9.3f %9.3f %9.3f %8d %7d" % (
+                label, stats["calls"], stats["total_ms"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"],
+                stats["rows"], stats["commits"]), file=file)
+
+
+def _at_exit(dump_path):
+    if not _functions and not _statements:
+        return
+    report()
+    dump(dump_path)
+
+
+def enable_from_environment():
+    """
+        Enable tracing when the HABIT_TRACE environment variable names a dump file.
+        The summary is printed and the file written when the process exits.
+        """
+    dump_path = os.environ.get("HABIT_TRACE")
+    if dump_path and not _enabled:
+        enable()
+        atexit.register(_at_exit, dump_path)
@@ -1,10 +1,15 @@
 import unittest
+from datetime import datetime, timedelta
 from analytics_module import *
+import connection
+
+# An in-memory database shared by the tests of this module, instead of the user's database
+TEST_DB = "file:analytical_unittest?mode=memory&cache=shared"
 
 
 class TestAnalyticalModule(unittest.TestCase):
     def setUp(self):
-        self.db_conn = db.connect_database()
+        self.db_conn = connection.get_connection(TEST_DB)
         db.create_tables(self.db_conn)
 
     def test_calculate_completion_rate(self):
@@ -21,6 +26,18 @@ class TestAnalyticalModule(unittest.TestCase):
         completion_rates = calculate_completion_rate(self.db_conn)
         self.assertEqual(completion_rates["Exercise1"], 0)
 
+    def test_calculate_completion_rate_over_elapsed_periods(self):
+        # Test the rate for a habit created ten days ago and completed five times, in a database of its own
+        db_conn = connection.open_connection(":memory:")
+        db.add_habit(db_conn, "Stretching", "Daily stretching", "daily", "Health",
+                     datetime.now() - timedelta(days=10), 0)
+        for _ in range(5):
+            db.mark_as_completed(db_conn, "Stretching", datetime.now())
+
+        completion_rates = calculate_completion_rate(db_conn)
+        self.assertAlmostEqual(completion_rates["Stretching"], 0.5)
+        db_conn.close()
+
     def test_find_habit_with_lowest_completion_rate(self):
         # Test finding the habit with the lowest completion rate
         db.add_habit(self.db_conn, "UniqueHabit1", "Daily exercise", "daily", "Health", datetime.now(), 0)
@@ -34,18 +51,24 @@ class TestAnalyticalModule(unittest.TestCase):
         self.assertEqual(lowest_rate, 0)
 
     def test_find_longest_streak_for_habit(self):
-        # Test finding the longest streak for a specific habit
-        db.add_habit(self.db_conn, "UniqueHabit3", "Daily exercise", "daily", "Health", datetime.now(), 5)
+        # Test finding the longest streak for a specific habit, derived from its completions
+        db.add_habit(self.db_conn, "UniqueHabit3", "Daily exercise", "daily", "Health",
+                     datetime.now() - timedelta(days=10), 0)
+        for day in (9, 8, 7, 6, 5, 1):
+            db.mark_as_completed(self.db_conn, "UniqueHabit3", datetime.now() - timedelta(days=day))
 
         longest_streak = find_longest_streak_for_habit(self.db_conn, "UniqueHabit3")
         self.assertEqual(longest_streak, 5)
 
     def test_find_longest_streak_overall(self):
         # Test finding the longest streak overall
-        db.add_habit(self.db_conn, "UniqueHabit4", "Daily exercise", "daily", "Health", datetime.now(), 5)
+        db.add_habit(self.db_conn, "UniqueHabit4", "Daily exercise", "daily", "Health",
+                     datetime.now() - timedelta(days=10), 0)
+        for day in range(6):
+            db.mark_as_completed(self.db_conn, "UniqueHabit4", datetime.now() - timedelta(days=day))
 
         longest_streak = find_longest_streak_overall(self.db_conn)
-        self.assertEqual(longest_streak, 5)
+        self.assertEqual(longest_streak, 6)
 
     def test_get_all_tracked_habits(self):
         # Test getting all tracked habits
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import analytics_cache
+import analytics_module
+import connection
+import db
+
+
+class TestAnalyticsCacheModule(unittest.TestCase):
+    def setUp(self):
+        # Use a temporary database file so other connections can write to it
+        handle, self.database = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.db_conn = connection.open_connection(self.database)
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now() - timedelta(days=10), 0)
+        analytics_cache.clear()
+        analytics_cache.reset_stats()
+
+    def tearDown(self):
+        self.db_conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.database + suffix):
+                os.remove(self.database + suffix)
+
+    def test_hit_and_invalidation_by_db_writes(self):
+        # Test that repeated calls hit the cache until a db mutator commits
+        self.assertEqual(analytics_module.calculate_completion_rate(self.db_conn), {"Run": 0.0})
+        self.assertEqual(analytics_module.calculate_completion_rate(self.db_conn), {"Run": 0.0})
+        self.assertEqual(analytics_cache.cache_info()["hits"], 1)
+
+        db.mark_as_completed(self.db_conn, "Run", datetime.now())
+        self.assertAlmostEqual(analytics_module.calculate_completion_rate(self.db_conn)["Run"], 0.1)
+        info = analytics_cache.cache_info()
+        self.assertEqual((info["hits"], info["misses"]), (1, 2))
+
+    def test_shared_rates(self):
+        # Test that the lowest rate and the habits needing improvement reuse the cached rates
+        analytics_module.calculate_completion_rate(self.db_conn)
+        self.assertEqual(analytics_module.find_habit_with_lowest_completion_rate(self.db_conn), ("Run", 0.0))
+        self.assertEqual(analytics_module.identify_habits_needing_improvement(self.db_conn), [("Run", 0.0)])
+        self.assertEqual(analytics_cache.cache_info()["hits"], 2)
+
+    def test_writes_by_other_connections(self):
+        # Test that PRAGMA data_version reveals writes made outside db on another connection
+        self.assertEqual(analytics_module.get_all_tracked_habits(self.db_conn), ["Run"])
+        other_conn = connection.open_connection(self.database)
+        other_conn.execute("INSERT INTO habits (name, periodicity, creation_time) VALUES ('Read', 'daily', 0)")
+        other_conn.commit()
+        other_conn.close()
+        self.assertEqual(sorted(analytics_module.get_all_tracked_habits(self.db_conn)), ["Read", "Run"])
+
+    def test_bypass_inside_transaction(self):
+        # Test that uncommitted writes are never cached
+        with db.transaction(self.db_conn):
+            db.mark_as_completed(self.db_conn, "Run", datetime.now())
+            self.assertAlmostEqual(analytics_module.calculate_completion_rate(self.db_conn)["Run"], 0.1)
+        self.assertEqual(analytics_cache.cache_info()["bypassed"], 1)
+        self.assertEqual(analytics_cache.cache_info()["size"], 0)
+
+    def test_lru_eviction(self):
+        # Test that the least recently used result is evicted when the cache is full
+        max_entries = analytics_cache.MAX_ENTRIES
+        analytics_cache.MAX_ENTRIES = 2
+        try:
+            analytics_module.habits_by_periodicity(self.db_conn, "daily")
+            analytics_module.habits_by_periodicity(self.db_conn, "weekly")
+            analytics_module.habits_by_periodicity(self.db_conn, "daily")
+            analytics_module.habits_by_periodicity(self.db_conn, "monthly")
+            info = analytics_cache.cache_info()
+            self.assertEqual((info["size"], info["evictions"]), (2, 1))
+            analytics_module.habits_by_periodicity(self.db_conn, "daily")
+            self.assertEqual(analytics_cache.cache_info()["hits"], 2)
+        finally:
+            analytics_cache.MAX_ENTRIES = max_entries
+
+
+if __name__ == '__main__':
+    unittest.main()
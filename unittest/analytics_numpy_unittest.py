@@ -0,0 +1,63 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+import analytics_module
+import analytics_numpy
+import connection
+import db
+
+
+class TestAnalyticsNumpyModule(unittest.TestCase):
+    def setUp(self):
+        # Fill a private in-memory database with reproducible random completions
+        self.db_conn = connection.open_connection(":memory:")
+        generator = random.Random(7)
+        now = datetime.now()
+        for number in range(12):
+            name = "Habit%d" % number
+            periodicity = ("daily", "weekly", "monthly")[number % 3]
+            db.add_habit(self.db_conn, name, "", periodicity, "Test", now - timedelta(days=400), 0)
+            days = sorted(generator.sample(range(400), generator.randint(0, 120)))
+            db.mark_many_completed(self.db_conn, [(name, now - timedelta(days=day, hours=generator.randint(0, 5)))
+                                                  for day in days])
+
+    def tearDown(self):
+        self.db_conn.close()
+
+    def test_calculate_completion_rate(self):
+        # Test that the backend computes the same rates as the SQL engine
+        expected = analytics_module.calculate_completion_rate(self.db_conn)
+        rates = analytics_numpy.calculate_completion_rate(self.db_conn)
+        self.assertEqual(rates.keys(), expected.keys())
+        for name, rate in expected.items():
+            self.assertAlmostEqual(rates[name], rate)
+
+    def test_find_longest_streaks(self):
+        # Test that the backend finds the same streaks as the streak engine
+        self.assertEqual(analytics_numpy.find_longest_streak_overall(self.db_conn),
+                         analytics_module.find_longest_streak_overall(self.db_conn))
+        for number in range(12):
+            name = "Habit%d" % number
+            self.assertEqual(analytics_numpy.find_longest_streak_for_habit(self.db_conn, name),
+                             analytics_module.find_longest_streak_for_habit(self.db_conn, name))
+
+    def test_completions_per_period(self):
+        # Test that the per-period counts add up to the completions of the habit
+        counts = analytics_numpy.completions_per_period(self.db_conn, "Habit1")
+        total = self.db_conn.execute("SELECT COUNT(*) FROM habit_logs WHERE habit_id=?",
+                                     (db.get_habit_id(self.db_conn, "Habit1"),)).fetchone()[0]
+        self.assertEqual(sum(counts.values()), total)
+        self.assertEqual(list(counts), sorted(counts))
+        self.assertTrue(all(day.weekday() == 0 for day in counts))
+
+    def test_find_longest_gaps(self):
+        # Test the longest gap of a habit with known completions
+        db.add_habit(self.db_conn, "Gaps", "", "daily", "Test", datetime.now() - timedelta(days=30), 0)
+        db.mark_many_completed(self.db_conn, [("Gaps", datetime.now() - timedelta(days=day)) for day in (20, 19, 12, 2)])
+        gaps = analytics_numpy.find_longest_gaps(self.db_conn)
+        self.assertEqual(gaps["Gaps"], 9)
+        self.assertEqual(len(gaps), 13)
+
+
+if __name__ == '__main__':
+    unittest.main()
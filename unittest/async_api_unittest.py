@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+import async_api
+import connection
+import db
+
+
+class TestAsyncApiModule(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.database = connection.temporary_database()
+        self.db_conn = connection.open_connection(self.database)
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now() - timedelta(days=4), 0)
+        self.tracker = async_api.AsyncHabitTracker(self.database, readers=3)
+
+    async def asyncTearDown(self):
+        await self.tracker.close()
+
+    def tearDown(self):
+        self.db_conn.close()
+        connection.remove_database(self.database)
+
+    async def test_writes(self):
+        # Test the writes, including failing ones committed in the same batch as others
+        await self.tracker.add_habit("Read", "Reading weekly", "weekly", "Hobby")
+        today = datetime.now()
+        # Completions two and three days ago are a broken streak by now
+        results = await asyncio.gather(self.tracker.complete("Run", today - timedelta(days=3)),
+                                       self.tracker.complete("Swim"),
+                                       self.tracker.add_habit("Read"),
+                                       self.tracker.complete("Run", today - timedelta(days=2)),
+                                       return_exceptions=True)
+        self.assertEqual(results[0], 0)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertIsInstance(results[2], ValueError)
+        self.assertEqual(results[3], 0)
+        self.assertEqual(await self.tracker.complete("Run", today - timedelta(days=1)), 3)
+        self.assertEqual(await self.tracker.complete("Run", today), 4)
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, "Run"), 4)
+
+        await self.tracker.set_streak("Run", 7)
+        self.assertEqual(await self.tracker.streak("Run"), 7)
+        await self.tracker.update_habit("Read", "Read books", "Reading", "weekly", "Hobby")
+        await self.tracker.delete_habit("Read books")
+        self.assertEqual(await self.tracker.habit_names(), ["Run"])
+        with self.assertRaises(ValueError):
+            await self.tracker.delete_habit("Read books")
+
+    async def test_concurrent_completions(self):
+        # Test that many writes sent at once are all committed
+        await asyncio.gather(*[self.tracker.complete("Run") for _ in range(250)])
+        self.assertEqual(self.db_conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0], 250)
+
+    async def test_memory_database(self):
+        # Test that a private in-memory database is refused and a shared one is seen by every thread
+        with self.assertRaises(ValueError):
+            async_api.AsyncHabitTracker(":memory:")
+        database = "file:async-api-test?mode=memory&cache=shared"
+        # The shared database lives as long as a connection to it is open
+        anchor = connection.open_connection(database)
+        async with async_api.AsyncHabitTracker(database, readers=2) as tracker:
+            await tracker.add_habit("Swim", "Swimming weekly", "weekly", "Fitness")
+            self.assertEqual(await tracker.habit_names(), ["Swim"])
+        anchor.close()
+
+    async def test_reads(self):
+        # Test the analytics reads, gathered on the reader threads
+        await self.tracker.complete("Run", datetime.now())
+        self.assertEqual(await self.tracker.completion_rates(), {"Run": 0.25})
+        self.assertEqual(await self.tracker.completion_rate("Swim"), None)
+        self.assertEqual(await self.tracker.longest_streak("Run"), 1)
+        with self.assertRaises(ValueError):
+            await self.tracker.longest_streak("Swim")
+        self.assertEqual(list((await self.tracker.completions_per_period("Run")).values()), [1])
+        records, next_token = await self.tracker.habit_page(page_size=10)
+        self.assertEqual(([record.name for record in records], next_token), (["Run"], None))
+        self.assertEqual(await self.tracker.summary(threshold=0.5),
+                         {"habits": ["Run"], "completion_rates": {"Run": 0.25},
+                          "lowest_completion_rate": ("Run", 0.25),
+                          "needing_improvement": [("Run", 0.25)], "longest_streak": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
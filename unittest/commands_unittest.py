@@ -0,0 +1,70 @@
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import unittest
+from datetime import datetime, timedelta
+import commands
+import connection
+import db
+
+# An in-memory database shared by the commands run in this process
+TEST_DB = "file:commands_unittest?mode=memory&cache=shared"
+
+
+class TestCommandsModule(unittest.TestCase):
+    def setUp(self):
+        # Keep one connection open so the shared in-memory database outlives the commands
+        self.db_conn = connection.open_connection(TEST_DB)
+        db.remove_all_habits(self.db_conn)
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now() - timedelta(days=4), 0)
+        db.add_habit(self.db_conn, "Read", "Reading weekly", "weekly", "Hobby", datetime.now(), 0)
+
+    def tearDown(self):
+        self.db_conn.close()
+
+    def run_command(self, *arguments):
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--database")
+        commands.add_parsers(parser.add_subparsers(dest="command"))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            status = commands.run(parser.parse_args(["--database", TEST_DB] + list(arguments)))
+        return status, output.getvalue()
+
+    def test_complete(self):
+        # Test completing a known and an unknown habit
+        yesterday = (datetime.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.run_command("complete", "Run", "--time", yesterday), (0, "Streak for habit 'Run' is now 1.\n"))
+        status, output = self.run_command("complete", "Run", "--json")
+        self.assertEqual((status, json.loads(output)), (0, {"habit": "Run", "streak": 2}))
+        self.assertEqual(self.run_command("complete", "Swim"), (1, ""))
+        # A bad time is a usage error, not a traceback
+        with self.assertRaises(SystemExit) as exit_info:
+            self.run_command("complete", "Run", "--time", "2026-13-01")
+        self.assertEqual(exit_info.exception.code, 2)
+
+    def test_analytics(self):
+        # Test the rates, longest streak and list commands
+        db.mark_as_completed(self.db_conn, "Run", datetime.now())
+        status, output = self.run_command("rates", "--json")
+        self.assertEqual((status, json.loads(output)), (0, {"Run": 0.25, "Read": 0}))
+        self.assertEqual(self.run_command("rates", "--habit", "Run"), (0, "Run: 25.00%\n"))
+        self.assertEqual(self.run_command("longest-streak"), (0, "1\n"))
+        self.assertEqual(self.run_command("longest-streak", "Swim")[0], 1)
+        self.assertEqual(self.run_command("list"), (0, "Read\nRun\n"))
+        self.assertEqual(self.run_command("list", "--periodicity", "weekly", "--json"), (0, '["Read"]\n'))
+
+    def test_lazy_imports(self):
+        # Test that importing main loads neither the menus nor the database modules
+        script = ("import sys; sys.path.insert(0, %r); import main; "
+                  "print(sorted(name for name in ('questionary', 'analytics_module', 'db', 'habit') if name in sys.modules))"
+                  % connection.__file__.rsplit("connection.py", 1)[0])
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+import analytics_module
+import completion_buffer
+import connection
+import db
+
+
+class TestCompletionBufferModule(unittest.TestCase):
+    def setUp(self):
+        # Use a temporary database file so the shared connections are isolated
+        handle, self.database = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.db_conn = connection.get_connection(self.database)
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now() - timedelta(days=10), 0)
+
+    def tearDown(self):
+        completion_buffer.stop()
+        connection.close_connection(self.database)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.database + suffix):
+                os.remove(self.database + suffix)
+
+    def count_logs(self):
+        # Count the written logs without going through the read barrier
+        return self.db_conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0]
+
+    def test_flush_on_size(self):
+        # Test that completions are queued until the queue is full, then written together
+        buffer = completion_buffer.CompletionBuffer(self.database, max_size=3, max_delay=60, background=False)
+        buffer.add("Run", datetime.now() - timedelta(days=2))
+        buffer.add("Run", datetime.now() - timedelta(days=1))
+        self.assertEqual(buffer.pending(), 2)
+        self.assertEqual(self.count_logs(), 0)
+
+        buffer.add("Run", datetime.now())
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(self.count_logs(), 3)
+        stats = buffer.stats()
+        self.assertEqual((stats["flushes"], stats["flushed"], stats["max_depth"]), (1, 3, 3))
+        self.assertGreater(stats["max_flush_ms"], 0)
+
+    def test_flush_on_time(self):
+        # Test that the background thread writes completions once they have waited max_delay
+        buffer = completion_buffer.CompletionBuffer(self.database, max_size=100, max_delay=0.05)
+        buffer.add("Run", datetime.now())
+        deadline = time.monotonic() + 5
+        while buffer.stats()["flushes"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        buffer.close()
+        self.assertEqual(self.count_logs(), 1)
+
+    def test_reads_see_pending_completions(self):
+        # Test that reads through db and analytics flush the active buffer first
+        buffer = completion_buffer.start(self.database, max_size=100, max_delay=60, background=False)
+        buffer.add("Run", datetime.now() - timedelta(days=1))
+        buffer.add("Run", datetime.now())
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, "Run"), 2)
+        self.assertEqual(buffer.pending(), 0)
+
+        buffer.add("Run", datetime.now() - timedelta(days=2))
+        self.assertEqual(analytics_module.find_longest_streak_for_habit(self.db_conn, "Run"), 3)
+
+    def test_stop_writes_remaining_completions(self):
+        # Test that stopping the buffer writes the queue and reports its statistics
+        buffer = completion_buffer.start(self.database, max_size=100, max_delay=60)
+        self.assertIs(completion_buffer.active(self.database), buffer)
+        buffer.add("Run", datetime.now())
+        buffer.add("Unknown", datetime.now())
+        stats = completion_buffer.stop()
+        self.assertIsNone(completion_buffer.active(self.database))
+        self.assertEqual((stats["flushed"], stats["rejected"], stats["depth"]), (1, 1, 0))
+        self.assertEqual(self.count_logs(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import threading
+import unittest
+import connection
+import migrations
+
+
+class TestConnectionModule(unittest.TestCase):
+    def setUp(self):
+        # Use a temporary database file so the shared connections are isolated
+        handle, self.database = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+
+    def tearDown(self):
+        connection.close_connection(self.database)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.database + suffix):
+                os.remove(self.database + suffix)
+
+    def test_get_connection_is_shared(self):
+        # Test that the same thread always gets the same connection
+        conn = connection.get_connection(self.database)
+        self.assertIs(connection.get_connection(self.database), conn)
+
+    def test_get_connection_per_thread(self):
+        # Test that other threads get their own connection
+        conn = connection.get_connection(self.database)
+        other = []
+
+        def worker():
+            other.append(connection.get_connection(self.database))
+            connection.close_all()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+    def test_connection_settings(self):
+        # Test that connections are configured and the schema is in place
+        conn = connection.get_connection(self.database)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+        self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        self.assertEqual(migrations.get_schema_version(conn), migrations.SCHEMA_VERSION)
+
+    def test_close_connection(self):
+        # Test that a closed shared connection is replaced on the next request
+        conn = connection.get_connection(self.database)
+        connection.close_connection(self.database)
+        self.assertIsNot(connection.get_connection(self.database), conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
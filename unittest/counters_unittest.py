@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime, timedelta
+import analytics_module
+import connection
+import counters
+import db
+import periods
+
+
+class TestCountersModule(unittest.TestCase):
+    def setUp(self):
+        # Use a private in-memory database for every test
+        self.db_conn = connection.open_connection(":memory:")
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now() - timedelta(days=30), 0)
+        self.times = [int(datetime(2024, 3, day, 9).timestamp()) for day in (10, 4, 20, 12)]
+
+    def tearDown(self):
+        self.db_conn.close()
+
+    def counters_of(self, habit_name):
+        return self.db_conn.execute("SELECT total_completions, first_completion, last_completion, last_period_key "
+                                    "FROM habits WHERE name=?", (habit_name,)).fetchone()
+
+    def test_counters_follow_completions(self):
+        # Test that completions recorded out of order keep the first and last completion right
+        for completion_time in self.times:
+            db.mark_as_completed(self.db_conn, "Run", completion_time)
+        self.assertEqual(self.counters_of("Run"),
+                         (4, min(self.times), max(self.times), periods.period_index(max(self.times), "daily")))
+
+    def test_counters_follow_deletes(self):
+        # Test that deleting a middle, the last and finally every completion updates the counters
+        for completion_time in self.times:
+            db.mark_as_completed(self.db_conn, "Run", completion_time)
+        self.db_conn.execute("DELETE FROM habit_logs WHERE completion_time=?", (self.times[3],))
+        self.assertEqual(self.counters_of("Run"), (3, self.times[1], self.times[2],
+                                                   periods.period_index(self.times[2], "daily")))
+        self.db_conn.execute("DELETE FROM habit_logs WHERE completion_time=?", (self.times[2],))
+        self.assertEqual(self.counters_of("Run"), (2, self.times[1], self.times[0],
+                                                   periods.period_index(self.times[0], "daily")))
+        self.db_conn.execute("DELETE FROM habit_logs WHERE completion_time=?", (self.times[1],))
+        self.assertEqual(self.counters_of("Run"), (1, self.times[0], self.times[0],
+                                                   periods.period_index(self.times[0], "daily")))
+        self.db_conn.execute("DELETE FROM habit_logs")
+        self.assertEqual(self.counters_of("Run"), (0, None, None, None))
+
+    def test_delete_habit_with_logs(self):
+        # Test that deleting a habit removes its logs and leaves the counters of other habits alone
+        db.add_habit(self.db_conn, "Read", "Reading monthly", "monthly", "Hobby", datetime.now(), 0)
+        db.mark_many_completed(self.db_conn, [("Run", time) for time in self.times] + [("Read", self.times[0])])
+        db.delete_habit(self.db_conn, "Run")
+        self.assertEqual(self.db_conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0], 1)
+        self.assertEqual(self.counters_of("Read")[0], 1)
+        db.remove_all_habits(self.db_conn)
+        self.assertEqual(self.db_conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0], 0)
+
+    def test_periodicity_change(self):
+        # Test that the period of the last completion follows the periodicity of the habit
+        db.mark_as_completed(self.db_conn, "Run", self.times[2])
+        db.update_habit(self.db_conn, "Run", "Run", "Running weekly", "weekly", "Fitness")
+        self.assertEqual(self.counters_of("Run")[3], periods.period_index(self.times[2], "weekly"))
+
+    def test_rebuild_matches_triggers(self):
+        # Test that recomputing the counters from habit_logs gives the maintained values
+        db.add_habit(self.db_conn, "Read", "Reading monthly", "monthly", "Hobby", datetime.now(), 0)
+        db.mark_many_completed(self.db_conn, [("Run", time) for time in self.times] + [("Read", self.times[0])])
+        maintained = self.db_conn.execute("SELECT * FROM habits ORDER BY id").fetchall()
+        self.db_conn.execute("UPDATE habits SET total_completions=0, first_completion=NULL, last_completion=NULL")
+        counters.rebuild(self.db_conn)
+        self.assertEqual(self.db_conn.execute("SELECT * FROM habits ORDER BY id").fetchall(), maintained)
+
+    def test_completion_rate_for_habit(self):
+        # Test the single-habit lookup against the rates of all habits
+        for day in range(3):
+            db.mark_as_completed(self.db_conn, "Run", datetime.now() - timedelta(days=day))
+        rate = analytics_module.calculate_completion_rate_for_habit(self.db_conn, "Run")
+        self.assertAlmostEqual(rate, 3 / 30)
+        self.assertEqual(rate, analytics_module.calculate_completion_rate(self.db_conn)["Run"])
+        self.assertIsNone(analytics_module.calculate_completion_rate_for_habit(self.db_conn, "Unknown"))
+
+
+if __name__ == '__main__':
+    unittest.main()
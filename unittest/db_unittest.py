@@ -1,115 +1,314 @@
-import unittest
-from datetime import datetime, timedelta
-import db
-
-
-class TestDatabaseModule(unittest.TestCase):
-    def setUp(self):
-        # Set up a temporary database for testing
-        self.db_conn = db.connect_database()
-
-    def tearDown(self):
-        # Roll back changes to maintain a clean state after each test
-        self.db_conn.rollback()
-        # Close the database connection
-        self.db_conn.close()
-
-    def test_add_habit(self):
-        # Test adding a habit to the database
-        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now(), 0)
-        habit_exists = db.check_habit_exists(self.db_conn, "Run")
-        self.assertTrue(habit_exists)
-
-    def test_delete_habit(self):
-        # Test deleting a habit from the database
-        habit_name = "Run"
-
-        # Check if the habit exists before trying to add it
-        if not db.check_habit_exists(self.db_conn, habit_name):
-            db.add_habit(self.db_conn, habit_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
-
-        # Now try to delete the habit
-        db.delete_habit(self.db_conn, habit_name)
-
-        # Check if the habit exists after deletion
-        habit_exists_after_deletion = db.check_habit_exists(self.db_conn, habit_name)
-        self.assertFalse(habit_exists_after_deletion)
-
-    def test_update_habit(self):
-        # Test updating a habit in the database
-        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
-        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
-        db.update_habit(self.db_conn, unique_name, "Jog", "Jogging daily", "daily", "Fitness")
-        updated_habit_name = db.get_habit_names(self.db_conn)[0]
-        self.assertEqual(updated_habit_name, "Jog")
-
-    def test_increment_streak(self):
-        # Test incrementing the streak for a habit
-        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
-        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
-        db.increment_streak(self.db_conn, unique_name)
-        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
-        self.assertEqual(streak_count, 1)
-
-    def test_reset_streak(self):
-        # Test resetting the streak for a habit
-        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
-        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 3)
-        db.reset_streak(self.db_conn, unique_name)
-        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
-        self.assertEqual(streak_count, 0)
-
-    def test_update_habit_progress(self):
-        # Test updating the progress (streak) for a habit
-        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
-        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
-        db.update_habit_progress(self.db_conn, unique_name, 5)
-        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
-        self.assertEqual(streak_count, 5)
-
-    def test_mark_as_completed(self):
-        # Test marking a habit as completed
-        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
-        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
-        completion_time = datetime.now() - timedelta(days=2)
-        db.mark_as_completed(self.db_conn, unique_name, completion_time)
-        habit_completion_time = db.retrieve_habit_completion_time(self.db_conn, unique_name)
-
-        # Convert completion_time to the expected format
-        expected_completion_time = completion_time.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-
-        # Convert strings to datetime objects
-        habit_completion_time = datetime.strptime(habit_completion_time, '%Y-%m-%d %H:%M:%S.%f')
-        expected_completion_time = datetime.strptime(expected_completion_time, '%Y-%m-%d %H:%M:%S.%f')
-
-        # Use assertAlmostEqual to compare datetime objects with a small delta
-        self.assertAlmostEqual(habit_completion_time, expected_completion_time, delta=timedelta(milliseconds=1))
-
-    def test_check_habit_exists(self):
-        # Test checking if a habit exists in the database
-        habit_name = "Run"
-        habit_exists_before_adding = db.check_habit_exists(self.db_conn, habit_name)
-
-        if not habit_exists_before_adding:
-            db.add_habit(self.db_conn, habit_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
-
-        habit_exists_after_adding = db.check_habit_exists(self.db_conn, habit_name)
-        self.assertTrue(habit_exists_after_adding)
-
-    def test_get_habit_names(self):
-        # Test getting the names of all habits in the database
-        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now(), 0)
-        db.add_habit(self.db_conn, "Read", "Reading weekly", "weekly", "Hobby", datetime.now(), 0)
-        habit_names = db.get_habit_names(self.db_conn)
-        self.assertEqual(len(habit_names), 2)
-
-    def test_get_habit_streak_count(self):
-        # Test getting the streak count for a habit
-        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
-        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 3)
-        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
-        self.assertEqual(streak_count, 3)
-
-
-if __name__ == '__main__':
-    unittest.main()
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import connection
+import db
+import migrations
+
+TEST_DB = None
+
+
+def setUpModule():
+    # Use a temporary database file, shared by the tests of this module, instead of the user's database
+    global TEST_DB
+    TEST_DB = connection.temporary_database()
+
+
+def tearDownModule():
+    connection.remove_database(TEST_DB)
+
+
+class TestDatabaseModule(unittest.TestCase):
+    def setUp(self):
+        # Set up a temporary database for testing
+        self.db_conn = db.connect_database(TEST_DB)
+
+    def tearDown(self):
+        # Roll back changes to maintain a clean state after each test
+        self.db_conn.rollback()
+        # Close the database connection
+        self.db_conn.close()
+
+    def test_add_habit(self):
+        # Test adding a habit to the database
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now(), 0)
+        habit_exists = db.check_habit_exists(self.db_conn, "Run")
+        self.assertTrue(habit_exists)
+
+    def test_delete_habit(self):
+        # Test deleting a habit from the database
+        habit_name = "Run"
+
+        # Check if the habit exists before trying to add it
+        if not db.check_habit_exists(self.db_conn, habit_name):
+            db.add_habit(self.db_conn, habit_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+
+        # Now try to delete the habit
+        db.delete_habit(self.db_conn, habit_name)
+
+        # Check if the habit exists after deletion
+        habit_exists_after_deletion = db.check_habit_exists(self.db_conn, habit_name)
+        self.assertFalse(habit_exists_after_deletion)
+
+    def test_migrate_existing_database(self):
+        # Test upgrading a database created before schema versioning in place
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        old_conn = sqlite3.connect(path)
+        old_conn.execute("CREATE TABLE habits (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, description TEXT, "
+                         "periodicity TEXT, category TEXT, creation_time DATETIME, streak INTEGER DEFAULT 0, "
+                         "completion_time DATETIME DEFAULT NULL)")
+        old_conn.execute("CREATE TABLE habit_logs (id INTEGER PRIMARY KEY, habit_id INTEGER, completed BOOLEAN, "
+                         "completion_time DATETIME, FOREIGN KEY (habit_id) REFERENCES habits(id))")
+        old_conn.execute("INSERT INTO habits (name, periodicity, creation_time, streak) VALUES ('Run', 'daily', ?, 1)",
+                         (datetime(2024, 3, 5, 10, 11, 12, 123456).isoformat(" "),))
+        old_conn.executemany("INSERT INTO habit_logs (habit_id, completed, completion_time) VALUES (1, 1, ?)",
+                             [(datetime(2024, 3, day, 8).isoformat(" "),) for day in range(5, 10)])
+        old_conn.commit()
+
+        applied = migrations.migrate(old_conn)
+        self.assertEqual([version for version, _ in applied], [version for version, _, _ in migrations.MIGRATIONS])
+        self.assertEqual(migrations.get_schema_version(old_conn), migrations.SCHEMA_VERSION)
+        self.assertEqual(migrations.migrate(old_conn), [])
+        indexes = [row[1] for row in old_conn.execute("PRAGMA index_list(habit_logs)")]
+        self.assertIn("idx_habit_logs_habit_time", indexes)
+        self.assertTrue(db.check_habit_exists(old_conn, "Run"))
+        creation_time = old_conn.execute("SELECT creation_time FROM habits WHERE name='Run'").fetchone()[0]
+        self.assertEqual(creation_time, int(datetime(2024, 3, 5, 10, 11, 12).timestamp()))
+        # The stored streak count is the derived one
+        self.assertEqual(db.get_habit_streak_count(old_conn, "Run"), 5)
+        old_conn.close()
+        os.remove(path)
+
+    def test_delete_habit_with_logs(self):
+        # Test deleting a completed habit while foreign keys are enforced
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+        db.mark_as_completed(self.db_conn, unique_name, datetime.now())
+        db.delete_habit(self.db_conn, unique_name)
+        self.assertFalse(db.check_habit_exists(self.db_conn, unique_name))
+        self.assertIsNone(db.retrieve_habit_completion_time(self.db_conn, unique_name))
+
+    def test_update_habit(self):
+        # Test updating a habit in the database
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+        db.update_habit(self.db_conn, unique_name, "Jog", "Jogging daily", "daily", "Fitness")
+        updated_habit_name = db.get_habit_names(self.db_conn)[0]
+        self.assertEqual(updated_habit_name, "Jog")
+
+    def test_update_habit_periodicity_streak(self):
+        # Test that changing the periodicity updates the stored streak count
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime(2024, 3, 1), 0)
+        for day in (4, 5, 6):
+            db.mark_as_completed(self.db_conn, unique_name, datetime(2024, 3, day, 8))
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, unique_name), 3)
+        db.update_habit(self.db_conn, unique_name, unique_name, "Running weekly", "weekly", "Fitness")
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, unique_name), 1)
+        db.delete_habit(self.db_conn, unique_name)
+
+    def test_increment_streak(self):
+        # Test incrementing the streak for a habit
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+        db.increment_streak(self.db_conn, unique_name)
+        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
+        self.assertEqual(streak_count, 1)
+
+    def test_reset_streak(self):
+        # Test resetting the streak for a habit
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 3)
+        db.reset_streak(self.db_conn, unique_name)
+        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
+        self.assertEqual(streak_count, 0)
+
+    def test_transaction_commits_on_exit(self):
+        # Test that writes inside a transaction are only visible to other connections after it exits
+        unique_name = "Tx_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        other_conn = db.connect_database(TEST_DB)
+        with db.transaction(self.db_conn):
+            db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+            db.mark_as_completed(self.db_conn, unique_name, datetime.now())
+            self.assertTrue(db.in_transaction(self.db_conn))
+            self.assertFalse(db.check_habit_exists(other_conn, unique_name))
+        self.assertFalse(db.in_transaction(self.db_conn))
+        self.assertTrue(db.check_habit_exists(other_conn, unique_name))
+        self.assertEqual(db.get_habit_streak_count(other_conn, unique_name), 1)
+        other_conn.close()
+        db.delete_habit(self.db_conn, unique_name)
+
+    def test_transaction_rollback(self):
+        # Test that a failing nested block only undoes its own writes and a failing outer block undoes everything
+        unique_name = "Tx_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        with db.transaction(self.db_conn):
+            db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+            with self.assertRaises(ValueError):
+                with db.transaction(self.db_conn):
+                    db.add_habit(self.db_conn, unique_name + "_inner", "Reading", "daily", "Hobby", datetime.now(), 0)
+                    raise ValueError("inner failure")
+        self.assertTrue(db.check_habit_exists(self.db_conn, unique_name))
+        self.assertFalse(db.check_habit_exists(self.db_conn, unique_name + "_inner"))
+
+        with self.assertRaises(ValueError):
+            with db.transaction(self.db_conn):
+                db.delete_habit(self.db_conn, unique_name)
+                raise ValueError("outer failure")
+        self.assertTrue(db.check_habit_exists(self.db_conn, unique_name))
+        db.delete_habit(self.db_conn, unique_name)
+
+    def test_update_habit_progress(self):
+        # Test updating the progress (streak) for a habit
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+        db.update_habit_progress(self.db_conn, unique_name, 5)
+        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
+        self.assertEqual(streak_count, 5)
+
+    def test_mark_as_completed(self):
+        # Test marking a habit as completed
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+        completion_time = datetime.now() - timedelta(days=2)
+        db.mark_as_completed(self.db_conn, unique_name, completion_time)
+        habit_completion_time = db.retrieve_habit_completion_time(self.db_conn, unique_name)
+
+        # Completion times are stored as integer epoch seconds
+        self.assertIsInstance(habit_completion_time, int)
+        habit_completion_time = datetime.fromtimestamp(habit_completion_time)
+
+        # Use assertAlmostEqual to compare datetime objects with a small delta
+        self.assertAlmostEqual(habit_completion_time, completion_time, delta=timedelta(seconds=1))
+
+    def test_mark_many_completed(self):
+        # Test marking a batch of completions, including an unknown habit
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+        completions = [(unique_name, datetime.now() - timedelta(days=day)) for day in range(3)]
+        completions.append(("Unknown_" + unique_name, datetime.now()))
+        inserted, rejected = db.mark_many_completed(self.db_conn, completions)
+        self.assertEqual((inserted, rejected), (3, 1))
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, unique_name), 3)
+
+    def test_check_habit_exists(self):
+        # Test checking if a habit exists in the database
+        habit_name = "Run"
+        habit_exists_before_adding = db.check_habit_exists(self.db_conn, habit_name)
+
+        if not habit_exists_before_adding:
+            db.add_habit(self.db_conn, habit_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+
+        habit_exists_after_adding = db.check_habit_exists(self.db_conn, habit_name)
+        self.assertTrue(habit_exists_after_adding)
+
+    def test_get_habit_id_after_rename(self):
+        # Test that cached habit ids follow renames and deletions
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 0)
+        habit_id = db.get_habit_id(self.db_conn, unique_name)
+        self.assertIsNotNone(habit_id)
+
+        db.update_habit(self.db_conn, unique_name, unique_name + "_Jog", "Jogging daily", "daily", "Fitness")
+        self.assertIsNone(db.get_habit_id(self.db_conn, unique_name))
+        self.assertEqual(db.get_habit_id(self.db_conn, unique_name + "_Jog"), habit_id)
+
+        db.delete_habit_by_id(self.db_conn, habit_id)
+        self.assertIsNone(db.get_habit_id(self.db_conn, unique_name + "_Jog"))
+
+    def test_get_habit_id_after_external_change(self):
+        # Test that cached habit ids are dropped when another process renames or deletes habits
+        unique_name = "Drink_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Drinking water", "daily", "Health", datetime.now(), 0)
+        habit_id = db.get_habit_id(self.db_conn, unique_name)
+
+        # A plain sqlite3 connection does not invalidate the cache, like another process
+        other = sqlite3.connect(TEST_DB)
+        other.execute("UPDATE habits SET name = ? WHERE id = ?", (unique_name + "_Hydrate", habit_id))
+        other.execute("INSERT INTO habits (name, periodicity, creation_time) VALUES (?, 'daily', 0)", (unique_name,))
+        other.commit()
+        self.assertNotEqual(db.get_habit_id(self.db_conn, unique_name), habit_id)
+
+        other.execute("DELETE FROM habits WHERE name LIKE ?", (unique_name + "%",))
+        other.commit()
+        other.close()
+        self.assertIsNone(db.get_habit_id(self.db_conn, unique_name))
+
+    def test_get_habit_id_in_transaction(self):
+        # Test that ids cached inside a transaction follow its renames and are dropped when it rolls back
+        unique_name = "Walk_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Walking daily", "daily", "Fitness", datetime.now(), 0)
+        habit_id = db.get_habit_id(self.db_conn, unique_name)
+        with self.assertRaises(RuntimeError):
+            with db.transaction(self.db_conn):
+                self.assertEqual(db.get_habit_id(self.db_conn, unique_name), habit_id)
+                db.update_habit(self.db_conn, unique_name, unique_name + "_Hike", "Hiking", "daily", "Fitness")
+                self.assertIsNone(db.get_habit_id(self.db_conn, unique_name))
+                self.assertEqual(db.get_habit_id(self.db_conn, unique_name + "_Hike"), habit_id)
+                raise RuntimeError
+        self.assertEqual(db.get_habit_id(self.db_conn, unique_name), habit_id)
+        self.assertIsNone(db.get_habit_id(self.db_conn, unique_name + "_Hike"))
+        db.delete_habit_by_id(self.db_conn, habit_id)
+
+    def test_get_habit_names(self):
+        # Test getting the names of all habits in the database
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now(), 0)
+        db.add_habit(self.db_conn, "Read", "Reading weekly", "weekly", "Hobby", datetime.now(), 0)
+        habit_names = db.get_habit_names(self.db_conn)
+        self.assertEqual(len(habit_names), 2)
+
+    def test_get_habit_streak_count(self):
+        # Test getting the streak count for a habit
+        unique_name = "Run_" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+        db.add_habit(self.db_conn, unique_name, "Running daily", "daily", "Fitness", datetime.now(), 3)
+        streak_count = db.get_habit_streak_count(self.db_conn, unique_name)
+        self.assertEqual(streak_count, 3)
+
+    def test_streaming_iterators(self):
+        # Test that the iterators stream the same names as the list functions, across fetchmany batches
+        conn = connection.open_connection(":memory:")
+        for number in range(7):
+            db.add_habit(conn, "Habit %d" % number, "Description", ("daily", "weekly")[number % 2], "Test",
+                         datetime.now(), 0)
+        self.assertEqual(list(db.iter_habit_names(conn, batch_size=3)), sorted(db.get_habit_names(conn)))
+        self.assertEqual(list(db.iter_habits_with_periodicity(conn, "weekly", batch_size=2)),
+                         ["Habit 1", "Habit 3", "Habit 5"])
+        self.assertEqual(list(db.iter_habit_records(conn, batch_size=2)), db.get_habit_records(conn))
+        conn.close()
+
+    def test_keyset_pagination(self):
+        # Test that following the page tokens lists every habit once, in either order and with a filter
+        conn = connection.open_connection(":memory:")
+        for number in (5, 3, 9, 1, 7):
+            db.add_habit(conn, "Habit %d" % number, "Description", ("daily", "weekly")[number > 4], "Test",
+                         datetime.now(), 0)
+        for order_by, periodicity, expected in (("name", None, ["Habit 1", "Habit 3", "Habit 5", "Habit 7", "Habit 9"]),
+                                                ("id", None, ["Habit 5", "Habit 3", "Habit 9", "Habit 1", "Habit 7"]),
+                                                ("name", "weekly", ["Habit 5", "Habit 7", "Habit 9"])):
+            names = []
+            pages = 0
+            page_token = None
+            while True:
+                page, page_token = db.get_habit_page(conn, order_by, page_token, page_size=2, periodicity=periodicity)
+                names.extend(record.name for record in page)
+                pages += 1
+                if page_token is None:
+                    break
+            self.assertEqual(names, expected)
+            self.assertEqual(pages, (len(expected) + 1) // 2)
+
+        _, page_token = db.get_habit_page(conn, "name", page_size=2)
+        with self.assertRaises(ValueError):
+            db.get_habit_page(conn, "id", page_token)
+        with self.assertRaises(ValueError):
+            db.get_habit_page(conn, "name", "not a token")
+        for page_size in (0, -2):
+            with self.assertRaises(ValueError):
+                db.get_habit_page(conn, "name", page_size=page_size)
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import connection
+import db
+import export
+
+
+class TestExportModule(unittest.TestCase):
+    def setUp(self):
+        # Use a private in-memory database and a temporary output directory for every test
+        self.db_conn = connection.open_connection(":memory:")
+        self.directory = tempfile.mkdtemp(prefix="habit-export-")
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime(2024, 1, 1), 0)
+        db.add_habit(self.db_conn, "Read", "Reading weekly", "weekly", "Hobby", datetime(2024, 1, 1), 0)
+        self.times = [int(datetime(2024, 3, day, 9).timestamp()) for day in (1, 2, 3)]
+        db.mark_many_completed(self.db_conn, [("Run", time) for time in self.times] + [("Read", self.times[1])])
+
+    def tearDown(self):
+        self.db_conn.close()
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_csv_habits(self):
+        # Test that habits are written with a header and can be filtered
+        count, last_id = export.export(self.db_conn, "habits", self.path("habits.csv"), category="Hobby")
+        self.assertEqual((count, last_id), (1, None))
+        with open(self.path("habits.csv"), newline="", encoding="utf-8") as stream:
+            rows = list(csv.DictReader(stream))
+        self.assertEqual([row["name"] for row in rows], ["Read"])
+        self.assertEqual(rows[0]["total_completions"], "1")
+
+    def test_gzip_jsonl_logs_with_time_range(self):
+        # Test that gzip is derived from the file name and the time range is half-open
+        count, _ = export.export(self.db_conn, "logs", self.path("logs.jsonl.gz"), periodicity="daily",
+                                 start_time=self.times[1], end_time=self.times[2])
+        self.assertEqual(count, 1)
+        with gzip.open(self.path("logs.jsonl.gz"), "rt", encoding="utf-8") as stream:
+            rows = [json.loads(line) for line in stream]
+        self.assertEqual([(row["habit_name"], row["completion_time"]) for row in rows], [("Run", self.times[1])])
+
+    def test_incremental_logs(self):
+        # Test that the high-water mark limits the next export to new logs
+        state = self.path("state.json")
+        self.assertEqual(export.export(self.db_conn, "logs", self.path("first.csv"), state_path=state)[0], 4)
+        self.assertEqual(export.export(self.db_conn, "logs", self.path("empty.csv"), state_path=state), (0, 4))
+        db.mark_as_completed(self.db_conn, "Read", self.times[2])
+        self.assertEqual(export.export(self.db_conn, "logs", self.path("second.csv"), state_path=state), (1, 5))
+        self.assertEqual(export.read_state(state), 5)
+
+    def test_incremental_logs_after_delete(self):
+        # Test that a log added after the newest exported log was deleted gets a new id and is exported
+        state = self.path("state.json")
+        self.assertEqual(export.export(self.db_conn, "logs", self.path("first.csv"), state_path=state), (4, 4))
+        db.delete_habit(self.db_conn, "Read")
+        db.mark_as_completed(self.db_conn, "Run", self.times[2] + 86400)
+        count, last_id = export.export(self.db_conn, "logs", self.path("second.jsonl"), state_path=state)
+        self.assertEqual((count, last_id), (1, 5))
+        with open(self.path("second.jsonl"), encoding="utf-8") as stream:
+            self.assertEqual(json.loads(stream.readline())["completion_time"], self.times[2] + 86400)
+
+    def test_streaming(self):
+        # Test that rows are produced lazily and written as they arrive
+        rows = export.iter_logs(self.db_conn, batch_size=1)
+        self.assertEqual(next(rows)[3], self.times[0])
+        stream = io.StringIO()
+        self.assertEqual(export.write_rows(rows, export.LOG_COLUMNS, stream, "jsonl"), (3, 4))
+        self.assertEqual(len(stream.getvalue().splitlines()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,21 @@
 import unittest
 from habit import Habit
+import connection
 import db
 
+# An in-memory database shared by the tests of this module and the Habit objects they create
+TEST_DB = "file:habit_unittest?mode=memory&cache=shared"
+
 
 class TestHabitClass(unittest.TestCase):
     def setUp(self):
         # Create a test database and tables if needed
-        self.db_conn = db.connect_database()
+        self.db_conn = connection.get_connection(TEST_DB)
         db.create_tables(self.db_conn)
 
     def test_add_habit(self):
         habit = Habit(name="Exercise", description="Daily exercise", periodicity="daily", category="Health",
-                      database="test_db.db")
+                      database=TEST_DB)
 
         # Test adding a habit
         habit.add()
@@ -22,7 +26,7 @@ class TestHabitClass(unittest.TestCase):
         self.assertFalse(db.check_habit_exists(self.db_conn, "NonexistentHabit"))
 
     def test_modify_streak(self):
-        habit = Habit(name="Exercise", database="test_db.db")
+        habit = Habit(name="Exercise", database=TEST_DB)
 
         # Test modifying streak for an existing habit
         habit.add()
@@ -37,7 +41,7 @@ class TestHabitClass(unittest.TestCase):
 
     def test_update_habit(self):
         habit = Habit(name="Exercise", description="Daily exercise", periodicity="daily", category="Health",
-                      database="test_db.db")
+                      database=TEST_DB)
 
         # Test updating an existing habit
         habit.add()
@@ -47,7 +51,7 @@ class TestHabitClass(unittest.TestCase):
         self.assertIn("Running", updated_habit)
 
     def test_increase_streak(self):
-        habit = Habit(name="Exercise", database="test_db.db")
+        habit = Habit(name="Exercise", database=TEST_DB)
 
         # Test increasing streak for an existing habit
         habit.add()
@@ -57,7 +61,7 @@ class TestHabitClass(unittest.TestCase):
         self.assertEqual(updated_streak, initial_streak + 1)
 
     def test_clear_streak(self):
-        habit = Habit(name="Exercise", database="test_db.db")
+        habit = Habit(name="Exercise", database=TEST_DB)
 
         # Test clearing streak for an existing habit
         habit.add()
@@ -71,7 +75,7 @@ class TestHabitClass(unittest.TestCase):
         habit.clear_streak()
 
     def test_complete_habit(self):
-        habit = Habit(name="Exercise", database="test_db.db")
+        habit = Habit(name="Exercise", database=TEST_DB)
 
         # Test completing a habit
         habit.add()
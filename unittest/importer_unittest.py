@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import connection
+import db
+import export
+import importer
+
+
+class TestImporterModule(unittest.TestCase):
+    def setUp(self):
+        # Use private in-memory databases and a temporary directory for every test
+        self.db_conn = connection.open_connection(":memory:")
+        self.directory = tempfile.mkdtemp(prefix="habit-import-")
+        self.times = [int(datetime(2024, 3, day, 9).timestamp()) for day in (1, 2, 3, 5)]
+        self.habits = [{"name": "Run", "description": "Running daily", "periodicity": "daily", "category": "Fitness",
+                        "creation_time": "2024-01-01"},
+                       {"name": "Read", "periodicity": "weekly", "creation_time": self.times[0]},
+                       {"name": "", "periodicity": "daily"}]
+        self.logs = ([{"habit_name": "Run", "completion_time": time} for time in self.times]
+                     + [{"habit_name": "Run", "completion_time": self.times[1]},
+                        {"habit_name": "Read", "completion_time": "2024-03-02T09:00:00"},
+                        {"habit_name": "Unknown", "completion_time": self.times[0]},
+                        {"habit_name": "Read", "completion_time": ""}])
+
+    def tearDown(self):
+        self.db_conn.close()
+        shutil.rmtree(self.directory)
+
+    def state(self, conn):
+        # Everything the import maintains, for comparing databases
+        return [conn.execute('SELECT * FROM %s ORDER BY 1, 2' % table).fetchall()
+                for table in ("habits", "habit_period_stats", "habit_streaks", "streak_runs")] + [
+            conn.execute('SELECT habit_id, completion_time FROM habit_logs ORDER BY 1, 2').fetchall()]
+
+    def test_upsert_and_dedupe(self):
+        # Test that habits are upserted by name and repeated completions are skipped
+        self.assertEqual(importer.import_habits(self.db_conn, self.habits)["upserted"], 2)
+        result = importer.import_logs(self.db_conn, self.logs)
+        self.assertEqual((result["inserted"], result["duplicates"], result["rejected"]), (5, 1, 2))
+        self.assertEqual(importer.import_logs(self.db_conn, self.logs)["inserted"], 0)
+
+        importer.import_habits(self.db_conn, [{"name": "Run", "periodicity": "weekly"}])
+        self.assertEqual(self.db_conn.execute("SELECT description, periodicity, streak FROM habits WHERE name='Run'")
+                         .fetchone(), ("Running daily", "weekly", 2))
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, "Read"), 1)
+
+    def test_bulk_matches_incremental(self):
+        # Test that dropping and rebuilding indexes and triggers gives the same database
+        bulk_conn = connection.open_connection(":memory:")
+        for conn, bulk in ((self.db_conn, False), (bulk_conn, True)):
+            importer.import_habits(conn, self.habits, bulk=bulk)
+            db.mark_as_completed(conn, "Run", self.times[2])
+            result = importer.import_logs(conn, self.logs, bulk=bulk)
+            self.assertEqual((result["inserted"], result["duplicates"]), (4, 2))
+        self.assertEqual(self.state(bulk_conn), self.state(self.db_conn))
+        indexes = "SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger') ORDER BY name"
+        self.assertEqual(bulk_conn.execute(indexes).fetchall(), self.db_conn.execute(indexes).fetchall())
+        bulk_conn.close()
+
+    def test_export_round_trip_with_progress(self):
+        # Test importing the files written by export, with a progress report every two rows
+        importer.import_habits(self.db_conn, self.habits)
+        importer.import_logs(self.db_conn, self.logs)
+        habits_path = os.path.join(self.directory, "habits.csv")
+        logs_path = os.path.join(self.directory, "logs.jsonl.gz")
+        export.export(self.db_conn, "habits", habits_path)
+        export.export(self.db_conn, "logs", logs_path)
+
+        reports = []
+        progress_every = importer.PROGRESS_EVERY
+        importer.PROGRESS_EVERY = 2
+        copy_conn = connection.open_connection(":memory:")
+        try:
+            importer.import_habits(copy_conn, importer.read_rows(habits_path),
+                                   report=lambda *report: reports.append(report))
+            importer.import_logs(copy_conn, importer.read_rows(logs_path),
+                                 report=lambda *report: reports.append(report))
+        finally:
+            importer.PROGRESS_EVERY = progress_every
+        self.assertEqual(self.state(copy_conn), self.state(self.db_conn))
+        self.assertEqual([(label, rows) for label, rows, _ in reports], [("habits", 2), ("logs", 2), ("logs", 4)])
+        copy_conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from datetime import datetime
+import analytics_module
+import connection
+import db
+import period_stats
+import periods
+
+
+class TestPeriodStatsModule(unittest.TestCase):
+    def setUp(self):
+        # Use a private in-memory database for every test
+        self.db_conn = connection.open_connection(":memory:")
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime(2024, 1, 1), 0)
+        db.add_habit(self.db_conn, "Swim", "Swimming weekly", "weekly", "Fitness", datetime(2024, 1, 1), 0)
+        self.run_id = db.get_habit_id(self.db_conn, "Run")
+
+    def tearDown(self):
+        self.db_conn.close()
+
+    def buckets(self):
+        return self.db_conn.execute("SELECT habit_id, periodicity, period_key, completions FROM habit_period_stats "
+                                    "ORDER BY habit_id, periodicity, period_key").fetchall()
+
+    def test_period_keys_match_periods_module(self):
+        # Test that the SQL period numbers agree with periods.period_index around week and month boundaries
+        moments = [datetime(2024, 1, 31, 23, 59), datetime(2024, 2, 1, 0, 1), datetime(2024, 3, 3, 12),
+                   datetime(2024, 3, 4, 0, 30), datetime(2023, 12, 31, 18)]
+        for moment in moments:
+            timestamp = int(moment.timestamp())
+            for periodicity in periods.PERIODICITIES:
+                expression = period_stats.period_sql("?", periodicity).replace("?", str(timestamp))
+                key = self.db_conn.execute("SELECT " + expression).fetchone()[0]
+                self.assertEqual(key, periods.period_index(timestamp, periodicity), (moment, periodicity))
+
+    def test_triggers_count_inserts_and_deletes(self):
+        # Test that completions are counted in all three buckets and uncounted when deleted
+        for moment in (datetime(2024, 3, 4, 8), datetime(2024, 3, 4, 20), datetime(2024, 3, 5, 8)):
+            db.mark_as_completed(self.db_conn, "Run", moment)
+        counts = period_stats.completions_per_period(self.db_conn, self.run_id, "daily")
+        self.assertEqual([count for _, count in counts], [2, 1])
+        self.assertEqual(period_stats.completions_per_period(self.db_conn, self.run_id, "weekly")[0][1], 3)
+        self.assertEqual(period_stats.completions_per_period(self.db_conn, self.run_id, "monthly")[0][1], 3)
+
+        self.db_conn.execute("DELETE FROM habit_logs WHERE completion_time=?",
+                             (int(datetime(2024, 3, 5, 8).timestamp()),))
+        counts = period_stats.completions_per_period(self.db_conn, self.run_id, "daily")
+        self.assertEqual([count for _, count in counts], [2])
+
+        db.delete_habit(self.db_conn, "Run")
+        self.assertEqual(self.buckets(), [])
+
+    def test_rebuild_matches_triggers(self):
+        # Test that recounting from habit_logs gives the counts the triggers maintained
+        completions = [("Run", datetime(2024, 3, day, 9)) for day in range(1, 20)]
+        completions += [("Swim", datetime(2024, 2, day, 9)) for day in (1, 8, 9, 29)]
+        db.mark_many_completed(self.db_conn, completions)
+        maintained = self.buckets()
+        self.db_conn.execute("DELETE FROM habit_period_stats")
+        period_stats.rebuild(self.db_conn)
+        self.assertEqual(self.buckets(), maintained)
+
+    def test_completions_per_period_report(self):
+        # Test the per-period report in the periodicity of the habit
+        db.mark_many_completed(self.db_conn, [("Swim", datetime(2024, 2, day, 9)) for day in (5, 6, 14)])
+        report = analytics_module.completions_per_period(self.db_conn, "Swim")
+        self.assertEqual(report, {datetime(2024, 2, 5).date(): 2, datetime(2024, 2, 12).date(): 1})
+        self.assertEqual(analytics_module.completions_per_period(self.db_conn, "Unknown"), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from datetime import datetime
+import connection
+import db
+import records
+
+
+class TestRecordsModule(unittest.TestCase):
+    def setUp(self):
+        # Use a private in-memory database for every test
+        self.db_conn = connection.open_connection(":memory:")
+
+    def tearDown(self):
+        self.db_conn.close()
+
+    def test_record_values(self):
+        # Test that records compare by value and have no per-instance dict
+        record = records.HabitRecord(1, "Run", "Running daily", "daily", "Fitness", 100, 2, 3, 200)
+        self.assertEqual(record, records.HabitRecord(*record.as_tuple()))
+        self.assertNotEqual(record, records.HabitRecord(2, "Run"))
+        self.assertEqual(record.as_dict()["total_completions"], 3)
+        self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_batch_hydration(self):
+        # Test that every habit is loaded, with its counters, across several fetchmany batches
+        for number in range(5):
+            db.add_habit(self.db_conn, "Habit %d" % number, "Description", "daily", "Test", datetime.now(), number)
+        completion_time = int(datetime.now().timestamp())
+        db.mark_as_completed(self.db_conn, "Habit 3", completion_time)
+        habit_records = db.get_habit_records(self.db_conn, batch_size=2)
+        self.assertEqual([record.name for record in habit_records], ["Habit %d" % number for number in range(5)])
+        self.assertEqual((habit_records[3].streak, habit_records[3].total_completions,
+                          habit_records[3].last_completion), (1, 1, completion_time))
+        self.assertEqual(db.get_habit_records(self.db_conn), habit_records)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import http.client
+import json
+import threading
+import unittest
+from datetime import datetime, timedelta
+import connection
+import db
+import server
+
+
+class TestServerModule(unittest.TestCase):
+    def setUp(self):
+        self.database = connection.temporary_database()
+        self.db_conn = connection.open_connection(self.database)
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now() - timedelta(days=4), 0)
+        self.server = server.HabitServer(("127.0.0.1", 0), self.database, workers=4, queue_size=8)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.db_conn.close()
+        connection.remove_database(self.database)
+
+    def request(self, method, path, body=None):
+        client = http.client.HTTPConnection("127.0.0.1", self.server.server_port, timeout=10)
+        try:
+            client.request(method, path, json.dumps(body) if body is not None else None,
+                           {"Content-Type": "application/json"})
+            response = client.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            client.close()
+
+    def test_habits(self):
+        # Test adding, listing, completing, updating and deleting habits
+        self.assertEqual(self.request("POST", "/habits", {"name": "Read", "periodicity": "weekly"})[0], 201)
+        self.assertEqual(self.request("POST", "/habits", {"name": "Read"})[0], 409)
+        self.assertEqual(self.request("POST", "/habits", {"description": "No name"})[0], 400)
+        status, page = self.request("GET", "/habits?page_size=1")
+        self.assertEqual((status, [habit["name"] for habit in page["habits"]]), (200, ["Read"]))
+        status, page = self.request("GET", "/habits?page_token=" + page["next_page_token"])
+        self.assertEqual(([habit["name"] for habit in page["habits"]], page["next_page_token"]), (["Run"], None))
+        for page_size in ("0", "-2", "ten"):
+            self.assertEqual(self.request("GET", "/habits?page_size=" + page_size)[0], 400)
+
+        yesterday = (datetime.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.request("POST", "/habits/Run/complete", {"time": yesterday}),
+                         (200, {"name": "Run", "streak": 1}))
+        self.assertEqual(self.request("POST", "/habits/Run/complete")[1]["streak"], 2)
+        self.assertEqual(self.request("POST", "/habits/Swim/complete")[0], 404)
+        self.assertEqual(self.request("POST", "/habits/Run/complete", {"time": "yesterday"})[0], 400)
+        self.assertEqual(self.request("POST", "/habits/Run/complete", {"time": 5})[0], 400)
+        self.assertEqual(self.request("PUT", "/habits/Run/streak", {"streak": 5})[0], 200)
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, "Run"), 5)
+
+        self.assertEqual(self.request("PUT", "/habits/Read", {"name": "Read books", "description": "Reading"}),
+                         (200, {"name": "Read books", "description": "Reading", "periodicity": "weekly",
+                                "category": None}))
+        # Fields left out keep their values
+        self.request("PUT", "/habits/Run", {"periodicity": "weekly"})
+        self.assertEqual(self.db_conn.execute("SELECT description, periodicity, category FROM habits WHERE name = 'Run'")
+                         .fetchone(), ("Running daily", "weekly", "Fitness"))
+        self.assertEqual(self.request("DELETE", "/habits/Read%20books")[0], 200)
+        self.assertEqual(db.get_habit_id(self.db_conn, "Read books"), None)
+
+    def test_analytics(self):
+        # Test the analytics endpoints and the latency statistics
+        db.mark_as_completed(self.db_conn, "Run", datetime.now())
+        self.assertEqual(self.request("GET", "/analytics/completion-rates"), (200, {"Run": 0.25}))
+        self.assertEqual(self.request("GET", "/analytics/completion-rates/Run")[1]["completion_rate"], 0.25)
+        self.assertEqual(self.request("GET", "/analytics/completion-rates/Swim")[0], 404)
+        self.assertEqual(self.request("GET", "/analytics/lowest-completion-rate")[1], {"name": "Run", "completion_rate": 0.25})
+        self.assertEqual(self.request("GET", "/analytics/needing-improvement?threshold=0.2")[1], [])
+        self.assertEqual(self.request("GET", "/analytics/longest-streak")[1], {"longest_streak": 1})
+        self.assertEqual(self.request("GET", "/analytics/longest-streak/Run")[1]["longest_streak"], 1)
+        status, periods = self.request("GET", "/analytics/completions-per-period/Run")
+        self.assertEqual((status, periods), (200, [{"period_start": datetime.now().date().isoformat(), "completions": 1}]))
+        self.assertEqual(self.request("GET", "/analytics/habits?periodicity=daily")[1], ["Run"])
+        self.assertEqual(self.request("GET", "/nowhere")[0], 404)
+
+        stats = self.request("GET", "/stats")[1]
+        self.assertEqual(stats["requests"], 10)
+        self.assertEqual(stats["routes"]["GET /analytics/completion-rates/<name>"]["calls"], 2)
+        self.assertIn("p99_ms", stats["routes"]["GET /analytics/longest-streak"])
+
+    def test_private_memory_database(self):
+        # Test that a database the workers could not share is refused
+        with self.assertRaises(ValueError):
+            server.HabitServer(("127.0.0.1", 0), ":memory:")
+
+    def test_concurrent_completions(self):
+        # Test that completions sent in parallel are all logged
+        def complete():
+            for _ in range(10):
+                self.assertEqual(self.request("POST", "/habits/Run/complete")[0], 200)
+
+        clients = [threading.Thread(target=complete) for _ in range(6)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        self.assertEqual(self.db_conn.execute("SELECT COUNT(*) FROM habit_logs").fetchone()[0], 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
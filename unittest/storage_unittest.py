@@ -0,0 +1,132 @@
+import contextlib
+import io
+import unittest
+from datetime import datetime, timedelta
+import analytics_module
+import connection
+import db
+import storage
+from habit import Habit
+
+
+class TestStorageModule(unittest.TestCase):
+    def setUp(self):
+        # Every backend gets its own private in-memory database
+        self.connections = []
+        now = datetime.now().replace(hour=12)
+        self.times = [now - timedelta(days=day) for day in (9, 3, 2, 1, 0)] + [now - timedelta(days=5)]
+
+    def tearDown(self):
+        for conn in self.connections:
+            conn.close()
+
+    def sqlite_backend(self):
+        conn = connection.open_connection(":memory:")
+        self.connections.append(conn)
+        return storage.SQLiteBackend(conn)
+
+    def backends(self):
+        return [self.sqlite_backend(), storage.MemoryBackend(),
+                storage.CachedBackend(self.sqlite_backend().conn)]
+
+    def fill(self, backend):
+        now = datetime.now()
+        backend.add_habit("Run", "Running daily", "daily", "Fitness", now - timedelta(days=20), 0)
+        backend.add_habit("Read", "Reading weekly", "weekly", "Hobby", now - timedelta(days=30), 0)
+        backend.add_habit("Call", "Calling monthly", "monthly", "Family", now, 0)
+        for completion_time in self.times:
+            backend.mark_as_completed("Run", completion_time)
+        backend.mark_many_completed([("Read", self.times[0]), ("Read", self.times[1]), ("Unknown", self.times[0]),
+                                     ("Read", None)])
+
+    def summary(self, backend):
+        return (backend.habit_names(), backend.habits_with_periodicity("weekly"),
+                backend.get_habit_id("Read"), backend.get_streak("Run"), backend.completion_time("Run"),
+                backend.completion_times("Read"), backend.current_streak("Run"), backend.longest_streak("Run"),
+                backend.longest_streak_overall(), backend.completion_rates(), backend.completion_rate("Read"),
+                backend.completions_per_period("Read"), backend.habit_records())
+
+    def test_backends_agree(self):
+        # Test that every backend gives the same answers for the same writes
+        summaries = []
+        for backend in self.backends():
+            self.fill(backend)
+            summaries.append(self.summary(backend))
+        self.assertEqual(summaries[1], summaries[0])
+        self.assertEqual(summaries[2], summaries[0])
+        self.assertEqual(summaries[0][3:9], (4, db.to_epoch(self.times[0]), [db.to_epoch(self.times[0]),
+                                                                               db.to_epoch(self.times[1])], 4, 4, 4))
+
+    def test_updates_and_deletes(self):
+        # Test renaming, changing the periodicity, streak counters and deletes on every backend
+        summaries = []
+        for backend in self.backends():
+            self.fill(backend)
+            backend.update_habit("Run", "Jog", "Jogging weekly", "weekly", "Fitness")
+            backend.set_streak("Read", 7)
+            backend.increment_streak("Read")
+            backend.reset_streak("Call")
+            backend.delete_habit("Call")
+            summaries.append((backend.habit_names(), backend.get_streak("Read"), backend.habit_exists("Run"),
+                              backend.longest_streak("Jog"), backend.completions_per_period("Jog"),
+                              backend.current_streak("Read")))
+            backend.remove_all_habits()
+            self.assertEqual(backend.habit_names(), [])
+        self.assertEqual(summaries[1], summaries[0])
+        self.assertEqual(summaries[2], summaries[0])
+        self.assertEqual(summaries[0][:3], (["Jog", "Read"], 8, False))
+
+    def test_periodicity_change_updates_streak(self):
+        # Test that every backend stores the streak of the new periods after a periodicity change
+        streaks = []
+        for backend in self.backends():
+            backend.add_habit("Run", "Running daily", "daily", "Fitness", datetime(2024, 3, 1), 0)
+            for day in (4, 5, 6, 7):
+                backend.mark_as_completed("Run", datetime(2024, 3, day, 8))
+            backend.update_habit("Run", "Run", "Running weekly", "weekly", "Fitness")
+            streaks.append(backend.get_streak("Run"))
+        self.assertEqual(streaks, [1, 1, 1])
+
+    def test_memory_backend_loads_sqlite(self):
+        # Test that a memory copy of a database keeps its ids and answers like the database
+        backend = self.sqlite_backend()
+        self.fill(backend)
+        backend.delete_habit("Run")
+        backend.add_habit("Swim", "Swimming daily", "daily", "Fitness", datetime.now(), 0)
+        memory = storage.MemoryBackend.load(backend.conn)
+        self.assertEqual(self.summary(memory), self.summary(backend))
+        self.assertEqual(memory.get_habit_id("Swim"), backend.get_habit_id("Swim"))
+
+    def test_cached_backend_rolls_back(self):
+        # Test that a failed transaction leaves the memory copy in step with the database
+        backend = storage.CachedBackend(self.sqlite_backend().conn)
+        self.fill(backend)
+        with self.assertRaises(RuntimeError):
+            with backend.transaction():
+                backend.delete_habit("Run")
+                raise RuntimeError("abort")
+        self.assertEqual(backend.habit_names(), ["Call", "Read", "Run"])
+        self.assertEqual(backend.completion_times("Run"), backend.store.completion_times("Run"))
+
+    def test_habit_and_analytics_on_memory_backend(self):
+        # Test that Habit and analytics_module work without a database
+        backend = storage.MemoryBackend()
+        habit = Habit(name="Run", description="Running daily", periodicity="daily", category="Fitness",
+                      backend=backend)
+        self.assertIsNone(habit.db)
+        with contextlib.redirect_stdout(io.StringIO()):
+            habit.add()
+            habit.add()
+            habit.complete_habit()
+            habit.increase_streak()
+        self.assertEqual(analytics_module.get_all_tracked_habits(backend), ["Run"])
+        self.assertEqual(analytics_module.find_longest_streak_for_habit(backend, "Run"), 1)
+        self.assertEqual(analytics_module.find_longest_streak_overall(backend), 1)
+        self.assertEqual(analytics_module.calculate_completion_rate(backend), {"Run": 0.0})
+        self.assertEqual(analytics_module.find_habit_with_lowest_completion_rate(backend), ("Run", 0.0))
+        self.assertEqual(analytics_module.habits_by_periodicity(backend, "daily"), ["Run"])
+        self.assertEqual(backend.get_streak("Run"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
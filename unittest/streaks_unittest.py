@@ -0,0 +1,130 @@
+import unittest
+from datetime import datetime, timedelta
+import connection
+import db
+import streaks
+
+
+class TestStreaksModule(unittest.TestCase):
+    def setUp(self):
+        # Use a private in-memory database for every test
+        self.db_conn = connection.open_connection(":memory:")
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now() - timedelta(days=30), 0)
+        db.add_habit(self.db_conn, "Swim", "Swimming weekly", "weekly", "Fitness", datetime.now() - timedelta(days=90), 0)
+        self.run_id = db.get_habit_id(self.db_conn, "Run")
+        self.swim_id = db.get_habit_id(self.db_conn, "Swim")
+
+    def tearDown(self):
+        self.db_conn.close()
+
+    def complete(self, habit_name, days_ago):
+        db.mark_as_completed(self.db_conn, habit_name, datetime.now() - timedelta(days=days_ago))
+
+    def test_consecutive_days(self):
+        # Test that completions on consecutive days extend the streak
+        for day in (3, 2, 1, 0):
+            self.complete("Run", day)
+        self.assertEqual(streaks.current_streak(self.db_conn, self.run_id), 4)
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, "Run"), 4)
+
+    def test_missed_day_breaks_streak(self):
+        # Test that a missed day starts a new run but keeps the longest one
+        for day in (6, 5, 4, 1, 0):
+            self.complete("Run", day)
+        self.assertEqual(streaks.current_streak(self.db_conn, self.run_id), 2)
+        self.assertEqual(streaks.longest_streak(self.db_conn, self.run_id), 3)
+
+    def test_current_streak_expires(self):
+        # Test that the current streak is gone once a whole period passed without completion
+        for day in (5, 4):
+            self.complete("Run", day)
+        self.assertEqual(streaks.current_streak(self.db_conn, self.run_id), 0)
+        self.assertEqual(streaks.longest_streak(self.db_conn, self.run_id), 2)
+
+    def test_manual_streak_count(self):
+        # Test that a manual count shows while the streak runs and the next completion counts from the log again
+        db.update_habit_progress(self.db_conn, "Run", 9)
+        self.assertEqual(streaks.current_streak(self.db_conn, self.run_id), 9)
+        for day in (1, 0):
+            self.complete("Run", day)
+        db.increment_streak(self.db_conn, "Run")
+        self.assertEqual(streaks.current_streak(self.db_conn, self.run_id), 3)
+        self.complete("Run", 0)
+        self.assertEqual(streaks.current_streak(self.db_conn, self.run_id), 2)
+        self.assertEqual(streaks.current_streak(self.db_conn, self.run_id, db.to_epoch(datetime.now() + timedelta(days=2))), 0)
+
+    def test_same_period_counts_once(self):
+        # Test that several completions in one week count as one period (1 January 2024 is a Monday)
+        for completion_time in (datetime(2024, 1, 1, 9), datetime(2024, 1, 3, 9), datetime(2024, 1, 8, 9),
+                                datetime(2024, 1, 22, 9)):
+            db.mark_as_completed(self.db_conn, "Swim", completion_time)
+        self.assertEqual(streaks.longest_streak(self.db_conn, self.swim_id), 2)
+        now = db.to_epoch(datetime(2024, 1, 28, 20))
+        self.assertEqual(streaks.current_streak(self.db_conn, self.swim_id, now), 1)
+
+    def test_out_of_order_completion(self):
+        # Test that a backfilled completion is merged into the streak
+        for day in (4, 2, 1):
+            self.complete("Run", day)
+        self.assertEqual(streaks.longest_streak(self.db_conn, self.run_id), 2)
+        self.complete("Run", 3)
+        self.assertEqual(streaks.longest_streak(self.db_conn, self.run_id), 4)
+
+    def test_rebuild_all_matches_incremental(self):
+        # Test that a full rebuild gives the same checkpoints as the incremental updates
+        for day in (9, 8, 6, 5, 4, 0):
+            self.complete("Run", day)
+        for day in (21, 14, 0):
+            self.complete("Swim", day)
+        queries = ["SELECT * FROM habit_streaks ORDER BY habit_id",
+                   "SELECT habit_id, start_period, end_period, length FROM streak_runs ORDER BY habit_id, start_period"]
+        incremental = [self.db_conn.execute(query).fetchall() for query in queries]
+        self.assertEqual(streaks.rebuild_all(self.db_conn), 2)
+        self.assertEqual([self.db_conn.execute(query).fetchall() for query in queries], incremental)
+
+    def test_batched_completions_match_rebuild(self):
+        # Test that batches of completions advance the runs like a full rebuild, reading no logs when in order
+        now = datetime.now()
+        rebuilds = []
+        original = streaks.rebuild_streak
+        streaks.rebuild_streak = lambda conn, habit_id: rebuilds.append(habit_id) or original(conn, habit_id)
+        try:
+            db.mark_many_completed(self.db_conn, [("Run", now - timedelta(days=day)) for day in (12, 11, 9)])
+            db.mark_many_completed(self.db_conn, [("Run", now - timedelta(days=day)) for day in (3, 8, 9, 7, 2, 0)]
+                                   + [("Swim", now - timedelta(days=day)) for day in (14, 7, 0)])
+            self.assertEqual(rebuilds, [])
+            db.mark_many_completed(self.db_conn, [("Run", now - timedelta(days=10))])
+            self.assertEqual(rebuilds, [self.run_id])
+        finally:
+            streaks.rebuild_streak = original
+        self.assertEqual(db.get_habit_streak_count(self.db_conn, "Run"), 1)
+        self.assertEqual(streaks.longest_streak(self.db_conn, self.run_id), 6)
+        queries = ["SELECT * FROM habit_streaks ORDER BY habit_id",
+                   "SELECT habit_id, start_period, end_period, length FROM streak_runs ORDER BY habit_id, start_period"]
+        incremental = [self.db_conn.execute(query).fetchall() for query in queries]
+        streaks.rebuild_all(self.db_conn)
+        self.assertEqual([self.db_conn.execute(query).fetchall() for query in queries], incremental)
+
+    def test_longest_run_survives_reset(self):
+        # Test that the run history keeps the best streak after the streak counter was reset
+        for day in (9, 8, 7, 6, 1, 0):
+            self.complete("Run", day)
+        db.reset_streak(self.db_conn, "Run")
+        self.assertEqual(streaks.longest_streak_overall(self.db_conn), 4)
+        top = streaks.top_runs(self.db_conn, limit=1)
+        self.assertEqual(top[0][0], "Run")
+        self.assertEqual(top[0][3], 4)
+        self.assertEqual((top[0][2] - top[0][1]).days, 3)
+
+    def test_runs_active_between(self):
+        # Test finding the runs that overlap a time range
+        for day in (20, 19, 18, 5, 4):
+            self.complete("Run", day)
+        start = db.to_epoch(datetime.now() - timedelta(days=6))
+        end = db.to_epoch(datetime.now() - timedelta(days=3))
+        runs = streaks.runs_active_between(self.db_conn, start, end)
+        self.assertEqual([(name, length) for name, _, _, length in runs], [("Run", 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import io
+import unittest
+from datetime import datetime
+import analytics_module
+import connection
+import db
+import tracing
+
+
+class TestTracingModule(unittest.TestCase):
+    def setUp(self):
+        tracing.reset()
+        tracing.enable()
+        # Connections opened after enable() are traced
+        self.db_conn = connection.open_connection(":memory:")
+
+    def tearDown(self):
+        self.db_conn.close()
+        tracing.disable()
+        tracing.reset()
+
+    def test_function_measurements(self):
+        # Test that db and analytics calls are counted with their commits and rows
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now(), 0)
+        db.add_habit(self.db_conn, "Read", "Reading weekly", "weekly", "Hobby", datetime.now(), 0)
+        db.mark_as_completed(self.db_conn, "Run", datetime.now())
+        analytics_module.calculate_completion_rate(self.db_conn)
+
+        functions = tracing.snapshot()["functions"]
+        self.assertEqual(functions["db.add_habit"]["calls"], 2)
+        self.assertEqual(functions["db.add_habit"]["commits"], 2)
+        self.assertEqual(functions["db.mark_as_completed"]["commits"], 1)
+        # Two rate rows and the PRAGMA data_version row read by the analytics cache
+        self.assertEqual(functions["analytics_module.calculate_completion_rate"]["rows"], 3)
+        self.assertGreaterEqual(functions["db.get_habit_id"]["calls"], 1)
+
+    def test_statement_measurements(self):
+        # Test that SQL statements are timed and their rows counted
+        db.add_habit(self.db_conn, "Run", "Running daily", "daily", "Fitness", datetime.now(), 0)
+        db.get_habit_names(self.db_conn)
+        db.get_habit_names(self.db_conn)
+
+        statements = tracing.snapshot()["statements"]
+        self.assertEqual(statements["SELECT name FROM habits"]["calls"], 2)
+        self.assertEqual(statements["SELECT name FROM habits"]["rows"], 2)
+        self.assertGreaterEqual(statements["COMMIT"]["commits"], 1)
+        self.assertGreaterEqual(statements["SELECT name FROM habits"]["p99_ms"],
+                                statements["SELECT name FROM habits"]["p50_ms"])
+
+    def test_disable_restores_functions(self):
+        # Test that disabling tracing puts the original functions back
+        self.assertTrue(hasattr(db.add_habit, "__traced__"))
+        tracing.disable()
+        self.assertFalse(hasattr(db.add_habit, "__traced__"))
+        self.assertIs(connection.CONNECTION_CLASS, connection.Connection)
+
+    def test_report(self):
+        # Test that the summary table lists the traced functions
+        db.get_habit_names(self.db_conn)
+        output = io.StringIO()
+        tracing.report(file=output)
+        self.assertIn("db.get_habit_names", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()